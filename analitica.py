@@ -0,0 +1,167 @@
+import time
+
+from sqlalchemy import text
+
+from db import db
+
+
+"Vistas materializadas de analitica y las tablas de las que dependen"
+VISTAS = {
+    'mv_reservas_mensuales': {'eventos'},
+    'mv_servicios_contratados': {'servicios', 'evento_servicio', 'eventos'},
+    'mv_proveedores_tipo': {'proveedores'},
+}
+
+
+def refrescar(engine=None, todas=False):
+    """
+    Refresca (CONCURRENTLY, sin bloquear lecturas) solo las vistas cuyas tablas
+    cambiaron segun analitica_cambios, y borra los cambios ya procesados.
+
+    Solo se toman los cambios de transacciones anteriores al xmin del snapshot
+    actual: esas ya terminaron y el refresco las ve. Las que siguen en curso se
+    quedan en el registro para la siguiente vuelta, aunque el refresco ya las
+    incluya. Regresa {vista: milisegundos} de las vistas refrescadas.
+    """
+    engine = engine or db.engine
+    refrescadas = {}
+    with engine.begin() as conexion:
+        xmin = conexion.execute(text('SELECT pg_snapshot_xmin(pg_current_snapshot())::text')).scalar()
+        cambiadas = set(conexion.execute(
+            text('SELECT DISTINCT tabla FROM analitica_cambios WHERE xid < CAST(:xmin AS xid8)'),
+            {'xmin': xmin},
+        ).scalars())
+
+        for vista, tablas in VISTAS.items():
+            if not todas and not (tablas & cambiadas):
+                continue
+            inicio = time.perf_counter()
+            conexion.execute(text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}'))
+            refrescadas[vista] = int((time.perf_counter() - inicio) * 1000)
+            conexion.execute(
+                text('INSERT INTO analitica_refrescos (vista, refrescada_en, duracion_ms) '
+                     'VALUES (:vista, now(), :ms) '
+                     'ON CONFLICT (vista) DO UPDATE SET refrescada_en = now(), duracion_ms = :ms'),
+                {'vista': vista, 'ms': refrescadas[vista]},
+            )
+
+        conexion.execute(
+            text('DELETE FROM analitica_cambios WHERE xid < CAST(:xmin AS xid8)'), {'xmin': xmin}
+        )
+    return refrescadas
+
+
+"Consultas del panel de analitica: leen solo de las vistas materializadas"
+CONSULTAS = {
+    'reservas_mensuales': """
+        SELECT mes,
+               sum(eventos) AS eventos,
+               sum(eventos) FILTER (WHERE estado = 'confirmado') AS confirmados,
+               sum(eventos) FILTER (WHERE estado = 'cancelado') AS cancelados,
+               sum(invitados) AS invitados
+        FROM mv_reservas_mensuales
+        WHERE mes >= date_trunc('month', now()) - interval '11 months'
+        GROUP BY mes
+        ORDER BY mes
+    """,
+    'presupuesto_vs_total': """
+        SELECT mes,
+               sum(presupuesto_total) / nullif(sum(con_presupuesto), 0) AS presupuesto_promedio,
+               sum(total_contratado) / nullif(sum(eventos), 0) AS total_promedio
+        FROM mv_reservas_mensuales
+        WHERE estado <> 'cancelado'
+          AND mes >= date_trunc('month', now()) - interval '11 months'
+        GROUP BY mes
+        ORDER BY mes
+    """,
+    'servicios_top': """
+        SELECT nombre, categoria, contrataciones, ingresos
+        FROM mv_servicios_contratados
+        ORDER BY contrataciones DESC, ingresos DESC
+        LIMIT 10
+    """,
+    'proveedores_tipo': """
+        SELECT tipo_servicio, proveedores, activos, calificacion_promedio, calificacion_max
+        FROM mv_proveedores_tipo
+        ORDER BY calificacion_promedio DESC NULLS LAST
+    """,
+}
+
+"Las mismas consultas calculadas directamente sobre las tablas transaccionales (para comparar)"
+CONSULTAS_DIRECTAS = {
+    'reservas_mensuales': """
+        SELECT date_trunc('month', fecha_evento)::date AS mes,
+               count(*) AS eventos,
+               count(*) FILTER (WHERE estado = 'confirmado') AS confirmados,
+               count(*) FILTER (WHERE estado = 'cancelado') AS cancelados,
+               coalesce(sum(num_invitados), 0) AS invitados
+        FROM eventos
+        WHERE fecha_evento >= date_trunc('month', now()) - interval '11 months'
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    'presupuesto_vs_total': """
+        SELECT date_trunc('month', fecha_evento)::date AS mes,
+               avg(presupuesto_estimado) AS presupuesto_promedio,
+               avg(total_servicios) AS total_promedio
+        FROM eventos
+        WHERE estado <> 'cancelado'
+          AND fecha_evento >= date_trunc('month', now()) - interval '11 months'
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    'servicios_top': """
+        SELECT s.nombre, s.categoria, count(es.id) AS contrataciones,
+               coalesce(sum(es.precio_acordado), 0) AS ingresos
+        FROM servicios s
+        JOIN evento_servicio es ON es.servicio_id = s.id_servicio
+        JOIN eventos e ON e.id = es.evento_id
+        WHERE e.estado <> 'cancelado'
+        GROUP BY s.id_servicio, s.nombre, s.categoria
+        ORDER BY contrataciones DESC, ingresos DESC
+        LIMIT 10
+    """,
+    'proveedores_tipo': """
+        SELECT tipo_servicio, count(*) AS proveedores, count(*) FILTER (WHERE activo) AS activos,
+               avg(calificacion) AS calificacion_promedio, max(calificacion) AS calificacion_max
+        FROM proveedores
+        GROUP BY tipo_servicio
+        ORDER BY calificacion_promedio DESC NULLS LAST
+    """,
+}
+
+
+def panel():
+    "Datos del panel de analitica: {consulta: [filas]} mas la fecha del refresco mas antiguo"
+    datos = {
+        nombre: db.session.execute(text(sql)).mappings().all()
+        for nombre, sql in CONSULTAS.items()
+    }
+    datos['refrescada_en'] = db.session.execute(
+        text('SELECT min(refrescada_en) FROM analitica_refrescos')
+    ).scalar()
+    return datos
+
+
+def _medir(sql, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        db.session.execute(text(sql)).all()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return {'mediana_ms': tiempos[len(tiempos) // 2] * 1000, 'max_ms': tiempos[-1] * 1000}
+
+
+def comparar(repeticiones=20):
+    "Tiempo de cada consulta del panel contra su version directa sobre las tablas: {consulta: {...}}"
+    resultado = {}
+    for nombre, sql in CONSULTAS.items():
+        materializada = _medir(sql, repeticiones)
+        directa = _medir(CONSULTAS_DIRECTAS[nombre], repeticiones)
+        resultado[nombre] = {
+            'materializada': materializada,
+            'directa': directa,
+            'aceleracion': directa['mediana_ms'] / materializada['mediana_ms'] if materializada['mediana_ms'] else None,
+        }
+    return resultado
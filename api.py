@@ -0,0 +1,218 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from db import db
+from models import Evento, EventoServicio, Proveedor, Servicio, Usuario
+from pagination import MAX_POR_PAGINA, paginar_filas
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+"""
+Recurso de la API: columnas que se pueden pedir con ?campos= (nombre
+publico -> columna), las que se regresan si no se pide ninguna, la llave
+de orden de la paginacion, los filtros aceptados en la query string y
+quien puede leerlo.
+"""
+Recurso = namedtuple('Recurso', ['llave', 'campos', 'predeterminados', 'orden', 'descendente', 'filtros', 'solo_admin'])
+
+RECURSOS = {
+    'eventos': Recurso(
+        llave=Evento.id,
+        campos={
+            'id': Evento.id, 'usuario_id': Evento.usuario_id, 'titulo': Evento.titulo,
+            'descripcion': Evento.descripcion, 'fecha_evento': Evento.fecha_evento,
+            'fecha_fin': Evento.fecha_fin, 'lugar': Evento.lugar, 'num_invitados': Evento.num_invitados,
+            'presupuesto_estimado': Evento.presupuesto_estimado, 'estado': Evento.estado,
+            'total_servicios': Evento.total_servicios, 'fecha_creacion': Evento.fecha_creacion,
+            'fecha_actualizacion': Evento.fecha_actualizacion,
+        },
+        predeterminados=('id', 'titulo', 'fecha_evento', 'fecha_fin', 'lugar', 'estado', 'total_servicios'),
+        # Mismo orden que admin_eventos: usa ix_eventos_fecha_evento_id / ix_eventos_usuario_fecha
+        orden=(Evento.fecha_evento, Evento.id), descendente=True,
+        filtros={'estado': Evento.estado},
+        solo_admin=False,
+    ),
+    'servicios': Recurso(
+        llave=Servicio.id_servicio,
+        campos={
+            'id': Servicio.id_servicio, 'nombre': Servicio.nombre, 'descripcion': Servicio.descripcion,
+            'precio_base': Servicio.precio_base, 'categoria': Servicio.categoria,
+            'disponible': Servicio.disponible, 'imagen_url': Servicio.imagen_url,
+            'fecha_actualizacion': Servicio.fecha_actualizacion,
+        },
+        predeterminados=('id', 'nombre', 'precio_base', 'categoria', 'disponible'),
+        orden=(Servicio.id_servicio,), descendente=False,
+        filtros={'categoria': Servicio.categoria},
+        solo_admin=False,
+    ),
+    'proveedores': Recurso(
+        llave=Proveedor.id,
+        campos={
+            'id': Proveedor.id, 'nombre': Proveedor.nombre, 'tipo_servicio': Proveedor.tipo_servicio,
+            'contacto': Proveedor.contacto, 'telefono': Proveedor.telefono, 'email': Proveedor.email,
+            'calificacion': Proveedor.calificacion, 'notas': Proveedor.notas, 'activo': Proveedor.activo,
+        },
+        predeterminados=('id', 'nombre', 'tipo_servicio', 'calificacion', 'activo'),
+        orden=(Proveedor.id,), descendente=False,
+        filtros={'tipo_servicio': Proveedor.tipo_servicio},
+        solo_admin=True,
+    ),
+    # Sin password: la API nunca expone el hash
+    'usuarios': Recurso(
+        llave=Usuario.id,
+        campos={
+            'id': Usuario.id, 'username': Usuario.username, 'email': Usuario.email, 'rol': Usuario.rol,
+            'nombre_completo': Usuario.nombre_completo, 'telefono': Usuario.telefono,
+            'fecha_registro': Usuario.fecha_registro, 'activo': Usuario.activo,
+        },
+        predeterminados=('id', 'username', 'nombre_completo', 'rol', 'activo'),
+        orden=(Usuario.id,), descendente=False,
+        filtros={'rol': Usuario.rol},
+        solo_admin=True,
+    ),
+}
+
+"Relaciones que se pueden pedir con ?include=, por recurso"
+INCLUSIONES = {'eventos': ('servicios',)}
+
+"Columnas de cada servicio contratado incluido en un evento"
+CAMPOS_SERVICIOS_INCLUIDOS = {
+    'servicio_id': EventoServicio.servicio_id, 'nombre': Servicio.nombre,
+    'categoria': Servicio.categoria, 'precio_acordado': EventoServicio.precio_acordado,
+    'notas': EventoServicio.notas,
+}
+
+
+class ParametroInvalido(ValueError):
+    "Campo, filtro, inclusion o lista de ids que la API no acepta"
+
+
+def puede_leer(recurso, usuario):
+    return not RECURSOS[recurso].solo_admin or usuario.es_admin()
+
+
+def _restringir(consulta, recurso, usuario):
+    "Un cliente solo ve sus eventos y los servicios disponibles"
+    if usuario.es_admin():
+        return consulta
+    if recurso == 'eventos':
+        return consulta.where(Evento.usuario_id == usuario.id)
+    if recurso == 'servicios':
+        return consulta.where(Servicio.disponible.is_(True))
+    return consulta
+
+
+def _lista(valor):
+    return [v.strip() for v in (valor or '').split(',') if v.strip()]
+
+
+def campos_pedidos(recurso, valor):
+    "Columnas de ?campos=a,b (siempre incluye el id); las predeterminadas si no se indica"
+    definicion = RECURSOS[recurso]
+    nombres = _lista(valor) or list(definicion.predeterminados)
+    desconocidos = [n for n in nombres if n not in definicion.campos]
+    if desconocidos:
+        raise ParametroInvalido('Campos desconocidos: ' + ', '.join(desconocidos))
+    if 'id' not in nombres:
+        nombres.insert(0, 'id')
+    return list(dict.fromkeys(nombres))
+
+
+def inclusiones_pedidas(recurso, valor):
+    nombres = _lista(valor)
+    desconocidas = [n for n in nombres if n not in INCLUSIONES.get(recurso, ())]
+    if desconocidas:
+        raise ParametroInvalido('No se puede incluir: ' + ', '.join(desconocidas))
+    return nombres
+
+
+def ids_pedidos(valor):
+    "Lista de ?ids=1,2,3 (hasta MAX_POR_PAGINA)"
+    try:
+        ids = [int(v) for v in _lista(valor)]
+    except ValueError:
+        raise ParametroInvalido('ids debe ser una lista de enteros')
+    if len(ids) > MAX_POR_PAGINA:
+        raise ParametroInvalido(f'A lo mas {MAX_POR_PAGINA} ids por peticion')
+    return list(dict.fromkeys(ids))
+
+
+def _seleccion(recurso, campos, usuario):
+    definicion = RECURSOS[recurso]
+    consulta = select(*[definicion.campos[c].label(c) for c in campos])
+    return _restringir(consulta, recurso, usuario)
+
+
+def _filas(filas, campos):
+    "Solo los campos pedidos (paginar_filas agrega las columnas de la llave)"
+    return [{c: fila[c] for c in campos} for fila in filas]
+
+
+def _incluir_servicios(filas):
+    "Servicios contratados de todos los eventos de la pagina en una sola consulta"
+    ids = [f['id'] for f in filas]
+    por_evento = {i: [] for i in ids}
+    if ids:
+        consulta = (
+            select(EventoServicio.evento_id, *[c.label(n) for n, c in CAMPOS_SERVICIOS_INCLUIDOS.items()])
+            .join(Servicio, Servicio.id_servicio == EventoServicio.servicio_id)
+            .where(EventoServicio.evento_id.in_(ids))
+            .order_by(EventoServicio.evento_id, EventoServicio.id)
+        )
+        for fila in db.session.execute(consulta).mappings():
+            por_evento[fila['evento_id']].append({n: fila[n] for n in CAMPOS_SERVICIOS_INCLUIDOS})
+    for f in filas:
+        f['servicios'] = por_evento[f['id']]
+
+
+def _completar(recurso, filas, incluir):
+    if 'servicios' in incluir:
+        _incluir_servicios(filas)
+    return filas
+
+
+def listar(recurso, usuario, campos, incluir=(), filtros=None, token=None, por_pagina=None):
+    "Pagina de filas del recurso por llave (ver paginar_filas); regresa (filas, siguiente)"
+    definicion = RECURSOS[recurso]
+    consulta = _seleccion(recurso, campos, usuario)
+    for nombre, valor in (filtros or {}).items():
+        consulta = consulta.where(definicion.filtros[nombre] == valor)
+    pagina = paginar_filas(db.session, consulta, definicion.orden, token=token,
+                           por_pagina=por_pagina, descendente=definicion.descendente)
+    return _completar(recurso, _filas(pagina, campos), incluir), pagina.siguiente
+
+
+def por_ids(recurso, usuario, ids, campos, incluir=()):
+    """
+    Lectura en lote por lista de ids, en el orden pedido. Los ids que no
+    existen o que el usuario no puede ver se regresan en `faltantes`.
+    """
+    definicion = RECURSOS[recurso]
+    consulta = _seleccion(recurso, campos, usuario).where(definicion.llave.in_(ids))
+    encontrados = {f['id']: f for f in _filas(db.session.execute(consulta).mappings(), campos)}
+    filas = [encontrados[i] for i in ids if i in encontrados]
+    faltantes = [i for i in ids if i not in encontrados]
+    return _completar(recurso, filas, incluir), faltantes
+
+
+def _json_default(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f'No se puede serializar {type(valor).__name__}')
+
+
+def a_json(datos):
+    "Serializa con orjson si esta instalado; si no, con json de la biblioteca estandar"
+    if orjson is not None:
+        return orjson.dumps(datos, default=_json_default)
+    return json.dumps(datos, default=_json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
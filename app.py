@@ -1,22 +1,73 @@
-from flask import Flask, render_template, jsonify, url_for, redirect, request, flash
+from flask import Flask, render_template, jsonify, url_for, redirect, request, flash, abort, make_response, Response, stream_with_context, send_file
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_bcrypt import Bcrypt
 from functools import wraps
-from datetime import datetime
+import hmac
+import threading
+import time
+import os
+from datetime import datetime, timedelta
+import sys
+
+import click
+from flask_wtf.csrf import validate_csrf
+from sqlalchemy.exc import IntegrityError
+from wtforms.validators import ValidationError
 
 from db import db  
-from models import Usuario, Cliente, Servicio, Proveedor, Evento, EventoServicio
-from forms import LoginForm, RegistroForm, EventoForm, ServicioForm, ProveedorForm, AgregarServicioEventoForm
+from db_pool import PoolInstrumentado, registrar_eventos, estado_pool
+from models import Usuario, Cliente, Servicio, Proveedor, Evento, EventoServicio, Trabajo
+from forms import LoginForm, RegistroForm, EventoForm, ServicioForm, ProveedorForm, AgregarServicioEventoForm, ImportarForm, ESTADOS_EVENTO, CATEGORIAS_SERVICIO
+import forms
+from migrar import migrar
+from planes import verificar_planes
+from queries import con_perfil, resumen_servicios, reconciliar_totales, eventos_por_usuario
+from pagination import paginar, TokenInvalido
+from cache import TTLCache
+import stats
+import user_cache
+import hashing
+from hashing import HashingSaturado
+import replicas
+import fragment_cache
+import bulk
+import reportes
+import analitica
+import disponibilidad
+import busqueda
+import api
+import trabajos
+import tareas
+import cotizaciones
+import instrumentacion
+import sesiones
+import catalogo
+from replicas import solo_lectura
+from condicional import condicional, version_catalogo, version_evento, version_eventos
 app = Flask(__name__)
 app.config.from_object('config')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault('poolclass', PoolInstrumentado)
 db.init_app(app)
+with app.app_context():
+    registrar_eventos(db.engine)
+replica = replicas.init_app(app, db)
+if replica is not None:
+    registrar_eventos(replica)
+with app.app_context():
+    instrumentacion.init_app(app, db.engine, *([replica] if replica is not None else []))
 
 #Inicializar extensiones
-bcrypt = Bcrypt(app)
+sesiones.init_app(app)
+forms.init_app(app)
+hashing.init_app(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor inicia sesion para acceder'
 login_manager.login_message_category = 'Aviso'
+stats.init_app(app)
+user_cache.init_app(app)
+fragment_cache.init_app(app)
+catalogo.init_app(app)
+disponibilidad.init_app(app)
 
 #rutas
 @app.route('/')
@@ -29,15 +80,24 @@ def base():
 
 @app.route('/test-db')
 def test_db():
+    """Health check: prueba la conexión y reporta el estado del pool"""
+    inicio = time.perf_counter()
     try:
         db.session.execute(db.text('SELECT 1'))
-        return jsonify({'status': 'success', 'message': 'Conexión a la base de datos exitosa.'})
+        latencia = time.perf_counter() - inicio
+        return jsonify({'status': 'success',
+                        'message': 'Conexión a la base de datos exitosa.',
+                        'latencia': latencia,
+                        'pool': estado_pool(db.engine)})
     except Exception as e:
-        return jsonify({'status': 'error', 'message': f'Error en la conexión: {e}'})
+        return jsonify({'status': 'error',
+                        'message': f'Error en la conexión: {e}',
+                        'pool': estado_pool(db.engine)}), 503
 
 @app.route('/cliente')
+@solo_lectura
 def mostrar_cliente():
-    clientes = Cliente.query.all()
+    clientes = paginar_peticion(Cliente.query, [Cliente.id_cliente])
     return render_template('clientes.htm', clientes=clientes)
 
 @app.route('/cliente/nuevo', methods=['GET', 'POST'])
@@ -63,8 +123,11 @@ def cliente_perfil():
     return render_template('cliente_perfil.htm')
 
 @app.route('/servicios')
+@condicional(version_catalogo)
 def servicios():
-    return render_template('servicios.htm')
+    # La consulta es perezosa: solo se ejecuta si el fragmento no está en cache
+    servicios_lista = Servicio.query.filter_by(disponible=True).order_by(Servicio.id_servicio)
+    return render_template('servicios.htm', servicios=servicios_lista)
 
 @app.route('/servicios_forms')
 def servicios_forms():
@@ -78,12 +141,35 @@ def servicios_mod():
 def perfil():
     return render_template('perfil.htm')
 
+# PAGINACIÓN
+
+def paginar_peticion(query, columnas, descendente=False, perezosa=False):
+    "Pagina una consulta con el token ?pagina= y el tamaño ?por_pagina= de la petición actual"
+    try:
+        return paginar(query, columnas,
+                       token=request.args.get('pagina'),
+                       por_pagina=request.args.get('por_pagina', type=int),
+                       descendente=descendente, perezosa=perezosa)
+    except TokenInvalido:
+        abort(400)
+
+
+@app.template_global()
+def url_pagina(token=None):
+    "URL de la vista actual conservando los filtros y cambiando solo el token de página"
+    args = request.args.to_dict()
+    args.pop('pagina', None)
+    if token:
+        args['pagina'] = token
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
 # CONFIGURACIÓN DE FLASK-LOGIN
 
 @login_manager.user_loader
 def load_user(user_id):
-    "Carga al usuario por su id"
-    return Usuario.query.get(int(user_id))
+    "Carga al usuario por su id (desde el cache si esta disponible)"
+    return user_cache.cargar_usuario(int(user_id))
 
 # DECORADORES PERSONALIZADOS PARA AUTORIZACIÓN
 
@@ -119,11 +205,19 @@ def login():
     if form.validate_on_submit():
         usuario = Usuario.query.filter_by(username=form.username.data).first()
         
-        if usuario and bcrypt.check_password_hash(usuario.password_hash, form.password.data):
+        if usuario and hashing.pool.verificar(usuario.password_hash, form.password.data):
             if not usuario.activo:
                 flash('Tu cuenta está desactivada. Contacta al administrador.', 'danger')
                 return redirect(url_for('login'))
             
+            # Si cambió el costo configurado, se aprovecha el login para actualizar el hash
+            if hashing.pool.necesita_rehash(usuario.password_hash):
+                try:
+                    usuario.password_hash = hashing.pool.generar_hash(form.password.data)
+                    db.session.commit()
+                except HashingSaturado:
+                    pass
+            
             login_user(usuario, remember=form.remember.data)
             flash(f'¡Bienvenido {usuario.nombre_completo}!', 'success')
             
@@ -154,7 +248,7 @@ def registro():
     
     if form.validate_on_submit():
         # Encriptar la contraseña
-        password_hash = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        password_hash = hashing.pool.generar_hash(form.password.data)
         
         # Crear nuevo usuario
         nuevo_usuario = Usuario(
@@ -167,7 +261,11 @@ def registro():
         )
         
         db.session.add(nuevo_usuario)
+        db.session.flush()
+        trabajos.encolar('correo_bienvenida', {'usuario_id': nuevo_usuario.id},
+                         llave=f'correo_bienvenida:{nuevo_usuario.id}')
         db.session.commit()
+        stats.invalidar()
         
         flash('¡Cuenta creada exitosamente! Ya puedes iniciar sesión.', 'success')
         return redirect(url_for('login'))
@@ -184,10 +282,46 @@ def logout():
     return redirect(url_for('index'))
 
 
+# DISPONIBILIDAD
+
+def lugar_ocupado(lugar, inicio, fin, excluir=None):
+    "Avisa con un flash si el lugar ya tiene un evento en ese periodo; regresa True si hay conflicto"
+    conflictos = disponibilidad.conflictos_lugar(lugar, inicio, fin, excluir=excluir)
+    if conflictos:
+        ocupado = conflictos[0]
+        flash(f'El lugar ya está reservado del {ocupado.inicio:%d/%m/%Y %H:%M} '
+              f'al {ocupado.fin:%d/%m/%Y %H:%M}. Elige otra fecha u otro lugar.', 'danger')
+    return bool(conflictos)
+
+
+def servicio_ocupado(servicio, inicio, fin, excluir=None):
+    "Avisa con un flash si el servicio ya está contratado en otro evento de ese periodo; regresa True si hay conflicto"
+    conflictos = disponibilidad.conflictos_servicio(servicio.id_servicio, inicio, fin, excluir=excluir)
+    if conflictos:
+        ocupado = conflictos[0]
+        flash(f'"{servicio.nombre}" ya está contratado en otro evento del {ocupado.inicio:%d/%m/%Y %H:%M} '
+              f'al {ocupado.fin:%d/%m/%Y %H:%M}.', 'danger')
+    return bool(conflictos)
+
+
+def es_conflicto_de_periodo(error):
+    "IntegrityError causado por la restricción de exclusión ex_eventos_lugar_periodo"
+    return 'ex_eventos_lugar_periodo' in str(getattr(error, 'orig', error))
+
+
+def es_servicio_duplicado(error):
+    "IntegrityError causado por uq_evento_servicio (el servicio ya está en el evento)"
+    mensaje = str(getattr(error, 'orig', error))
+    # sqlite no reporta el nombre de la restricción, solo sus columnas
+    return 'uq_evento_servicio' in mensaje or 'evento_servicio.evento_id, evento_servicio.servicio_id' in mensaje
+
+
 # DASHBOARD DE CLIENTES
 
 @app.route('/cliente/dashboard')
 @login_required
+@solo_lectura
+@condicional(lambda: version_eventos(current_user.id))
 def cliente_dashboard():
     """
     Dashboard principal para clientes.
@@ -197,7 +331,8 @@ def cliente_dashboard():
         return redirect(url_for('admin_dashboard'))
     
     eventos = Evento.query.filter_by(usuario_id=current_user.id).order_by(Evento.fecha_evento.desc()).all()
-    return render_template('cliente/dashboard.htm', eventos=eventos)
+    resumen = resumen_servicios(e.id for e in eventos)
+    return render_template('clientes/dashboard.htm', eventos=eventos, resumen=resumen)
 
 
 @app.route('/cliente/evento/nuevo', methods=['GET', 'POST'])
@@ -209,18 +344,17 @@ def cliente_nuevo_evento():
     form = EventoForm()
     
     if form.validate_on_submit():
-        # Convertir string de fecha a datetime
-        try:
-            fecha_evento = datetime.strptime(form.fecha_evento.data, '%Y-%m-%dT%H:%M')
-        except ValueError:
-            flash('Formato de fecha inválido.', 'danger')
-            return render_template('cliente/evento_form.htm', form=form)
+        fecha_evento = form.fecha_evento.data
+        fecha_fin = fecha_evento + timedelta(hours=form.duracion_horas.data or 8)
+        if lugar_ocupado(form.lugar.data, fecha_evento, fecha_fin):
+            return render_template('clientes/evento_form.htm', form=form, accion='Crear')
         
         nuevo_evento = Evento(
             usuario_id=current_user.id,
             titulo=form.titulo.data,
             descripcion=form.descripcion.data,
             fecha_evento=fecha_evento,
+            fecha_fin=fecha_fin,
             lugar=form.lugar.data,
             num_invitados=form.num_invitados.data,
             presupuesto_estimado=form.presupuesto_estimado.data,
@@ -228,29 +362,75 @@ def cliente_nuevo_evento():
         )
         
         db.session.add(nuevo_evento)
-        db.session.commit()
+        try:
+            db.session.flush()
+            trabajos.encolar('evento_creado', {'evento_id': nuevo_evento.id},
+                             llave=f'evento_creado:{nuevo_evento.id}')
+            db.session.commit()
+        except IntegrityError as e:
+            # Otra reservación del mismo lugar se guardó entre la revisión y el commit
+            db.session.rollback()
+            if not es_conflicto_de_periodo(e):
+                raise
+            flash('El lugar acaba de ser reservado para esa fecha. Elige otra fecha u otro lugar.', 'danger')
+            return render_template('clientes/evento_form.htm', form=form, accion='Crear')
+        stats.invalidar()
         
         flash('¡Evento creado exitosamente!', 'success')
         return redirect(url_for('cliente_ver_evento', evento_id=nuevo_evento.id))
     
-    return render_template('cliente/evento_form.htm', form=form, accion='Crear')
+    return render_template('clientes/evento_form.htm', form=form, accion='Crear')
 
 
 @app.route('/cliente/evento/<int:evento_id>')
 @login_required
+@solo_lectura
+@condicional(version_evento)
 def cliente_ver_evento(evento_id):
     """
     Vista detallada de un evento específico del cliente.
     """
-    evento = Evento.query.get_or_404(evento_id)
+    evento = con_perfil(Evento.query, 'evento_detalle').get_or_404(evento_id)
     
     # Verificar que el evento pertenezca al usuario actual
     if evento.usuario_id != current_user.id and not current_user.es_admin():
         flash('No tienes permiso para ver este evento.', 'danger')
         return redirect(url_for('cliente_dashboard'))
     
-    servicios_disponibles = Servicio.query.filter_by(disponible=True).all()
-    return render_template('cliente/evento_detalle.htm', evento=evento, servicios_disponibles=servicios_disponibles)
+    return render_template('clientes/evento_detalle.htm', evento=evento,
+                           servicios_disponibles=catalogo.opciones_servicios(),
+                           form_servicio=AgregarServicioEventoForm(formdata=None),
+                           formatos_cotizacion=cotizaciones.formatos_disponibles())
+
+
+@app.route('/cliente/evento/<int:evento_id>/cotizacion.<formato>')
+@login_required
+def cliente_cotizacion(evento_id, formato):
+    """
+    Cotización del evento en HTML o PDF. Se sirve del disco si ya existe para la
+    versión actual del evento; si no, el worker la genera y la página se recarga.
+    """
+    if formato not in cotizaciones.formatos_disponibles():
+        abort(404)
+    encontrado = cotizaciones.version_cotizacion(evento_id)
+    if encontrado is None:
+        abort(404)
+    usuario_id, version = encontrado
+    if usuario_id != current_user.id and not current_user.es_admin():
+        abort(403)
+
+    llave = cotizaciones.llave(version)
+    ruta = cotizaciones.ruta(evento_id, llave, formato)
+    if not os.path.exists(ruta):
+        ruta = cotizaciones.solicitar(evento_id, llave, formato)
+    if ruta is None:
+        respuesta = make_response(render_template('cotizacion_pendiente.htm', evento_id=evento_id, reintentar=2), 202)
+        respuesta.headers['Retry-After'] = '2'
+        return respuesta
+
+    # conditional=True: ETag/Last-Modified del archivo y soporte de Range
+    return send_file(ruta, mimetype=cotizaciones.FORMATOS[formato], conditional=True, max_age=0,
+                     as_attachment=formato == 'pdf', download_name=f'cotizacion-{evento_id}.{formato}')
 
 
 @app.route('/cliente/evento/<int:evento_id>/editar', methods=['GET', 'POST'])
@@ -268,20 +448,24 @@ def cliente_editar_evento(evento_id):
     
     form = EventoForm(obj=evento)
     
-    # Pre-llenar el campo de fecha en formato correcto
+    # La duración no es columna del modelo: se deriva de fecha_fin
     if request.method == 'GET':
-        form.fecha_evento.data = evento.fecha_evento.strftime('%Y-%m-%dT%H:%M')
+        form.duracion_horas.data = round((evento.fecha_fin - evento.fecha_evento) / timedelta(hours=1))
     
     if form.validate_on_submit():
-        try:
-            fecha_evento = datetime.strptime(form.fecha_evento.data, '%Y-%m-%dT%H:%M')
-        except ValueError:
-            flash('Formato de fecha inválido.', 'danger')
-            return render_template('cliente/evento_form.htm', form=form, accion='Editar')
+        fecha_evento = form.fecha_evento.data
+        fecha_fin = fecha_evento + timedelta(hours=form.duracion_horas.data or 8)
+        if lugar_ocupado(form.lugar.data, fecha_evento, fecha_fin, excluir=evento.id):
+            return render_template('clientes/evento_form.htm', form=form, accion='Editar', evento=evento)
+        # Los servicios ya contratados se mueven con el evento: no pueden quedar en dos eventos a la vez
+        if any(servicio_ocupado(es.servicio, fecha_evento, fecha_fin, excluir=evento.id)
+               for es in evento.servicios_contratados):
+            return render_template('clientes/evento_form.htm', form=form, accion='Editar', evento=evento)
         
         evento.titulo = form.titulo.data
         evento.descripcion = form.descripcion.data
         evento.fecha_evento = fecha_evento
+        evento.fecha_fin = fecha_fin
         evento.lugar = form.lugar.data
         evento.num_invitados = form.num_invitados.data
         evento.presupuesto_estimado = form.presupuesto_estimado.data
@@ -290,11 +474,19 @@ def cliente_editar_evento(evento_id):
         if current_user.es_admin():
             evento.estado = form.estado.data
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not es_conflicto_de_periodo(e):
+                raise
+            flash('El lugar acaba de ser reservado para esa fecha. Elige otra fecha u otro lugar.', 'danger')
+            return render_template('clientes/evento_form.htm', form=form, accion='Editar', evento=evento)
+        stats.invalidar()
         flash('Evento actualizado exitosamente.', 'success')
         return redirect(url_for('cliente_ver_evento', evento_id=evento.id))
     
-    return render_template('cliente/evento_form.htm', form=form, accion='Editar', evento=evento)
+    return render_template('clientes/evento_form.htm', form=form, accion='Editar', evento=evento)
 
 
 @app.route('/cliente/evento/<int:evento_id>/cancelar', methods=['POST'])
@@ -311,6 +503,7 @@ def cliente_cancelar_evento(evento_id):
     
     evento.estado = 'cancelado'
     db.session.commit()
+    stats.invalidar()
     
     flash('Evento cancelado exitosamente.', 'info')
     return redirect(url_for('cliente_dashboard'))
@@ -328,29 +521,40 @@ def cliente_agregar_servicio(evento_id):
         flash('No tienes permiso para modificar este evento.', 'danger')
         return redirect(url_for('cliente_dashboard'))
     
-    servicio_id = request.form.get('servicio_id', type=int)
-    precio_acordado = request.form.get('precio_acordado', type=float)
-    
-    if not servicio_id or not precio_acordado:
-        flash('Datos incompletos.', 'danger')
+    # Las opciones del select vienen del catálogo de servicios disponibles: otro id no valida
+    form = AgregarServicioEventoForm()
+    if not form.validate_on_submit():
+        errores = [error for lista in form.errors.values() for error in lista]
+        flash(errores[0] if errores else 'Datos incompletos.', 'danger')
         return redirect(url_for('cliente_ver_evento', evento_id=evento_id))
     
+    servicio_id = form.servicio_id.data
     servicio = Servicio.query.get_or_404(servicio_id)
-    
-    # Verificar que no esté ya agregado
-    existe = EventoServicio.query.filter_by(evento_id=evento_id, servicio_id=servicio_id).first()
-    if existe:
-        flash('Este servicio ya está agregado al evento.', 'warning')
+    if servicio_ocupado(servicio, evento.fecha_evento, evento.fecha_fin, excluir=evento_id):
         return redirect(url_for('cliente_ver_evento', evento_id=evento_id))
     
     evento_servicio = EventoServicio(
         evento_id=evento_id,
         servicio_id=servicio_id,
-        precio_acordado=precio_acordado
+        precio_acordado=form.precio_acordado.data,
+        notas=form.notas.data or None
     )
     
     db.session.add(evento_servicio)
-    db.session.commit()
+    # Actualiza el total desnormalizado en la misma transacción (UPDATE atómico en SQL)
+    evento.total_servicios = Evento.total_servicios + form.precio_acordado.data
+    try:
+        db.session.flush()
+        trabajos.encolar('servicio_contratado', {'evento_servicio_id': evento_servicio.id},
+                         llave=f'servicio_contratado:{evento_servicio.id}')
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not es_servicio_duplicado(e):
+            raise
+        flash('Este servicio ya está agregado al evento.', 'warning')
+        return redirect(url_for('cliente_ver_evento', evento_id=evento_id))
+    stats.invalidar()
     
     flash(f'Servicio "{servicio.nombre}" agregado exitosamente.', 'success')
     return redirect(url_for('cliente_ver_evento', evento_id=evento_id))
@@ -371,7 +575,9 @@ def cliente_eliminar_servicio(evento_id, servicio_id):
     evento_servicio = EventoServicio.query.filter_by(evento_id=evento_id, servicio_id=servicio_id).first_or_404()
     
     db.session.delete(evento_servicio)
+    evento.total_servicios = Evento.total_servicios - evento_servicio.precio_acordado
     db.session.commit()
+    stats.invalidar()
     
     flash('Servicio eliminado del evento.', 'info')
     return redirect(url_for('cliente_ver_evento', evento_id=evento_id))
@@ -381,34 +587,114 @@ def cliente_eliminar_servicio(evento_id, servicio_id):
 
 @app.route('/admin/dashboard')
 @admin_required
+@solo_lectura
 def admin_dashboard():
     """
     Dashboard principal para administradores.
     Muestra estadísticas y resumen del sistema.
     """
-    total_usuarios = Usuario.query.count()
-    total_eventos = Evento.query.count()
-    total_servicios = Servicio.query.count()
-    eventos_pendientes = Evento.query.filter_by(estado='pendiente').count()
-    
-    eventos_recientes = Evento.query.order_by(Evento.fecha_creacion.desc()).limit(5).all()
-    
-    return render_template('admin/dashboard.htm', 
-                         total_usuarios=total_usuarios,
-                         total_eventos=total_eventos,
-                         total_servicios=total_servicios,
-                         eventos_pendientes=eventos_pendientes,
-                         eventos_recientes=eventos_recientes)
+    estadisticas = stats.estadisticas_dashboard()
+    return render_template('admin/dashboard.htm', **estadisticas)
+
+
+@app.route('/admin/estadisticas/cache')
+@admin_required
+def admin_estadisticas_cache():
+    """Aciertos y fallos del cache de estadísticas (para monitoreo)"""
+    return jsonify(stats.cache.stats())
+
+
+@app.route('/admin/estadisticas/fragmentos')
+@admin_required
+def admin_estadisticas_fragmentos():
+    """Aciertos y fallos del cache de fragmentos de templates"""
+    return jsonify(fragment_cache.stats())
+
+
+@app.route('/admin/estadisticas/catalogo')
+@admin_required
+def admin_estadisticas_catalogo():
+    """Recargas y tamaño de la instantánea de servicios disponibles"""
+    return jsonify(catalogo.stats())
+
+
+@app.route('/admin/estadisticas/hashing')
+@admin_required
+def admin_estadisticas_hashing():
+    """Profundidad de cola y latencia del pool de hashing (para monitoreo)"""
+    return jsonify(hashing.pool.stats())
+
+
+@app.route('/admin/estadisticas/sesiones')
+@admin_required
+def admin_estadisticas_sesiones():
+    """Escrituras y extensiones de sesiones en el almacen del servidor"""
+    if not isinstance(app.session_interface, sesiones.SesionesServidor):
+        abort(404)
+    return jsonify(app.session_interface.stats())
+
+
+@app.route('/admin/estadisticas/instrumentacion')
+@admin_required
+def admin_estadisticas_instrumentacion():
+    """Peticiones lentas con sus consultas más lentas y los últimos perfiles muestreados"""
+    if instrumentacion.activa is None:
+        abort(404)
+    return jsonify(instrumentacion.activa.stats())
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas del proceso en formato Prometheus (requiere INSTRUMENTACION=1 e INSTRUMENTACION_TOKEN)"""
+    if instrumentacion.activa is None:
+        abort(404)
+    # Sin token configurado no hay forma de autenticar al recolector: se niega a todos
+    token = app.config.get('INSTRUMENTACION_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+
+    pool = estado_pool(db.engine)
+    hash_stats = hashing.pool.stats()
+    extras = [
+        ('pool_en_uso', 'gauge', 'Conexiones prestadas', pool.get('en_uso', 0)),
+        ('pool_overflow', 'gauge', 'Conexiones por encima de pool_size', pool.get('overflow', 0)),
+        ('pool_checkouts_total', 'counter', 'Conexiones tomadas del pool', pool['checkouts']),
+        ('pool_timeouts_total', 'counter', 'Esperas de conexion agotadas', pool['timeouts']),
+        ('pool_espera_max_segundos', 'gauge', 'Espera maxima por una conexion', pool['espera_max']),
+        ('hashing_en_curso', 'gauge', 'Hashes bcrypt en curso', hash_stats['en_curso']),
+        ('hashing_rechazados_total', 'counter', 'Hashes rechazados por pool saturado', hash_stats['rechazados']),
+        ('hashing_agotados_total', 'counter', 'Hashes que excedieron HASH_POOL_TIMEOUT', hash_stats['agotados']),
+    ]
+    return Response(instrumentacion.activa.prometheus(extras), mimetype='text/plain; version=0.0.4')
 
 
 # CRUD DE SERVICIOS (SOLO ADMIN)
 
 @app.route('/admin/servicios')
 @admin_required
+@solo_lectura
+@condicional(version_catalogo)
 def admin_servicios():
-    """Lista todos los servicios del sistema"""
-    servicios_lista = Servicio.query.all()
-    return render_template('admin/servicios.htm', servicios=servicios_lista)
+    """Lista los servicios del sistema, filtrados y paginados en la base de datos"""
+    query = Servicio.query
+    
+    categoria = request.args.get('categoria')
+    if categoria:
+        query = query.filter(Servicio.categoria == categoria)
+    
+    disponible = request.args.get('disponible')
+    if disponible == 'disponible':
+        query = query.filter(Servicio.disponible.is_(True))
+    elif disponible == 'no-disponible':
+        query = query.filter(Servicio.disponible.is_(False))
+    
+    nombre = request.args.get('q', '').strip()
+    if nombre:
+        query = query.filter(Servicio.nombre.ilike(f'{nombre}%'))
+    
+    # Perezosa: el fragmento en cache incluye todo lo que lee la página, así que un hit no consulta
+    servicios_lista = paginar_peticion(query, [Servicio.id_servicio], perezosa=True)
+    return render_template('admin/servicios.htm', servicios=servicios_lista, categorias=CATEGORIAS_SERVICIO)
 
 
 @app.route('/admin/servicio/nuevo', methods=['GET', 'POST'])
@@ -429,6 +715,7 @@ def admin_nuevo_servicio():
         
         db.session.add(nuevo_servicio)
         db.session.commit()
+        stats.invalidar()
         
         flash(f'Servicio "{nuevo_servicio.nombre}" creado exitosamente.', 'success')
         return redirect(url_for('admin_servicios'))
@@ -472,6 +759,7 @@ def admin_eliminar_servicio(servicio_id):
     
     db.session.delete(servicio)
     db.session.commit()
+    stats.invalidar()
     
     flash(f'Servicio "{servicio.nombre}" eliminado exitosamente.', 'success')
     return redirect(url_for('admin_servicios'))
@@ -481,17 +769,28 @@ def admin_eliminar_servicio(servicio_id):
 
 @app.route('/admin/eventos')
 @admin_required
+@solo_lectura
+@condicional(version_eventos)
 def admin_eventos():
-    """Lista todos los eventos del sistema"""
-    eventos = Evento.query.order_by(Evento.fecha_evento.desc()).all()
-    return render_template('admin/eventos.htm', eventos=eventos)
+    """Lista los eventos del sistema, del más reciente al más antiguo"""
+    query = con_perfil(Evento.query, 'evento_lista')
+    
+    estado = request.args.get('estado')
+    if estado:
+        query = query.filter(Evento.estado == estado)
+    
+    eventos = paginar_peticion(query, [Evento.fecha_evento, Evento.id], descendente=True)
+    resumen = resumen_servicios(e.id for e in eventos)
+    return render_template('admin/eventos.htm', eventos=eventos, resumen=resumen, estados=ESTADOS_EVENTO)
 
 
 @app.route('/admin/evento/<int:evento_id>')
 @admin_required
+@solo_lectura
+@condicional(version_evento)
 def admin_ver_evento(evento_id):
     """Ver detalle de cualquier evento"""
-    evento = Evento.query.get_or_404(evento_id)
+    evento = con_perfil(Evento.query, 'evento_detalle').get_or_404(evento_id)
     return render_template('admin/evento_detalle.htm', evento=evento)
 
 
@@ -499,10 +798,22 @@ def admin_ver_evento(evento_id):
 
 @app.route('/admin/usuarios')
 @admin_required
+@solo_lectura
 def admin_usuarios():
-    """Lista todos los usuarios del sistema"""
-    usuarios = Usuario.query.all()
-    return render_template('admin/usuarios.htm', usuarios=usuarios)
+    """Lista los usuarios del sistema, filtrados y paginados en la base de datos"""
+    query = Usuario.query
+    
+    rol = request.args.get('rol')
+    if rol:
+        query = query.filter(Usuario.rol == rol)
+    
+    activo = request.args.get('activo')
+    if activo in ('1', '0'):
+        query = query.filter(Usuario.activo.is_(activo == '1'))
+    
+    usuarios = paginar_peticion(query, [Usuario.id])
+    num_eventos = eventos_por_usuario(u.id for u in usuarios)
+    return render_template('admin/usuarios.htm', usuarios=usuarios, num_eventos=num_eventos)
 
 
 @app.route('/admin/usuario/<int:usuario_id>/toggle-activo', methods=['POST'])
@@ -516,7 +827,10 @@ def admin_toggle_usuario_activo(usuario_id):
         return redirect(url_for('admin_usuarios'))
     
     usuario.activo = not usuario.activo
+    trabajos.encolar('cuenta_actualizada', {'usuario_id': usuario.id, 'activo': usuario.activo})
     db.session.commit()
+    stats.invalidar()
+    user_cache.invalidar(usuario.id)
     
     estado = 'activado' if usuario.activo else 'desactivado'
     flash(f'Usuario "{usuario.username}" {estado} exitosamente.', 'success')
@@ -527,9 +841,20 @@ def admin_toggle_usuario_activo(usuario_id):
 
 @app.route('/admin/proveedores')
 @admin_required
+@solo_lectura
 def admin_proveedores():
-    """Lista todos los proveedores"""
-    proveedores = Proveedor.query.all()
+    """Lista los proveedores, filtrados y paginados en la base de datos"""
+    query = Proveedor.query
+    
+    activo = request.args.get('activo')
+    if activo in ('1', '0'):
+        query = query.filter(Proveedor.activo.is_(activo == '1'))
+    
+    tipo_servicio = request.args.get('tipo_servicio', '').strip()
+    if tipo_servicio:
+        query = query.filter(Proveedor.tipo_servicio == tipo_servicio)
+    
+    proveedores = paginar_peticion(query, [Proveedor.id])
     return render_template('admin/proveedores.htm', proveedores=proveedores)
 
 
@@ -597,6 +922,534 @@ def admin_eliminar_proveedor(proveedor_id):
     return redirect(url_for('admin_proveedores'))
 
 
+# IMPORTACIÓN Y EXPORTACIÓN MASIVA (ADMIN)
+
+@app.route('/admin/importar', methods=['GET', 'POST'])
+@admin_required
+def admin_importar():
+    """Recibe un archivo CSV o JSONL y encola su carga; el worker la procesa en segundo plano"""
+    form = ImportarForm()
+
+    if form.validate_on_submit():
+        archivo = bulk.guardar_subida(form.archivo.data)
+        trabajo_id = trabajos.encolar('importar_catalogo', {
+            'catalogo': form.catalogo.data, 'archivo': archivo, 'formato': form.formato.data,
+        })
+        db.session.commit()
+        flash('Archivo recibido; la importación se procesa en segundo plano.', 'info')
+        return redirect(url_for('admin_importacion', trabajo_id=trabajo_id))
+
+    return render_template('admin/importar.htm', form=form, trabajo=None, resultado=None,
+                           catalogos=bulk.CATALOGOS, formatos=bulk.FORMATOS)
+
+
+@app.route('/admin/importar/<int:trabajo_id>')
+@admin_required
+def admin_importacion(trabajo_id):
+    """Estado de una importación encolada y, al terminar, sus errores por fila"""
+    trabajo = db.session.get(Trabajo, trabajo_id)
+    if trabajo is None or trabajo.tipo != 'importar_catalogo':
+        abort(404)
+    resultado = bulk.resumen_subida(trabajo.argumentos['archivo']) if trabajo.estado == 'terminado' else None
+    return render_template('admin/importar.htm', form=ImportarForm(), trabajo=trabajo, resultado=resultado,
+                           catalogos=bulk.CATALOGOS, formatos=bulk.FORMATOS)
+
+
+@app.route('/admin/exportar/<catalogo>.<formato>')
+@admin_required
+def admin_exportar(catalogo, formato):
+    """Descarga un catálogo completo sin cargarlo en memoria"""
+    if catalogo not in bulk.CATALOGOS or formato not in bulk.FORMATOS:
+        abort(404)
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(bulk.exportar(catalogo, formato)),
+        mimetype=tipo,
+        headers={'Content-Disposition': f'attachment; filename={catalogo}.{formato}'},
+    )
+
+
+# REPORTES (ADMIN)
+
+def _fecha_parametro(nombre):
+    "Fecha AAAA-MM-DD de la query string, o None; 400 si no es válida"
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
+@app.route('/admin/reportes')
+@admin_required
+def admin_reportes():
+    """Lista de reportes descargables"""
+    return render_template('admin/reportes.htm', reportes=reportes.REPORTES)
+
+
+@app.route('/admin/reportes/<nombre>.csv')
+@admin_required
+@solo_lectura
+def admin_reporte_csv(nombre):
+    """Descarga un reporte en CSV; se envía por partes mientras la base de datos lo genera"""
+    if nombre not in reportes.REPORTES:
+        abort(404)
+    desde, hasta = _fecha_parametro('desde'), _fecha_parametro('hasta')
+    archivo = f'{nombre}_{datetime.now():%Y%m%d}.csv'
+    return Response(
+        stream_with_context(reportes.generar_csv(nombre, desde, hasta)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={archivo}'},
+    )
+
+
+@app.route('/admin/analitica')
+@admin_required
+@solo_lectura
+def admin_analitica():
+    """Panel de analítica; lee solo de las vistas materializadas"""
+    return render_template('admin/analitica.htm', datos=analitica.panel())
+
+
+# API DE DISPONIBILIDAD
+
+def _fecha_hora_parametro(nombre, requerido=True):
+    """
+    Fecha u hora ISO (AAAA-MM-DD o AAAA-MM-DDTHH:MM) de la query string; 400 si falta
+    o no es válida. Las fechas de los eventos son hora local sin zona, así que un valor
+    con zona horaria (+00:00, Z) no se puede comparar con ellas y también es 400.
+    """
+    valor = request.args.get(nombre)
+    if not valor:
+        if requerido:
+            abort(400)
+        return None
+    try:
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        abort(400)
+    if fecha.tzinfo is not None:
+        abort(400)
+    return fecha
+
+
+def _intervalo_json(ocupado):
+    datos = {'inicio': ocupado[0].isoformat(), 'fin': ocupado[1].isoformat()}
+    if current_user.es_admin() and len(ocupado) > 2:
+        datos['evento_id'] = ocupado[2]
+    return datos
+
+
+@app.route('/api/disponibilidad')
+@login_required
+@solo_lectura
+def api_disponibilidad():
+    """Huecos libres de un lugar (?lugar=) o servicio (?servicio_id=) entre ?desde= y ?hasta="""
+    lugar = request.args.get('lugar')
+    servicio_id = request.args.get('servicio_id', type=int)
+    desde, hasta = _fecha_hora_parametro('desde'), _fecha_hora_parametro('hasta')
+    if not (lugar or servicio_id) or hasta <= desde or hasta - desde > timedelta(days=366):
+        abort(400)
+    duracion_minima = timedelta(hours=request.args.get('duracion_horas', 0, type=float))
+
+    inicio = time.perf_counter()
+    ocupados, libres = disponibilidad.indice.libres(desde, hasta, lugar=lugar, servicio_id=servicio_id,
+                                                    duracion_minima=duracion_minima)
+    return jsonify({
+        'ocupados': [_intervalo_json(o) for o in ocupados],
+        'libres': [_intervalo_json(l) for l in libres],
+        'ms': round((time.perf_counter() - inicio) * 1000, 3),
+    })
+
+
+@app.route('/api/disponibilidad/conflictos')
+@login_required
+@solo_lectura
+def api_disponibilidad_conflictos():
+    """Consulta hipotética: qué eventos chocarían con ?inicio= / ?fin= en un lugar o servicio"""
+    lugar = request.args.get('lugar')
+    servicio_id = request.args.get('servicio_id', type=int)
+    inicio = _fecha_hora_parametro('inicio')
+    fin = _fecha_hora_parametro('fin', requerido=False) or inicio + disponibilidad.DURACION_PREDETERMINADA
+    if not (lugar or servicio_id) or fin <= inicio:
+        abort(400)
+
+    conflictos = disponibilidad.indice.traslapes(inicio, fin, lugar=lugar, servicio_id=servicio_id,
+                                                 excluir=request.args.get('excluir', type=int))
+    return jsonify({'disponible': not conflictos, 'conflictos': [_intervalo_json(o) for o in conflictos]})
+
+
+# BUSQUEDA
+
+def url_resultado(resultado):
+    "Vista donde se abre un resultado de búsqueda según su tipo y el rol del usuario"
+    admin = current_user.es_admin()
+    if resultado.tipo == 'eventos':
+        return url_for('admin_ver_evento' if admin else 'cliente_ver_evento', evento_id=resultado.id)
+    if resultado.tipo == 'servicios':
+        return url_for('admin_editar_servicio', servicio_id=resultado.id) if admin else url_for('servicios')
+    if resultado.tipo == 'proveedores':
+        return url_for('admin_editar_proveedor', proveedor_id=resultado.id)
+    return url_for('admin_usuarios')
+
+
+def _tipos_busqueda():
+    "Tipos que puede buscar el usuario actual"
+    return list(busqueda.ENTIDADES) if current_user.es_admin() else list(busqueda.TIPOS_CLIENTE)
+
+
+@app.route('/api/buscar')
+@login_required
+@solo_lectura
+def api_buscar():
+    """Autocompletado: pocos resultados por tipo para ?q= (mínimo 2 caracteres)"""
+    q = request.args.get('q', '').strip()
+    if len(q) < 2:
+        abort(400)
+    permitidos = _tipos_busqueda()
+    tipos = [t for t in request.args.get('tipos', ','.join(permitidos)).split(',') if t in permitidos]
+    limite = max(1, min(request.args.get('limite', 5, type=int), 20))
+
+    inicio = time.perf_counter()
+    resultados = busqueda.autocompletar(q, tipos, current_user, limite=limite)
+    respuesta = {
+        tipo: [{
+            'id': r.id,
+            'titulo': busqueda.ENTIDADES[tipo].titulo(r.objeto),
+            'detalle': busqueda.ENTIDADES[tipo].detalle(r.objeto),
+            'url': url_resultado(r),
+            'rango': round(float(r.rango), 4),
+        } for r in filas]
+        for tipo, filas in resultados.items()
+    }
+    respuesta['ms'] = round((time.perf_counter() - inicio) * 1000, 3)
+    return jsonify(respuesta)
+
+
+@app.route('/buscar')
+@login_required
+@solo_lectura
+def buscar():
+    """Resultados de búsqueda paginados de un tipo (?tipo=) ordenados por relevancia"""
+    q = request.args.get('q', '').strip()
+    tipos = _tipos_busqueda()
+    tipo = request.args.get('tipo', tipos[0])
+    if tipo not in tipos:
+        abort(404)
+    resultados = None
+    if q:
+        try:
+            resultados = busqueda.pagina_resultados(tipo, q, current_user, request.args.get('pagina'))
+        except TokenInvalido:
+            abort(400)
+    return render_template('buscar.htm', q=q, tipo=tipo, tipos=tipos, resultados=resultados,
+                           entidad=busqueda.ENTIDADES[tipo], url_resultado=url_resultado)
+
+
+# API JSON (v1)
+
+def _respuesta_api(datos, status=200):
+    return Response(api.a_json(datos), status=status, mimetype='application/json')
+
+
+@app.route('/api/v1/<recurso>')
+@login_required
+@solo_lectura
+def api_listar(recurso):
+    """
+    Lista paginada por llave (?pagina=, ?por_pagina=) o lote por ids (?ids=1,2,3).
+    ?campos= elige las columnas, ?include=servicios agrega los servicios de cada evento
+    y cada filtro del recurso se pasa por nombre (p. ej. ?estado=confirmado).
+    """
+    if recurso not in api.RECURSOS:
+        abort(404)
+    if not api.puede_leer(recurso, current_user):
+        abort(403)
+    try:
+        campos = api.campos_pedidos(recurso, request.args.get('campos'))
+        incluir = api.inclusiones_pedidas(recurso, request.args.get('include'))
+        if 'ids' in request.args:
+            ids = api.ids_pedidos(request.args['ids'])
+            filas, faltantes = api.por_ids(recurso, current_user, ids, campos, incluir)
+            return _respuesta_api({'datos': filas, 'faltantes': faltantes})
+
+        filtros = {n: request.args[n] for n in api.RECURSOS[recurso].filtros if n in request.args}
+        filas, siguiente = api.listar(recurso, current_user, campos, incluir, filtros,
+                                      token=request.args.get('pagina'),
+                                      por_pagina=request.args.get('por_pagina', type=int))
+    except (api.ParametroInvalido, TokenInvalido) as e:
+        return _respuesta_api({'error': str(e)}, 400)
+    return _respuesta_api({'datos': filas, 'siguiente': siguiente})
+
+
+@app.route('/api/v1/<recurso>/<int:recurso_id>')
+@login_required
+@solo_lectura
+def api_detalle(recurso, recurso_id):
+    """Un registro por id; acepta ?campos= e ?include= igual que la lista"""
+    if recurso not in api.RECURSOS:
+        abort(404)
+    if not api.puede_leer(recurso, current_user):
+        abort(403)
+    try:
+        campos = api.campos_pedidos(recurso, request.args.get('campos'))
+        incluir = api.inclusiones_pedidas(recurso, request.args.get('include'))
+    except api.ParametroInvalido as e:
+        return _respuesta_api({'error': str(e)}, 400)
+    filas, _ = api.por_ids(recurso, current_user, [recurso_id], campos, incluir)
+    if not filas:
+        abort(404)
+    return _respuesta_api({'datos': filas[0]})
+
+
+_validaciones_por_ip = TTLCache(maxsize=10000)
+_validaciones_lock = threading.Lock()
+
+
+def _excede_limite_validacion():
+    """
+    Ventana fija por IP para los formularios públicos: sin límite /api/validar/registro
+    serviría para enumerar usuarios y correos registrados. El conteo es por proceso.
+    """
+    ventana = app.config['VALIDAR_VENTANA']
+    clave = (request.remote_addr, int(time.time() // ventana))
+    with _validaciones_lock:
+        intentos = _validaciones_por_ip.get(clave, 0) + 1
+        _validaciones_por_ip.set(clave, intentos, ttl=ventana)
+    return intentos > app.config['VALIDAR_LIMITE']
+
+
+@app.route('/api/validar/<formulario>', methods=['POST'])
+def api_validar(formulario):
+    """
+    Validación en vivo de campos de un formulario, sin template.
+    Recibe los valores como JSON o formulario; ?campos=a,b limita qué campos se revisan.
+    Exige el token CSRF de la sesión (header X-CSRFToken o campo csrf_token).
+    """
+    if formulario not in forms.VALIDABLES:
+        abort(404)
+    clase, permiso = forms.VALIDABLES[formulario]
+    if permiso == 'usuario' and not current_user.is_authenticated:
+        abort(403)
+    if permiso == 'admin' and not (current_user.is_authenticated and current_user.es_admin()):
+        abort(403)
+
+    cuerpo = request.get_json(silent=True)
+    if isinstance(cuerpo, dict):
+        datos = {k: '' if v is None else str(v) for k, v in cuerpo.items()}
+    else:
+        datos = request.form.to_dict()
+    token = request.headers.get('X-CSRFToken') or datos.pop('csrf_token', None)
+    if app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(token)
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+    if permiso == 'publico' and _excede_limite_validacion():
+        respuesta = jsonify({'error': 'Demasiadas validaciones, intenta más tarde'})
+        respuesta.headers['Retry-After'] = str(app.config['VALIDAR_VENTANA'])
+        return respuesta, 429
+
+    campos = [c for c in request.args.get('campos', '').split(',') if c] or None
+    errores = forms.validar_campos(clase, datos, campos)
+    return jsonify({'valido': not any(errores.values()), 'errores': errores})
+
+
+# COMANDOS DE MANTENIMIENTO
+
+@app.cli.command('reconciliar-totales')
+def reconciliar_totales_command():
+    "Corrige Evento.total_servicios cuando no coincide con la suma de sus servicios"
+    corregidos = reconciliar_totales()
+    print(f'Eventos corregidos: {corregidos}')
+
+
+@app.cli.command('worker')
+@click.option('--concurrencia', type=int, default=None, help='Trabajos en paralelo (TRABAJOS_CONCURRENCIA)')
+@click.option('--intervalo', type=int, default=None, help='Segundos entre revisiones de la cola (TRABAJOS_INTERVALO)')
+def worker_command(concurrencia, intervalo):
+    "Procesa la cola de trabajos en segundo plano hasta recibir Ctrl+C o SIGTERM"
+    worker = trabajos.Worker(
+        app,
+        concurrencia=concurrencia or app.config['TRABAJOS_CONCURRENCIA'],
+        intervalo=intervalo or app.config['TRABAJOS_INTERVALO'],
+        timeout=app.config['TRABAJOS_TIMEOUT'],
+        retraso_base=app.config['TRABAJOS_RETRASO_BASE'],
+    )
+    print(f'Worker {worker.nombre} con {worker.concurrencia} hilos')
+    try:
+        worker.ejecutar()
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f'Trabajos procesados: {worker.procesados}')
+
+
+@app.cli.command('trabajos')
+@click.option('--limpiar', type=int, default=None, help='Borrar los terminados hace más de N días')
+def trabajos_command(limpiar):
+    "Muestra cuántos trabajos hay en cada estado"
+    if limpiar is not None:
+        print(f'Trabajos borrados: {trabajos.limpiar(limpiar)}')
+    for estado, total in sorted(trabajos.resumen().items()):
+        print(f'{estado}: {total}')
+
+
+@app.cli.command('limpiar-sesiones')
+def limpiar_sesiones_command():
+    "Borra las sesiones expiradas del almacen configurado (para cron si SESIONES_LIMPIEZA=0)"
+    if not isinstance(app.session_interface, sesiones.SesionesServidor):
+        print('Las sesiones están en la cookie; no hay nada que limpiar.')
+        return
+    print(f'Sesiones borradas: {app.session_interface.almacen.limpiar()}')
+
+
+@app.cli.command('migrar')
+@click.option('--hasta', default=None, help='Aplicar solo hasta esta versión (p. ej. 0003)')
+def migrar_command(hasta):
+    "Aplica las migraciones pendientes de la carpeta migrations/"
+    aplicadas = migrar(hasta=hasta)
+    if aplicadas:
+        print('Migraciones aplicadas: ' + ', '.join(aplicadas))
+    else:
+        print('La base de datos ya está al día.')
+
+
+@app.cli.command('verificar-planes')
+def verificar_planes_command():
+    "Falla si alguna consulta frecuente hace Seq Scan en lugar de usar un índice"
+    regresiones = verificar_planes()
+    for nombre, tablas in regresiones.items():
+        print(f'{nombre}: Seq Scan en {", ".join(tablas)}')
+    if regresiones:
+        sys.exit(1)
+    print('Todas las consultas frecuentes usan índices.')
+
+
+@app.cli.command('importar')
+@click.argument('catalogo', type=click.Choice(list(bulk.CATALOGOS)))
+@click.argument('archivo', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--formato', type=click.Choice(bulk.FORMATOS), default=None, help='Por defecto se toma de la extensión')
+@click.option('--lote', default=bulk.TAMANO_LOTE, help='Filas por transacción')
+def importar_command(catalogo, archivo, formato, lote):
+    "Importa un archivo CSV o JSONL a servicios, proveedores o clientes"
+    formato = formato or ('jsonl' if archivo.name.endswith('.jsonl') else 'csv')
+    resultado = bulk.importar(catalogo, archivo, formato, tamano_lote=lote)
+    for linea, errores in resultado.errores:
+        print(f'Línea {linea}: {errores}', file=sys.stderr)
+    print(f'Filas leídas: {resultado.leidas}, insertadas: {resultado.insertadas}, '
+          f'con errores: {resultado.num_errores}')
+    if resultado.num_errores:
+        sys.exit(1)
+
+
+@app.cli.command('exportar')
+@click.argument('catalogo', type=click.Choice(list(bulk.CATALOGOS)))
+@click.argument('salida', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--formato', type=click.Choice(bulk.FORMATOS), default='csv')
+@click.option('--lote', default=bulk.TAMANO_LOTE, help='Filas por lectura del cursor')
+def exportar_command(catalogo, salida, formato, lote):
+    "Exporta un catálogo a CSV o JSONL (a la salida estándar por defecto)"
+    for bloque in bulk.exportar(catalogo, formato, tamano_lote=lote):
+        salida.write(bloque)
+
+
+@app.cli.command('refrescar-analitica')
+@click.option('--todas', is_flag=True, help='Refrescar todas las vistas aunque no haya cambios')
+@click.option('--intervalo', default=0, help='Repetir cada N segundos (0 = una sola vez, para cron)')
+def refrescar_analitica_command(todas, intervalo):
+    "Refresca las vistas de analítica cuyas tablas cambiaron desde el último refresco"
+    while True:
+        refrescadas = analitica.refrescar(todas=todas)
+        if refrescadas:
+            print(', '.join(f'{vista} ({ms} ms)' for vista, ms in refrescadas.items()))
+        elif not intervalo:
+            print('Sin cambios pendientes.')
+        if not intervalo:
+            break
+        time.sleep(intervalo)
+
+
+@app.cli.command('comparar-analitica')
+@click.option('--repeticiones', default=20, help='Ejecuciones de cada consulta')
+def comparar_analitica_command(repeticiones):
+    "Compara las consultas del panel contra las mismas consultas sobre las tablas transaccionales"
+    for nombre, r in analitica.comparar(repeticiones).items():
+        print(f"{nombre}: vista {r['materializada']['mediana_ms']:.2f} ms, "
+              f"directa {r['directa']['mediana_ms']:.2f} ms, x{r['aceleracion'] or 0:.1f}")
+
+
+@app.cli.command('bench-datos')
+@click.option('--escala', default=10000, help='Número de eventos (1000 a 10000000); el resto es proporcional')
+@click.option('--semilla', default=42, help='Misma semilla y escala, mismos datos')
+@click.option('--reemplazar', is_flag=True, help='Vaciar las tablas antes de generar')
+def bench_datos_command(escala, semilla, reemplazar):
+    "Llena la base de datos con datos sintéticos deterministas para benchmarks"
+    from bench import datos
+    password_hash = hashing.pool.generar_hash(datos.PASSWORD)
+    try:
+        v = datos.generar(escala, semilla=semilla, reemplazar=reemplazar, password_hash=password_hash)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f'Listo: {v.eventos} eventos de {v.usuarios} usuarios. Admin: {datos.ADMIN} / {datos.PASSWORD}')
+
+
+@app.cli.command('bench-carga')
+@click.option('--driver', type=click.Choice(['cliente', 'wsgi']), default='cliente',
+              help='Test client de Flask o servidor WSGI real en un hilo')
+@click.option('--iteraciones', default=200, help='Escenarios por cliente virtual')
+@click.option('--concurrencia', default=1, help='Clientes virtuales en paralelo')
+@click.option('--semilla', default=42)
+@click.option('--sin-cache-usuarios', is_flag=True, help='Cargar el usuario de la base de datos en cada petición')
+@click.option('--salida', default=None, help='Archivo JSON del reporte (por defecto bench/resultados/<fecha>.json)')
+def bench_carga_command(driver, iteraciones, concurrencia, semilla, sin_cache_usuarios, salida):
+    "Corre la carga con guion sobre las rutas y guarda latencias, consultas y memoria en JSON"
+    from bench import carga, reporte
+    # Las consultas por petición salen del header Server-Timing
+    if instrumentacion.activa is None:
+        app.config['INSTRUMENTACION'] = True
+        with app.app_context():
+            instrumentacion.init_app(app, db.engine, *([replica] if replica is not None else []))
+    resultado = carga.ejecutar(app, driver=driver, iteraciones=iteraciones, concurrencia=concurrencia,
+                               semilla=semilla, cache_usuarios=not sin_cache_usuarios)
+    salida = salida or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench', 'resultados',
+                                    datetime.utcnow().strftime('%Y%m%d-%H%M%S') + '.json')
+    reporte.guardar(resultado, salida)
+    for nombre, r in resultado['escenarios'].items():
+        print(f"{nombre}: {r['peticiones']} peticiones, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, "
+              f"{r['consultas_media']} consultas, {r['errores']} errores")
+    print(f"{resultado['peticiones_por_segundo']} peticiones/s, RSS máximo {resultado['memoria']['rss_maximo_kb']} KB")
+    print(f'Reporte: {salida}')
+
+
+@app.cli.command('bench-formularios')
+@click.option('--repeticiones', default=2000, help='Instancias de cada formulario')
+def bench_formularios_command(repeticiones):
+    "Costo por petición de construir y validar cada formulario (microsegundos)"
+    from bench import formularios
+    for nombre, r in formularios.medir(app, repeticiones).items():
+        print(f"{nombre}: primera {r['primera_us']} us, instanciar {r['instanciar_us']} us, "
+              f"validar {r['validar_us']} us, {r['consultas']} consultas al validar")
+
+
+@app.cli.command('bench-comparar')
+@click.argument('base')
+@click.argument('actual')
+@click.option('--umbral', default=10.0, help='Porcentaje de aumento que cuenta como regresión')
+def bench_comparar_command(base, actual, umbral):
+    "Compara dos reportes de bench-carga; falla si alguna métrica empeoró más del umbral"
+    from bench import reporte
+    filas, regresiones = reporte.comparar(reporte.cargar(base), reporte.cargar(actual), umbral)
+    print(reporte.formatear(filas))
+    for escenario, metrica, antes, ahora, _ in regresiones:
+        print(f'Regresión en {escenario}: {metrica} pasó de {antes} a {ahora}', file=sys.stderr)
+    if regresiones:
+        sys.exit(1)
+
+
 # MANEJO DE ERRORES
 
 @app.errorhandler(404)
@@ -611,6 +1464,14 @@ def forbidden(e):
     return render_template('403.htm', error=str(e)), 403
 
 
+@app.errorhandler(HashingSaturado)
+def hashing_saturado(e):
+    """Página de error 429 - El pool de hashing está saturado"""
+    respuesta = make_response(render_template('429.htm', error=str(e)), 429)
+    respuesta.headers['Retry-After'] = str(e.retry_after)
+    return respuesta
+
+
 @app.errorhandler(500)
 def internal_server_error(e):
     """Página de error 500 - Error del servidor"""
@@ -0,0 +1 @@
+"Benchmarks: datos sinteticos (datos), carga sobre las rutas (carga) y reportes comparables (reporte)"
@@ -0,0 +1,278 @@
+import http.client
+import platform
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import user_cache
+from db import db
+from bench import datos, reporte
+
+
+"""
+Carga con guion sobre las rutas reales. Cada cliente virtual inicia sesion
+como un cliente del generador y como el admin, y repite escenarios elegidos
+por peso. Se puede manejar con el test client de Flask (sin red, mide la
+aplicacion) o con un servidor WSGI real en un hilo (mide tambien HTTP y la
+concurrencia entre hilos). Las consultas por peticion se leen del header
+Server-Timing, asi que la instrumentacion debe estar activa.
+"""
+
+DRIVERS = ('cliente', 'wsgi')
+
+Respuesta = namedtuple('Respuesta', ['status', 'headers', 'cuerpo'])
+
+"Escenario de la carga: rol que lo ejecuta, peso relativo y funcion (cliente_virtual) -> [(nombre, Respuesta, segundos)]"
+Escenario = namedtuple('Escenario', ['nombre', 'rol', 'peso', 'funcion'])
+
+CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]*)"')
+CONSULTAS = re.compile(r'db;[^,]*desc="(\d+) consultas"')
+
+
+class _SinLog(WSGIRequestHandler):
+    "El log de cada peticion del servidor de desarrollo distorsiona la medicion"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class SesionFlask:
+    "Peticiones con el test client de Flask (conserva las cookies)"
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+        self.csrf = ''
+
+    def pedir(self, metodo, ruta, datos=None):
+        r = self.cliente.open(ruta, method=metodo, data=datos)
+        return Respuesta(r.status_code, r.headers, r.get_data(as_text=True))
+
+
+class SesionHttp:
+    "Peticiones HTTP a un servidor real; las cookies se manejan a mano para no seguir redirecciones"
+
+    def __init__(self, host, puerto):
+        self.host, self.puerto = host, puerto
+        self.cookies = {}
+        self.csrf = ''
+
+    def pedir(self, metodo, ruta, datos=None):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=headers)
+            r = conexion.getresponse()
+            contenido = r.read().decode('utf-8', 'replace')
+        finally:
+            conexion.close()
+        for encabezado in r.headers.get_all('Set-Cookie') or ():
+            for nombre, morsel in SimpleCookie(encabezado).items():
+                self.cookies[nombre] = morsel.value
+        return Respuesta(r.status, r.headers, contenido)
+
+
+def _medir(sesion, nombre, metodo, ruta, datos=None):
+    inicio = time.perf_counter()
+    try:
+        respuesta = sesion.pedir(metodo, ruta, datos)
+    except (OSError, http.client.HTTPException):
+        respuesta = Respuesta(0, {}, '')
+    return nombre, respuesta, time.perf_counter() - inicio
+
+
+class ClienteVirtual:
+    "Un usuario de la carga: su sesion de cliente, la del admin y los datos que puede tocar"
+
+    def __init__(self, sesion_cliente, sesion_admin, usuario, eventos, servicios, rnd):
+        self.cliente = sesion_cliente
+        self.admin = sesion_admin
+        self.usuario = usuario
+        self.eventos = eventos
+        self.servicios = servicios
+        self.rnd = rnd
+
+    def iniciar_sesion(self, sesion, username):
+        formulario = sesion.pedir('GET', '/login')
+        encontrado = CSRF.search(formulario.cuerpo)
+        campos = {'username': username, 'password': datos.PASSWORD}
+        if encontrado:
+            # El token vale para toda la sesion: se reutiliza en los demas formularios
+            sesion.csrf = campos['csrf_token'] = encontrado.group(1)
+        return [_medir(sesion, 'login', 'POST', '/login', campos)]
+
+
+def _login(cv):
+    "Cierra la sesion antes, si no /login solo redirige al dashboard"
+    cv.cliente.pedir('GET', '/logout')
+    return cv.iniciar_sesion(cv.cliente, cv.usuario)
+
+
+def _cliente_dashboard(cv):
+    return [_medir(cv.cliente, 'cliente_dashboard', 'GET', '/cliente/dashboard')]
+
+
+def _cliente_evento(cv):
+    evento_id = cv.rnd.choice(list(cv.eventos))
+    return [_medir(cv.cliente, 'cliente_evento', 'GET', f'/cliente/evento/{evento_id}')]
+
+
+def _agregar_quitar_servicio(cv):
+    "Agrega un servicio que el evento no tiene y lo vuelve a quitar: los datos quedan igual"
+    evento_id = cv.rnd.choice(list(cv.eventos))
+    libres = [s for s in cv.servicios if s[0] not in cv.eventos[evento_id]]
+    if not libres:
+        return []
+    servicio_id, precio = cv.rnd.choice(libres)
+    return [
+        _medir(cv.cliente, 'agregar_servicio', 'POST', f'/cliente/evento/{evento_id}/servicio/agregar',
+               {'servicio_id': servicio_id, 'precio_acordado': precio, 'csrf_token': cv.cliente.csrf}),
+        _medir(cv.cliente, 'quitar_servicio', 'POST',
+               f'/cliente/evento/{evento_id}/servicio/{servicio_id}/eliminar'),
+    ]
+
+
+def _admin(nombre, ruta):
+    def escenario(cv):
+        return [_medir(cv.admin, nombre, 'GET', ruta)]
+    return escenario
+
+
+ESCENARIOS = (
+    Escenario('login', 'cliente', 1, _login),
+    Escenario('cliente_dashboard', 'cliente', 6, _cliente_dashboard),
+    Escenario('cliente_evento', 'cliente', 8, _cliente_evento),
+    Escenario('agregar_quitar_servicio', 'cliente', 3, _agregar_quitar_servicio),
+    Escenario('admin_dashboard', 'admin', 2, _admin('admin_dashboard', '/admin/dashboard')),
+    Escenario('admin_eventos', 'admin', 2, _admin('admin_eventos', '/admin/eventos')),
+    Escenario('admin_usuarios', 'admin', 1, _admin('admin_usuarios', '/admin/usuarios')),
+    Escenario('admin_servicios', 'admin', 1, _admin('admin_servicios', '/admin/servicios')),
+    Escenario('api_eventos', 'admin', 2, _admin('api_eventos', '/api/v1/eventos?por_pagina=50')),
+)
+
+
+def _participantes(n, rnd):
+    """
+    Clientes del generador con eventos para cada cliente virtual (uno distinto
+    para cada uno, asi no se pisan al agregar y quitar servicios), con los
+    servicios ya contratados de cada evento y el catalogo disponible.
+    """
+    usuarios = db.session.execute(text(
+        "SELECT u.username, u.id FROM usuarios u WHERE u.rol = 'cliente' AND u.activo "
+        "AND EXISTS (SELECT 1 FROM eventos e WHERE e.usuario_id = u.id) ORDER BY u.id LIMIT :n"
+    ), {'n': n * 20}).all()
+    if len(usuarios) < n:
+        raise RuntimeError(f'Se necesitan {n} clientes con eventos y hay {len(usuarios)}; genera mas datos')
+    elegidos = rnd.sample(usuarios, n)
+    servicios = [tuple(f) for f in db.session.execute(text(
+        'SELECT id_servicio, precio_base::float FROM servicios WHERE disponible ORDER BY id_servicio'
+    )).all()]
+
+    participantes = []
+    for username, usuario_id in elegidos:
+        eventos = {}
+        for evento_id, servicio_id in db.session.execute(text(
+            'SELECT e.id, es.servicio_id FROM eventos e '
+            'LEFT JOIN evento_servicio es ON es.evento_id = e.id WHERE e.usuario_id = :u'
+        ), {'u': usuario_id}):
+            contratados = eventos.setdefault(evento_id, set())
+            if servicio_id is not None:
+                contratados.add(servicio_id)
+        participantes.append((username, eventos))
+    db.session.rollback()
+    return participantes, servicios
+
+
+def _trabajar(cv, iteraciones, escenarios, pesos, muestras, lock):
+    propias = []
+    propias.extend(cv.iniciar_sesion(cv.admin, datos.ADMIN))
+    propias.extend(_login(cv))
+    for _ in range(iteraciones):
+        escenario = cv.rnd.choices(escenarios, weights=pesos)[0]
+        propias.extend(escenario.funcion(cv))
+    with lock:
+        for nombre, respuesta, segundos in propias:
+            encontrado = CONSULTAS.search(respuesta.headers.get('Server-Timing', '') if respuesta.headers else '')
+            muestras.setdefault(nombre, []).append(
+                (segundos, respuesta.status, int(encontrado.group(1)) if encontrado else None))
+
+
+def ejecutar(app, driver='cliente', iteraciones=200, concurrencia=1, semilla=42, cache_usuarios=True):
+    """
+    Corre la carga y regresa el reporte (dict listo para JSON). `iteraciones`
+    es por cliente virtual; cada uno corre en su propio hilo.
+    """
+    if driver not in DRIVERS:
+        raise ValueError(f'Driver desconocido: {driver}')
+    if not cache_usuarios:
+        user_cache.init_app(app, backend=user_cache.SinCache())
+
+    rnd = random.Random(semilla)
+    with app.app_context():
+        participantes, servicios = _participantes(concurrencia, rnd)
+        filas = datos.contar()
+        db.session.remove()
+
+    servidor = None
+    if driver == 'wsgi':
+        servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_SinLog)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    def sesion():
+        if servidor is not None:
+            return SesionHttp('127.0.0.1', servidor.server_port)
+        return SesionFlask(app)
+
+    clientes = [ClienteVirtual(sesion(), sesion(), username, eventos, servicios, random.Random(semilla + i))
+                for i, (username, eventos) in enumerate(participantes)]
+    pesos = [e.peso for e in ESCENARIOS]
+    muestras, lock = {}, threading.Lock()
+    rss_inicial = reporte.rss_actual_kb()
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=_trabajar, args=(cv, iteraciones, ESCENARIOS, pesos, muestras, lock))
+             for cv in clientes]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    if servidor is not None:
+        servidor.shutdown()
+
+    total = sum(len(m) for m in muestras.values())
+    return {
+        'meta': {
+            'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+            'commit': reporte.commit_actual(),
+            'python': platform.python_version(),
+            'driver': driver,
+            'concurrencia': concurrencia,
+            'iteraciones': iteraciones,
+            'semilla': semilla,
+            'cache_usuarios': cache_usuarios,
+            'filas': filas,
+        },
+        'duracion_s': round(duracion, 3),
+        'peticiones': total,
+        'peticiones_por_segundo': round(total / duracion, 2) if duracion else None,
+        'memoria': {
+            'rss_inicial_kb': rss_inicial,
+            'rss_final_kb': reporte.rss_actual_kb(),
+            'rss_maximo_kb': reporte.rss_maximo_kb(),
+        },
+        'escenarios': {nombre: reporte.resumir(m) for nombre, m in sorted(muestras.items())},
+    }
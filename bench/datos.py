@@ -0,0 +1,196 @@
+import csv
+import io
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from db import db
+
+
+"""
+Generador de datos sinteticos para benchmarks. Con la misma escala y semilla
+produce siempre las mismas filas. Se carga con COPY en lotes, asi que llega a
+millones de filas sin pasar por el ORM; solo funciona con PostgreSQL.
+"""
+
+"Cuantas filas de cada tabla corresponden a una escala (numero de eventos)"
+Volumen = namedtuple('Volumen', ['usuarios', 'servicios', 'proveedores', 'eventos'])
+
+PASSWORD = 'bench123'
+ADMIN = 'bench_admin'
+FECHA_BASE = datetime(2025, 1, 1)
+SERVICIOS_POR_EVENTO = 6
+TAMANO_LOTE = 20000
+
+LUGARES = [
+    'Hacienda San Gabriel', 'Jardín Los Arcos', 'Salón Versalles', 'Quinta Real', 'Casa Mora',
+    'Terraza del Lago', 'Hotel Colonial', 'Finca El Roble', 'Club Campestre', 'Museo de Arte',
+]
+CATEGORIAS = ['catering', 'decoracion', 'musica', 'fotografia', 'video', 'flores', 'transporte', 'pasteleria']
+ESTADOS = [('pendiente', 40), ('confirmado', 35), ('completado', 15), ('cancelado', 10)]
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Carlos', 'Lucía', 'Diego', 'Elena', 'Jorge']
+APELLIDOS = ['García', 'López', 'Martínez', 'Hernández', 'Pérez', 'Sánchez', 'Ramírez', 'Torres']
+
+TABLAS = ('evento_servicio', 'eventos', 'proveedores', 'servicios', 'usuarios')
+
+"Columnas que llena el generador (las generadas, como periodo y busqueda, las calcula PostgreSQL)"
+COLUMNAS = {
+    'usuarios': ['id', 'username', 'email', 'password', 'rol', 'nombre_completo', 'telefono',
+                 'fecha_registro', 'activo'],
+    'servicios': ['id_servicio', 'nombre', 'descripcion', 'precio_base', 'categoria', 'disponible',
+                  'imagen_url', 'fecha_creacion', 'fecha_actualizacion'],
+    'proveedores': ['id', 'nombre', 'tipo_servicio', 'contacto', 'telefono', 'email', 'calificacion',
+                    'notas', 'activo'],
+    'eventos': ['id', 'usuario_id', 'titulo', 'descripcion', 'fecha_evento', 'fecha_fin', 'lugar',
+                'num_invitados', 'presupuesto_estimado', 'estado', 'total_servicios',
+                'fecha_creacion', 'fecha_actualizacion'],
+    'evento_servicio': ['id', 'evento_id', 'servicio_id', 'precio_acordado', 'notas', 'fecha_agregado'],
+}
+
+
+def volumen(escala):
+    "Proporciones aproximadas de una instalacion real: ~10 eventos por cliente"
+    return Volumen(
+        usuarios=max(10, escala // 10),
+        servicios=max(20, min(5000, escala // 50)),
+        proveedores=max(10, min(20000, escala // 100)),
+        eventos=escala,
+    )
+
+
+def _copy(cursor, tabla, filas):
+    "Envia las filas con COPY en lotes de TAMANO_LOTE"
+    sentencia = f"COPY {tabla} ({', '.join(COLUMNAS[tabla])}) FROM STDIN WITH (FORMAT csv, NULL '')"
+    total = 0
+    while True:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        n = 0
+        for fila in filas:
+            escritor.writerow(fila)
+            n += 1
+            if n == TAMANO_LOTE:
+                break
+        if n == 0:
+            break
+        buffer.seek(0)
+        cursor.copy_expert(sentencia, buffer)
+        total += n
+        if n < TAMANO_LOTE:
+            break
+    return total
+
+
+def _usuarios(v, rnd, password_hash):
+    yield (1, ADMIN, 'admin@bench.local', password_hash, 'admin', 'Admin Bench', '', FECHA_BASE, True)
+    for i in range(2, v.usuarios + 1):
+        nombre = f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}'
+        registro = FECHA_BASE - timedelta(days=rnd.randint(0, 720))
+        yield (i, f'bench_usuario{i}', f'usuario{i}@bench.local', password_hash, 'cliente', nombre,
+               f'55{rnd.randint(10000000, 99999999)}', registro, True)
+
+
+def _servicios(v, rnd, precios):
+    for i in range(1, v.servicios + 1):
+        categoria = CATEGORIAS[i % len(CATEGORIAS)]
+        precio = round(rnd.uniform(500, 50000), 2)
+        precios[i] = precio
+        creado = FECHA_BASE - timedelta(days=rnd.randint(0, 365))
+        yield (i, f'{categoria.capitalize()} {i}', f'Servicio de {categoria} número {i}', precio, categoria,
+               rnd.random() > 0.1, '', creado, creado)
+
+
+def _proveedores(v, rnd):
+    for i in range(1, v.proveedores + 1):
+        categoria = CATEGORIAS[i % len(CATEGORIAS)]
+        yield (i, f'Proveedor {i}', categoria, f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}',
+               f'33{rnd.randint(10000000, 99999999)}', f'proveedor{i}@bench.local',
+               round(rnd.uniform(1, 5), 2), '', rnd.random() > 0.05)
+
+
+def _eventos(v, rnd, precios, contratados):
+    """
+    Eventos y sus servicios contratados. total_servicios se calcula con los
+    mismos precios que se escriben en evento_servicio, asi que ya esta
+    reconciliado. El lugar lleva el numero del evento para no chocar con la
+    restriccion de exclusion por lugar y periodo.
+    """
+    estados = [e for e, peso in ESTADOS for _ in range(peso)]
+    id_contratado = 0
+    for i in range(1, v.eventos + 1):
+        inicio = FECHA_BASE + timedelta(days=rnd.randint(-365, 730), hours=rnd.randint(10, 20))
+        fin = inicio + timedelta(hours=rnd.randint(4, 10))
+        servicios = rnd.sample(range(1, v.servicios + 1), rnd.randint(0, SERVICIOS_POR_EVENTO))
+        total = 0
+        for servicio_id in servicios:
+            precio = round(precios[servicio_id] * rnd.uniform(0.8, 1.2), 2)
+            total += precio
+            id_contratado += 1
+            contratados.append((id_contratado, i, servicio_id, precio, '', inicio - timedelta(days=30)))
+        creado = inicio - timedelta(days=rnd.randint(30, 365))
+        yield (i, rnd.randint(2, v.usuarios) if v.usuarios > 1 else 1, f'Evento {i}',
+               f'Celebración número {i}', inicio, fin, f'{LUGARES[i % len(LUGARES)]} #{i}',
+               rnd.randint(20, 400), round(rnd.uniform(20000, 500000), 2), rnd.choice(estados),
+               round(total, 2), creado, creado)
+
+
+def contar():
+    "Filas actuales de cada tabla del generador"
+    return {t: db.session.execute(text(f'SELECT count(*) FROM {t}')).scalar() for t in TABLAS}
+
+
+def generar(escala, semilla=42, reemplazar=False, password_hash=None, salida=print):
+    """
+    Llena usuarios, servicios, proveedores, eventos y evento_servicio. Las
+    tablas deben estar vacias, o se vacian con reemplazar=True (TRUNCATE).
+    La contraseña de todos los usuarios es PASSWORD; el admin es ADMIN.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError('El generador usa COPY: solo funciona con PostgreSQL')
+    existentes = contar()
+    if any(existentes.values()):
+        if not reemplazar:
+            raise RuntimeError(f'Las tablas ya tienen datos ({existentes}); usa --reemplazar para vaciarlas')
+        db.session.execute(text(f"TRUNCATE {', '.join(TABLAS)}, trabajos RESTART IDENTITY CASCADE"))
+        db.session.commit()
+
+    v = volumen(escala)
+    rnd = random.Random(semilla)
+    precios = {}
+    contratados = []
+    conexion = db.session.connection().connection
+    cursor = conexion.cursor()
+
+    salida(f"usuarios: {_copy(cursor, 'usuarios', _usuarios(v, rnd, password_hash))}")
+    salida(f"servicios: {_copy(cursor, 'servicios', _servicios(v, rnd, precios))}")
+    salida(f"proveedores: {_copy(cursor, 'proveedores', _proveedores(v, rnd))}")
+
+    # Los servicios contratados se acumulan mientras se generan los eventos y se
+    # envian por lotes para no tener millones de filas en memoria
+    eventos = _eventos(v, rnd, precios, contratados)
+    total_eventos = total_contratados = 0
+    while True:
+        lote = []
+        for fila in eventos:
+            lote.append(fila)
+            if len(lote) == TAMANO_LOTE:
+                break
+        if not lote:
+            break
+        total_eventos += _copy(cursor, 'eventos', iter(lote))
+        total_contratados += _copy(cursor, 'evento_servicio', iter(contratados))
+        contratados.clear()
+    salida(f'eventos: {total_eventos}')
+    salida(f'evento_servicio: {total_contratados}')
+
+    for tabla, columna in (('usuarios', 'id'), ('servicios', 'id_servicio'), ('proveedores', 'id'),
+                           ('eventos', 'id'), ('evento_servicio', 'id')):
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{tabla}', '{columna}'), "
+                       f"COALESCE((SELECT max({columna}) FROM {tabla}), 1))")
+    db.session.commit()
+    for tabla in TABLAS:
+        db.session.execute(text(f'ANALYZE {tabla}'))
+    db.session.commit()
+    return v
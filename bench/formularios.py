@@ -0,0 +1,68 @@
+import time
+
+from sqlalchemy import event
+
+from db import db
+from forms import EventoForm, LoginForm, ProveedorForm, RegistroForm, ServicioForm
+
+
+"""
+Microbenchmark del costo de los formularios por peticion: la primera
+instancia de una clase (WTForms arma ahi la lista de campos y la clase Meta,
+lo que forms.init_app adelanta al arranque), las siguientes y la validacion
+completa de un POST valido, con las consultas que hace.
+"""
+
+"Datos de un POST valido para cada formulario"
+DATOS = {
+    LoginForm: {'username': 'bench_usuario', 'password': 'secreto123'},
+    RegistroForm: {'username': 'bench_nuevo', 'nombre_completo': 'Usuario Nuevo', 'email': 'nuevo@bench.local',
+                   'telefono': '5512345678', 'password': 'secreto123', 'confirmar_password': 'secreto123'},
+    EventoForm: {'titulo': 'Boda de prueba', 'fecha_evento': '2030-05-01T18:00', 'duracion_horas': '8',
+                 'lugar': 'Salón Versalles', 'num_invitados': '150', 'presupuesto_estimado': '250000',
+                 'estado': 'pendiente'},
+    ServicioForm: {'nombre': 'Banquete', 'precio_base': '15000', 'categoria': 'catering', 'disponible': 'y'},
+    ProveedorForm: {'nombre': 'Flores del Valle', 'email': 'flores@bench.local', 'calificacion': '4.5'},
+}
+
+
+def _por_vuelta(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return round((time.perf_counter() - inicio) / repeticiones * 1e6, 1)
+
+
+def medir(app, repeticiones=2000):
+    consultas = [0]
+
+    def contar(*args):
+        consultas[0] += 1
+
+    resultados = {}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        try:
+            for clase, datos in DATOS.items():
+                with app.test_request_context(method='POST', data=datos):
+                    # Una subclase nueva aun no tiene la lista de campos: su primera instancia la arma
+                    nueva = type(clase.__name__, (clase,), {})
+                    inicio = time.perf_counter()
+                    nueva(meta={'csrf': False})
+                    primera = round((time.perf_counter() - inicio) * 1e6, 1)
+
+                    instanciar = _por_vuelta(lambda: clase(meta={'csrf': False}), repeticiones)
+                    validar = _por_vuelta(lambda: clase(meta={'csrf': False}).validate(),
+                                          max(1, repeticiones // 10))
+                    consultas[0] = 0
+                    clase(meta={'csrf': False}).validate()
+                    resultados[clase.__name__] = {
+                        'primera_us': primera,
+                        'instanciar_us': instanciar,
+                        'validar_us': validar,
+                        'consultas': consultas[0],
+                    }
+                db.session.rollback()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', contar)
+    return resultados
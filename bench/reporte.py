@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import resource
+import subprocess
+
+
+"""
+Resultados de una corrida de carga como JSON: percentiles de latencia y
+consultas por escenario, memoria del proceso y datos del entorno. Dos
+reportes se comparan con `comparar` para detectar regresiones.
+"""
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentil(valores_ordenados, p):
+    "Percentil con interpolacion lineal sobre una lista ya ordenada"
+    if not valores_ordenados:
+        return None
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    abajo, arriba = math.floor(posicion), math.ceil(posicion)
+    if abajo == arriba:
+        return valores_ordenados[abajo]
+    return valores_ordenados[abajo] + (valores_ordenados[arriba] - valores_ordenados[abajo]) * (posicion - abajo)
+
+
+def rss_actual_kb():
+    "Memoria residente actual del proceso (Linux); None si no se puede leer"
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def rss_maximo_kb():
+    "Pico de memoria residente del proceso (ru_maxrss esta en KB en Linux)"
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def resumir(muestras):
+    """
+    Resumen de las muestras de un escenario: lista de (segundos, status, consultas).
+    Las latencias se reportan en milisegundos; status 0 es una peticion sin respuesta.
+    """
+    latencias = sorted(m[0] * 1000 for m in muestras)
+    consultas = [m[2] for m in muestras if m[2] is not None]
+    resumen = {
+        'peticiones': len(muestras),
+        'errores': sum(1 for m in muestras if m[1] >= 500 or m[1] == 0),
+        'status': {},
+        'media_ms': round(sum(latencias) / len(latencias), 3) if latencias else None,
+        'max_ms': round(latencias[-1], 3) if latencias else None,
+        'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else None,
+        'consultas_max': max(consultas) if consultas else None,
+    }
+    for p in PERCENTILES:
+        valor = percentil(latencias, p)
+        resumen[f'p{p}_ms'] = round(valor, 3) if valor is not None else None
+    for m in muestras:
+        resumen['status'][str(m[1])] = resumen['status'].get(str(m[1]), 0) + 1
+    return resumen
+
+
+def guardar(reporte, ruta):
+    carpeta = os.path.dirname(ruta)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def comparar(base, actual, umbral=10.0, metricas=('p50_ms', 'p95_ms', 'consultas_media')):
+    """
+    Compara escenario por escenario. Regresa (filas, regresiones): cada fila es
+    (escenario, metrica, base, actual, cambio_pct) y una regresion es una metrica
+    que crecio mas de `umbral` por ciento, o un escenario que ahora tiene errores.
+    """
+    filas, regresiones = [], []
+    for escenario, datos in sorted(actual['escenarios'].items()):
+        anterior = base['escenarios'].get(escenario)
+        if anterior is None:
+            continue
+        if datos['errores'] > anterior['errores']:
+            regresiones.append((escenario, 'errores', anterior['errores'], datos['errores'], None))
+        for metrica in metricas:
+            antes, ahora = anterior.get(metrica), datos.get(metrica)
+            if antes is None or ahora is None:
+                continue
+            cambio = (ahora - antes) / antes * 100 if antes else (0.0 if ahora == antes else math.inf)
+            fila = (escenario, metrica, antes, ahora, cambio)
+            filas.append(fila)
+            if cambio > umbral:
+                regresiones.append(fila)
+    return filas, regresiones
+
+
+def formatear(filas):
+    lineas = [f"{'escenario':<24} {'metrica':<16} {'base':>10} {'actual':>10} {'cambio':>9}"]
+    for escenario, metrica, antes, ahora, cambio in filas:
+        texto_cambio = f'{cambio:+.1f}%' if cambio is not None and math.isfinite(cambio) else 'n/a'
+        lineas.append(f'{escenario:<24} {metrica:<16} {antes:>10} {ahora:>10} {texto_cambio:>9}')
+    return '\n'.join(lineas)
@@ -0,0 +1,279 @@
+import csv
+import io
+import json
+import os
+import secrets
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+from db import db
+from forms import ClienteForm, ProveedorForm, ServicioForm
+from models import Cliente, Proveedor, Servicio
+import fragment_cache
+import stats
+
+
+"Modelo, formulario que valida cada fila y columnas que se importan"
+Catalogo = namedtuple('Catalogo', ['modelo', 'formulario', 'campos', 'booleanos'])
+
+CATALOGOS = {
+    'servicios': Catalogo(
+        Servicio, ServicioForm,
+        ['nombre', 'descripcion', 'precio_base', 'categoria', 'imagen_url', 'disponible'],
+        {'disponible'},
+    ),
+    'proveedores': Catalogo(
+        Proveedor, ProveedorForm,
+        ['nombre', 'tipo_servicio', 'contacto', 'telefono', 'email', 'calificacion', 'notas', 'activo'],
+        {'activo'},
+    ),
+    'clientes': Catalogo(
+        Cliente, ClienteForm,
+        ['nombre', 'correo', 'telefono', 'direccion'],
+        set(),
+    ),
+}
+
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 1000
+"Errores que se guardan con detalle; despues de este limite solo se cuentan"
+MAX_ERRORES_REPORTADOS = 1000
+
+_FALSOS = {'', '0', 'false', 'f', 'no', 'n'}
+
+
+class ResultadoImportacion:
+    "Resumen de una importacion: filas insertadas y errores por fila"
+
+    def __init__(self):
+        self.leidas = 0
+        self.insertadas = 0
+        self.num_errores = 0
+        self.errores = []
+
+    def agregar_error(self, linea, errores):
+        self.num_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append((linea, errores))
+
+    def como_dict(self):
+        return {
+            'leidas': self.leidas,
+            'insertadas': self.insertadas,
+            'num_errores': self.num_errores,
+            'errores': [{'linea': linea, 'errores': errores} for linea, errores in self.errores],
+        }
+
+
+def leer_filas(archivo, formato):
+    "Genera (numero de linea, dict) de un archivo de texto CSV (con encabezado) o JSONL"
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    elif formato == 'jsonl':
+        for num, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                yield num, None
+                continue
+            yield num, fila if isinstance(fila, dict) else None
+    else:
+        raise ValueError(f'Formato no soportado: {formato}')
+
+
+def _formdata(catalogo, fila):
+    datos = MultiDict()
+    for campo in catalogo.campos:
+        if campo not in fila or fila[campo] is None:
+            continue
+        valor = fila[campo]
+        if campo in catalogo.booleanos:
+            # BooleanField solo considera falso '' y 'false'; en los archivos tambien '0', 'no'...
+            if str(valor).strip().lower() in _FALSOS:
+                continue
+            valor = 'y'
+        datos[campo] = str(valor)
+    return datos
+
+
+def validar_fila(catalogo, fila, form=None):
+    """
+    Valida una fila con las reglas del formulario del catalogo; regresa (valores, errores).
+    Se puede pasar un formulario ya construido para reutilizarlo entre filas:
+    crear los campos de un formulario cuesta mas que validarlos.
+    """
+    if fila is None:
+        return None, {'fila': ['La línea no es un objeto JSON válido']}
+
+    if form is None:
+        form = catalogo.formulario(formdata=None, meta={'csrf': False})
+    form.process(formdata=_formdata(catalogo, fila))
+    if not form.validate():
+        return None, form.errors
+
+    tabla = catalogo.modelo.__table__
+    valores = {}
+    for campo in catalogo.campos:
+        if campo in catalogo.booleanos and campo not in fila:
+            continue  # columna ausente: se usa el default del modelo
+        valor = form[campo].data
+        if isinstance(valor, Decimal) and isinstance(tabla.c[campo].type, db.Float):
+            valor = float(valor)
+        valores[campo] = valor
+    return valores, None
+
+
+def _insertar_lote(catalogo, lote, resultado):
+    """
+    Inserta un lote en una transaccion con un solo executemany. Si la base de
+    datos rechaza el lote (p. ej. un correo duplicado) se reintenta fila por fila
+    para reportar solo las filas culpables.
+    """
+    tabla = catalogo.modelo.__table__
+    try:
+        db.session.execute(insert(tabla), [valores for _, valores in lote])
+        db.session.commit()
+        resultado.insertadas += len(lote)
+        return
+    except DBAPIError:
+        db.session.rollback()
+
+    for linea, valores in lote:
+        try:
+            db.session.execute(insert(tabla), [valores])
+            db.session.commit()
+            resultado.insertadas += 1
+        except DBAPIError as e:
+            db.session.rollback()
+            resultado.agregar_error(linea, {'base_de_datos': [str(e.orig).strip()]})
+
+
+def importar(nombre_catalogo, archivo, formato='csv', tamano_lote=TAMANO_LOTE):
+    """
+    Importa un archivo de texto al catalogo indicado. La memoria usada depende
+    del tamaño del lote, no del archivo: las filas se leen, validan e insertan
+    por lotes con una transaccion cada uno. Una fila invalida no detiene la carga.
+    """
+    catalogo = CATALOGOS[nombre_catalogo]
+    resultado = ResultadoImportacion()
+    form = catalogo.formulario(formdata=None, meta={'csrf': False})
+    lote = []
+
+    for linea, fila in leer_filas(archivo, formato):
+        resultado.leidas += 1
+        valores, errores = validar_fila(catalogo, fila, form)
+        if errores:
+            resultado.agregar_error(linea, errores)
+            continue
+        lote.append((linea, valores))
+        if len(lote) >= tamano_lote:
+            _insertar_lote(catalogo, lote, resultado)
+            lote = []
+
+    if lote:
+        _insertar_lote(catalogo, lote, resultado)
+
+    if resultado.insertadas:
+        # Los inserts de Core no pasan por los eventos del ORM
+        fragment_cache.invalidar_tabla(catalogo.modelo.__tablename__)
+        stats.invalidar()
+    return resultado
+
+
+def directorio():
+    "Archivos subidos en /admin/importar mientras el worker los procesa; web y worker deben compartirlo"
+    carpeta = current_app.config.get('IMPORTACIONES_DIR') or os.path.join(current_app.instance_path, 'importaciones')
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def guardar_subida(archivo):
+    "Guarda el archivo subido (FileStorage) con un nombre aleatorio y regresa ese nombre"
+    nombre = f'{secrets.token_hex(16)}.txt'
+    archivo.save(os.path.join(directorio(), nombre))
+    return nombre
+
+
+def importar_subida(nombre_catalogo, nombre, formato):
+    """
+    Importa un archivo de guardar_subida (lo llama el worker), deja el resumen
+    en <nombre>.json para la pagina de estado y borra el archivo. La marca
+    <nombre>.inicio se crea antes del primer lote: si el worker cae a la mitad,
+    otra ejecucion la encuentra y falla en lugar de volver a insertar los
+    lotes ya confirmados.
+    """
+    ruta = os.path.join(directorio(), nombre)
+    try:
+        open(f'{ruta}.inicio', 'x').close()
+    except FileExistsError:
+        raise RuntimeError(f'La importacion {nombre} ya se habia iniciado y no termino; no se repite')
+    with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+        resultado = importar(nombre_catalogo, archivo, formato)
+    with open(f'{ruta}.json', 'w', encoding='utf-8') as f:
+        json.dump(resultado.como_dict(), f, ensure_ascii=False)
+    os.remove(ruta)
+    os.remove(f'{ruta}.inicio')
+    return resultado
+
+
+def resumen_subida(nombre):
+    "Resumen (como_dict) que dejo importar_subida, o None si no existe"
+    try:
+        with open(os.path.join(directorio(), f'{nombre}.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def exportar(nombre_catalogo, formato='csv', tamano_lote=TAMANO_LOTE):
+    """
+    Genera el catalogo como texto (CSV con encabezado o JSONL), un bloque por
+    lote. Las filas se leen con un cursor del lado del servidor (yield_per),
+    asi que nunca se carga la tabla completa en memoria.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato}')
+    tabla = CATALOGOS[nombre_catalogo].modelo.__table__
+    columnas = [c.name for c in tabla.columns]
+
+    resultado = db.session.execute(
+        select(tabla).order_by(*tabla.primary_key.columns),
+        execution_options={'yield_per': tamano_lote},
+    )
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if formato == 'csv':
+        escritor.writerow(columnas)
+
+    for filas in resultado.partitions():
+        for fila in filas:
+            if formato == 'csv':
+                escritor.writerow(fila)
+            else:
+                buffer.write(json.dumps(dict(zip(columnas, map(_serializar, fila))), ensure_ascii=False))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,162 @@
+import re
+from collections import namedtuple
+
+from sqlalchemy import false, func, literal_column, select, text
+
+from db import db
+from models import Evento, Proveedor, Servicio, Usuario
+from pagination import Pagina, codificar_token, decodificar_token, POR_PAGINA, MAX_POR_PAGINA
+
+
+"""
+Tabla buscable: configuracion de text search de su columna `busqueda`,
+expresion con la que se compara por trigramas (la del indice *_trgm) y
+como se muestra cada resultado.
+"""
+Entidad = namedtuple('Entidad', ['modelo', 'configuracion', 'texto_difuso', 'titulo', 'detalle'])
+
+ENTIDADES = {
+    'eventos': Entidad(
+        Evento, 'spanish', Evento.titulo,
+        lambda e: e.titulo, lambda e: e.lugar,
+    ),
+    'servicios': Entidad(
+        Servicio, 'spanish', Servicio.nombre,
+        lambda s: s.nombre, lambda s: s.categoria,
+    ),
+    'proveedores': Entidad(
+        Proveedor, 'spanish', Proveedor.nombre,
+        lambda p: p.nombre, lambda p: p.tipo_servicio,
+    ),
+    'usuarios': Entidad(
+        Usuario, 'simple',
+        Usuario.username + ' ' + func.coalesce(Usuario.nombre_completo, '') + ' ' + Usuario.email,
+        lambda u: u.nombre_completo or u.username, lambda u: u.email,
+    ),
+}
+
+"Lo que puede buscar un cliente (con las restricciones de _restringir)"
+TIPOS_CLIENTE = ('eventos', 'servicios')
+
+"Filas que se rankean como maximo por consulta de autocompletado"
+MAX_CANDIDATOS = 1000
+"Desplazamiento maximo de la paginacion de resultados"
+MAX_DESPLAZAMIENTO = 1000
+
+class Resultado(namedtuple('Resultado', ['tipo', 'objeto', 'rango'])):
+    @property
+    def id(self):
+        "Llave primaria del objeto (Servicio usa id_servicio)"
+        return db.inspect(self.objeto).identity[0]
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+_trgm = {}
+
+
+def consulta_tsquery(q):
+    """
+    Convierte el texto del usuario en una tsquery: todas las palabras deben
+    aparecer y la ultima puede estar incompleta (prefijo), para autocompletar.
+    Regresa None si no hay palabras.
+    """
+    palabras = _PALABRA.findall((q or '').lower())[:8]
+    if not palabras:
+        return None
+    palabras[-1] += ':*'
+    return ' & '.join(palabras)
+
+
+def tiene_trigramas():
+    "True si la extension pg_trgm esta instalada (se revisa una vez por proceso)"
+    if 'disponible' not in _trgm:
+        _trgm['disponible'] = bool(db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).scalar())
+    return _trgm['disponible']
+
+
+def _restringir(consulta, tipo, usuario):
+    "Un cliente solo ve sus eventos y los servicios disponibles"
+    if usuario is None or usuario.es_admin():
+        return consulta
+    if tipo == 'eventos':
+        return consulta.where(Evento.usuario_id == usuario.id)
+    if tipo == 'servicios':
+        return consulta.where(Servicio.disponible.is_(True))
+    return consulta.where(false())
+
+
+def _texto_completo(tipo, tsquery, usuario, limite, desplazamiento, candidatos):
+    entidad = ENTIDADES[tipo]
+    modelo = entidad.modelo
+    vector = literal_column(f'{modelo.__tablename__}.busqueda')
+    consulta_ts = func.to_tsquery(literal_column(f"'{entidad.configuracion}'::regconfig"), tsquery)
+    coincide = vector.op('@@')(consulta_ts)
+    llave = modelo.__mapper__.primary_key[0]
+
+    consulta = select(modelo, func.ts_rank_cd(vector, consulta_ts).label('rango'))
+    if candidatos:
+        # Con prefijos muy cortos puede haber muchisimas coincidencias: se rankea solo una muestra
+        muestra = _restringir(select(llave).where(coincide), tipo, usuario).limit(candidatos)
+        consulta = consulta.where(llave.in_(muestra))
+    else:
+        consulta = _restringir(consulta.where(coincide), tipo, usuario)
+
+    consulta = consulta.order_by(literal_column('rango').desc(), llave).offset(desplazamiento).limit(limite)
+    return [Resultado(tipo, obj, rango) for obj, rango in db.session.execute(consulta)]
+
+
+def _difusa(tipo, q, usuario, limite, desplazamiento):
+    "Coincidencias por similitud de trigramas (operador %) para palabras mal escritas"
+    entidad = ENTIDADES[tipo]
+    similitud = func.similarity(entidad.texto_difuso, q)
+    consulta = (
+        select(entidad.modelo, similitud.label('rango'))
+        .where(entidad.texto_difuso.op('%')(q))
+        .order_by(similitud.desc(), entidad.modelo.__mapper__.primary_key[0])
+        .offset(desplazamiento)
+        .limit(limite)
+    )
+    consulta = _restringir(consulta, tipo, usuario)
+    return [Resultado(tipo, obj, rango) for obj, rango in db.session.execute(consulta)]
+
+
+def buscar(tipo, q, usuario=None, limite=10, desplazamiento=0, candidatos=None):
+    """
+    Resultados de un tipo ordenados por relevancia. Primero texto completo
+    (GIN sobre `busqueda`); si no encuentra nada y pg_trgm esta instalado,
+    busqueda difusa por trigramas.
+    """
+    tsquery = consulta_tsquery(q)
+    if tsquery is None:
+        return []
+    resultados = _texto_completo(tipo, tsquery, usuario, limite, desplazamiento, candidatos)
+    if not resultados and desplazamiento == 0 and tiene_trigramas():
+        resultados = _difusa(tipo, q.strip(), usuario, limite, desplazamiento)
+    return resultados
+
+
+def autocompletar(q, tipos, usuario=None, limite=5):
+    "Pocos resultados de cada tipo para una caja de autocompletado: {tipo: [Resultado]}"
+    return {
+        tipo: buscar(tipo, q, usuario, limite=limite, candidatos=MAX_CANDIDATOS)
+        for tipo in tipos
+    }
+
+
+def pagina_resultados(tipo, q, usuario=None, token=None, por_pagina=None):
+    """
+    Pagina de resultados rankeados. El orden por relevancia no permite
+    paginar por llave, asi que el token guarda el desplazamiento (acotado).
+    """
+    por_pagina = max(1, min(por_pagina or POR_PAGINA, MAX_POR_PAGINA))
+    desplazamiento = decodificar_token(token, 1)[0] if token else 0
+    if not isinstance(desplazamiento, int) or not 0 <= desplazamiento <= MAX_DESPLAZAMIENTO:
+        desplazamiento = 0
+
+    filas = buscar(tipo, q, usuario, limite=por_pagina + 1, desplazamiento=desplazamiento)
+    siguiente = None
+    if len(filas) > por_pagina and desplazamiento + por_pagina <= MAX_DESPLAZAMIENTO:
+        filas = filas[:por_pagina]
+        siguiente = codificar_token([desplazamiento + por_pagina])
+    return Pagina(filas[:por_pagina], siguiente=siguiente, actual=token)
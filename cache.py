@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+_FALTANTE = object()
+
+
+class TTLCache:
+    """
+    Cache en memoria del proceso con expiracion por entrada (TTL) y limite de
+    tamaño (se descarta la entrada usada menos recientemente). Es seguro entre hilos
+    y lleva contadores de aciertos y fallos para exponerlos como metricas.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave, _FALTANTE)
+            if entrada is not _FALTANTE:
+                expira, valor = entrada
+                if expira > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                del self._datos[clave]
+            self.misses += 1
+            return default
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while self.maxsize and len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def obtener(self, clave, calcular):
+        "Regresa el valor guardado o lo calcula con `calcular()` y lo guarda"
+        valor = self.get(clave, _FALTANTE)
+        if valor is _FALTANTE:
+            valor = calcular()
+            self.set(clave, valor)
+        return valor
+
+    def invalidar(self, clave=None):
+        "Elimina una entrada, o todas si no se indica clave"
+        with self._lock:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def __len__(self):
+        return len(self._datos)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entradas': len(self._datos),
+            'ttl': self.ttl,
+        }
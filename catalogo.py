@@ -0,0 +1,84 @@
+"""
+Instantanea en memoria de los servicios disponibles para los selects de
+servicios (template del evento y AgregarServicioEventoForm). Se vuelve a
+leer cuando cambia version_tabla('servicios'), es decir, con cada commit que
+escribe en Servicio (o una carga masiva), o cuando pasa CATALOGO_TTL: con el
+backend de fragmentos en memoria la version es por proceso y el TTL acota
+cuanto tarda en verse lo que escribio otro proceso.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select
+
+import fragment_cache
+from db import db
+from models import Servicio
+
+
+"Un servicio disponible tal como lo necesitan el select y su template"
+OpcionServicio = namedtuple('OpcionServicio', ['id', 'nombre', 'categoria', 'precio_base'])
+
+Instantanea = namedtuple('Instantanea', ['version', 'creada', 'opciones', 'choices'])
+
+_estado = {'instantanea': None, 'ttl': 300, 'cargas': 0}
+_lock = threading.Lock()
+
+
+def _cargar(version):
+    # Directo de la primaria: en una ruta @solo_lectura la replica podria no tener aun
+    # la escritura que subio la version y la instantanea quedaria vieja hasta el TTL
+    with db.engine.connect() as conexion:
+        filas = conexion.execute(
+            select(Servicio.id_servicio, Servicio.nombre, Servicio.categoria, Servicio.precio_base)
+            .where(Servicio.disponible)
+            .order_by(Servicio.id_servicio)
+        ).all()
+    opciones = tuple(OpcionServicio(*fila) for fila in filas)
+    choices = [(o.id, f'{o.nombre} - ${o.precio_base:,.2f}') for o in opciones]
+    _estado['cargas'] += 1
+    return Instantanea(version, time.monotonic(), opciones, choices)
+
+
+def _vigente(instantanea, version):
+    return (instantanea is not None and instantanea.version == version
+            and time.monotonic() - instantanea.creada < _estado['ttl'])
+
+
+def instantanea():
+    "La instantanea actual; la version se lee antes que los datos, asi una escritura a la mitad fuerza otra carga"
+    version = fragment_cache.version_tabla(Servicio.__tablename__)
+    actual = _estado['instantanea']
+    if _vigente(actual, version):
+        return actual
+    with _lock:
+        actual = _estado['instantanea']
+        if not _vigente(actual, version):
+            actual = _estado['instantanea'] = _cargar(version)
+    return actual
+
+
+def opciones_servicios():
+    "Tupla de OpcionServicio de los servicios disponibles, ordenada por id"
+    return instantanea().opciones
+
+
+def choices_servicios():
+    "Choices de SelectField: [(id, 'nombre - $precio')]"
+    return instantanea().choices
+
+
+def stats():
+    actual = _estado['instantanea']
+    return {
+        'cargas': _estado['cargas'],
+        'servicios': len(actual.opciones) if actual else 0,
+        'version': actual.version if actual else None,
+        'ttl': _estado['ttl'],
+    }
+
+
+def init_app(app):
+    _estado['ttl'] = app.config.get('CATALOGO_TTL', _estado['ttl'])
@@ -0,0 +1,139 @@
+import hashlib
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+
+from db import db
+from models import Evento, EventoServicio, Servicio
+
+
+"Lo que determina el contenido de una pagina y la fecha de su ultimo cambio"
+Version = namedtuple('Version', ['partes', 'ultima_modificacion'])
+
+
+def _catalogo():
+    "Conteo y ultima modificacion de servicios como subconsultas escalares"
+    return (
+        select(func.count(Servicio.id_servicio)).scalar_subquery(),
+        select(func.max(Servicio.fecha_actualizacion)).scalar_subquery(),
+    )
+
+
+def _mas_reciente(*fechas):
+    fechas = [f for f in fechas if f is not None]
+    return max(fechas) if fechas else None
+
+
+def version_catalogo():
+    "Version de los servicios: cambia al crear, editar o eliminar cualquiera"
+    num, ultima = db.session.execute(select(*_catalogo())).one()
+    return Version((num, ultima), ultima)
+
+
+def version_evento(evento_id):
+    """
+    Version del detalle de un evento: el evento, sus servicios contratados y el
+    catalogo (la pagina muestra los servicios disponibles). Todo en una consulta.
+    Regresa None si el evento no existe o no es del usuario, para que la vista responda.
+    """
+    del_evento = EventoServicio.evento_id == Evento.id
+    fila = db.session.execute(
+        select(
+            Evento.usuario_id,
+            Evento.fecha_actualizacion,
+            select(func.count(EventoServicio.id)).where(del_evento).scalar_subquery(),
+            select(func.max(EventoServicio.fecha_agregado)).where(del_evento).scalar_subquery(),
+            *_catalogo(),
+        ).where(Evento.id == evento_id)
+    ).first()
+    if fila is None:
+        return None
+
+    usuario_id, actualizado, num_servicios, agregado, num_catalogo, catalogo = fila
+    if usuario_id != current_user.id and not current_user.es_admin():
+        return None
+    return Version(tuple(fila), _mas_reciente(actualizado, agregado, catalogo))
+
+
+def version_eventos(usuario_id=None):
+    "Version de un listado de eventos (todos, o solo los de un usuario)"
+    consulta = select(func.count(Evento.id), func.max(Evento.fecha_actualizacion))
+    if usuario_id is not None:
+        consulta = consulta.where(Evento.usuario_id == usuario_id)
+    num, ultima = db.session.execute(consulta).one()
+    return Version((num, ultima), ultima)
+
+
+def _de_sesion(clave):
+    """
+    Valor de la sesion solo si ya se cargo. Con sesiones en servidor leerla
+    aqui costaria una lectura del almacen en cada GET condicional; la sesion de
+    cookie no tiene `cargada` y siempre esta disponible.
+    """
+    if not getattr(session, 'cargada', True):
+        return None
+    return session.get(clave)
+
+
+def calcular_etag(partes):
+    """
+    ETag fuerte de la pagina. Ademas de los datos incluye al usuario (la barra
+    de navegacion y los permisos cambian el HTML), el token CSRF de la sesion
+    que va dentro de los formularios (si la sesion ya se cargo: sin ella no
+    hay token) y ETAG_VERSION, que se cambia al desplegar templates nuevos.
+    """
+    usuario = (current_user.id, current_user.rol) if current_user.is_authenticated else None
+    contenido = repr((
+        request.endpoint,
+        partes,
+        usuario,
+        _de_sesion('csrf_token'),
+        current_app.config.get('ETAG_VERSION'),
+    ))
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def condicional(calcular_version):
+    """
+    Respuestas condicionales para vistas GET. `calcular_version` recibe los
+    argumentos de la vista y regresa una Version (o None para no intervenir).
+    Si el navegador ya tiene esa version (If-None-Match / If-Modified-Since)
+    se responde 304 sin ejecutar la vista; si no, la respuesta lleva ETag,
+    Last-Modified y Cache-Control privado con revalidacion.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('RESPUESTAS_CONDICIONALES', True):
+                return f(*args, **kwargs)
+
+            version = calcular_version(*args, **kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+
+            etag = calcular_etag(version.partes)
+            # Con mensajes flash pendientes la pagina es distinta y no debe quedar en cache.
+            # Va despues de la ETag: current_user ya cargo la sesion si hay una
+            if _de_sesion('_flashes'):
+                return f(*args, **kwargs)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=version.ultima_modificacion):
+                respuesta = current_app.response_class(status=304)
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200 or _de_sesion('_flashes'):
+                    return respuesta
+
+            respuesta.set_etag(etag)
+            if version.ultima_modificacion is not None:
+                respuesta.last_modified = version.ultima_modificacion
+            respuesta.cache_control.private = True
+            respuesta.cache_control.no_cache = True
+            respuesta.vary.add('Cookie')
+            return respuesta
+        return decorated_function
+    return decorator
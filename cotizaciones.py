@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+from flask import current_app, render_template
+from sqlalchemy import func, select
+
+from db import db
+from models import Evento, EventoServicio, Servicio, Trabajo
+import trabajos
+
+try:
+    from weasyprint import HTML
+except ImportError:  # pragma: no cover - weasyprint es opcional
+    HTML = None
+
+
+"Tipo MIME de cada formato de cotizacion"
+FORMATOS = {'html': 'text/html', 'pdf': 'application/pdf'}
+
+
+def formatos_disponibles():
+    "PDF solo si weasyprint esta instalado"
+    return ('html', 'pdf') if HTML is not None else ('html',)
+
+
+def version_cotizacion(evento_id):
+    """
+    Lo que cambia el contenido de la cotizacion: el evento (total_servicios
+    actualiza fecha_actualizacion al agregar o quitar servicios), sus servicios
+    contratados y los servicios del catalogo que aparecen en ella.
+    Regresa (usuario_id, version) o None si el evento no existe.
+    """
+    del_evento = EventoServicio.evento_id == Evento.id
+    fila = db.session.execute(
+        select(
+            Evento.usuario_id,
+            Evento.fecha_actualizacion,
+            select(func.count(EventoServicio.id)).where(del_evento).scalar_subquery(),
+            select(func.max(EventoServicio.fecha_agregado)).where(del_evento).scalar_subquery(),
+            select(func.max(Servicio.fecha_actualizacion))
+            .join(EventoServicio, EventoServicio.servicio_id == Servicio.id_servicio)
+            .where(del_evento).scalar_subquery(),
+        ).where(Evento.id == evento_id)
+    ).first()
+    if fila is None:
+        return None
+    return fila[0], tuple(fila[1:])
+
+
+def llave(version):
+    "Huella de la version; COTIZACION_VERSION se cambia al modificar el template"
+    contenido = repr((version, current_app.config.get('COTIZACION_VERSION')))
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def directorio():
+    carpeta = current_app.config.get('COTIZACIONES_DIR') or os.path.join(current_app.instance_path, 'cotizaciones')
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def ruta(evento_id, llave_version, formato):
+    return os.path.join(directorio(), f'{evento_id}-{llave_version}.{formato}')
+
+
+def renderizar(evento_id, formato):
+    "Contenido (bytes) de la cotizacion del evento en el formato pedido"
+    evento = db.session.get(Evento, evento_id)
+    contratados = db.session.execute(
+        select(EventoServicio, Servicio)
+        .join(Servicio, Servicio.id_servicio == EventoServicio.servicio_id)
+        .where(EventoServicio.evento_id == evento_id)
+        .order_by(Servicio.categoria, Servicio.nombre)
+    ).all()
+    html = render_template('cotizacion.htm', evento=evento, contratados=contratados,
+                           generada_en=datetime.utcnow())
+    if formato == 'pdf':
+        return HTML(string=html).write_pdf()
+    return html.encode('utf-8')
+
+
+def generar(evento_id, formato):
+    """
+    Genera la cotizacion y la guarda en disco con la llave de la version
+    actual. La version se lee antes que los datos: si el evento cambia a la
+    mitad, el archivo queda con una llave vieja y se vuelve a generar.
+    Borra los archivos de versiones anteriores del mismo evento.
+    """
+    encontrado = version_cotizacion(evento_id)
+    if encontrado is None:
+        return None
+    destino = ruta(evento_id, llave(encontrado[1]), formato)
+    contenido = renderizar(evento_id, formato)
+
+    # Escritura atomica: quien lea el archivo nunca ve uno a medias
+    descriptor, temporal = tempfile.mkstemp(dir=directorio(), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, destino)
+
+    for anterior in glob.glob(os.path.join(directorio(), f'{evento_id}-*.{formato}')):
+        if anterior != destino:
+            try:
+                os.remove(anterior)
+            except FileNotFoundError:
+                pass
+    return destino
+
+
+def llave_trabajo(evento_id, llave_version, formato):
+    return f'cotizacion:{evento_id}:{llave_version}:{formato}'
+
+
+def solicitar(evento_id, llave_version, formato):
+    """
+    Para una cotizacion que no esta en disco: encola su generacion (una sola
+    vez por version) y regresa None. Si el trabajo de esa version ya termino
+    y el archivo no esta (se borro el directorio), la genera aqui mismo.
+    """
+    trabajo = Trabajo.query.filter_by(llave_idempotencia=llave_trabajo(evento_id, llave_version, formato)).first()
+    if trabajo is None:
+        trabajos.encolar('generar_cotizacion', {'evento_id': evento_id, 'formato': formato},
+                         llave=llave_trabajo(evento_id, llave_version, formato))
+        db.session.commit()
+        return None
+    if trabajo.estado in ('pendiente', 'en_proceso'):
+        return None
+    return generar(evento_id, formato)
@@ -0,0 +1,134 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class MetricasPool:
+    "Contadores del pool de conexiones, acumulados desde que arranca el proceso"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexiones_creadas = 0
+        self.invalidaciones = 0
+        self.invalidaciones_suaves = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.prestamo_total = 0.0
+        self.prestamo_max = 0.0
+        self.checkouts_con_overflow = 0
+
+    def sumar(self, campo, valor=1):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + valor)
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+    def registrar_prestamo(self, segundos):
+        with self._lock:
+            self.prestamo_total += segundos
+            self.prestamo_max = max(self.prestamo_max, segundos)
+
+    def como_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'conexiones_creadas': self.conexiones_creadas,
+                'invalidaciones': self.invalidaciones,
+                'invalidaciones_suaves': self.invalidaciones_suaves,
+                'timeouts': self.timeouts,
+                'checkouts_con_overflow': self.checkouts_con_overflow,
+                'espera_promedio': self.espera_total / self.checkouts if self.checkouts else 0.0,
+                'espera_max': self.espera_max,
+                'prestamo_promedio': self.prestamo_total / self.checkins if self.checkins else 0.0,
+                'prestamo_max': self.prestamo_max,
+            }
+
+
+class PoolInstrumentado(QueuePool):
+    """
+    QueuePool que mide cuanto espera cada checkout por una conexion
+    (incluye abrir una nueva cuando hace falta) y cuenta los timeouts
+    por pool agotado. Las metricas se guardan en `pool.metricas`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metricas = MetricasPool()
+
+    def recreate(self):
+        nuevo = super().recreate()
+        nuevo.metricas = self.metricas
+        return nuevo
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metricas.sumar('timeouts')
+            raise
+        finally:
+            self.metricas.registrar_espera(time.perf_counter() - inicio)
+
+
+def _metricas(pool):
+    if not hasattr(pool, 'metricas'):
+        pool.metricas = MetricasPool()
+    return pool.metricas
+
+
+def registrar_eventos(engine):
+    "Conecta los eventos del pool del engine con sus metricas"
+    pool = engine.pool
+    metricas = _metricas(pool)
+
+    @event.listens_for(pool, 'connect')
+    def _connect(dbapi_conn, registro):
+        metricas.sumar('conexiones_creadas')
+
+    @event.listens_for(pool, 'checkout')
+    def _checkout(dbapi_conn, registro, proxy):
+        metricas.sumar('checkouts')
+        registro.info['prestada_en'] = time.perf_counter()
+        if hasattr(pool, 'overflow') and pool.overflow() > 0:
+            metricas.sumar('checkouts_con_overflow')
+
+    @event.listens_for(pool, 'checkin')
+    def _checkin(dbapi_conn, registro):
+        metricas.sumar('checkins')
+        inicio = registro.info.pop('prestada_en', None)
+        if inicio is not None:
+            metricas.registrar_prestamo(time.perf_counter() - inicio)
+
+    @event.listens_for(pool, 'invalidate')
+    def _invalidate(dbapi_conn, registro, excepcion):
+        metricas.sumar('invalidaciones')
+
+    @event.listens_for(pool, 'soft_invalidate')
+    def _soft_invalidate(dbapi_conn, registro, excepcion):
+        metricas.sumar('invalidaciones_suaves')
+
+
+def estado_pool(engine):
+    "Ocupacion actual del pool mas las metricas acumuladas"
+    pool = engine.pool
+    estado = {'clase': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        estado.update({
+            'tamano': pool.size(),
+            'en_uso': pool.checkedout(),
+            'disponibles': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+        })
+    estado.update(_metricas(pool).como_dict())
+    return estado
@@ -0,0 +1,235 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+
+from db import db
+from models import Evento, EventoServicio
+
+
+DURACION_PREDETERMINADA = timedelta(hours=8)
+
+"Intervalo ocupado [inicio, fin) por un evento activo"
+Ocupado = namedtuple('Ocupado', ['inicio', 'fin', 'evento_id'])
+
+
+def normalizar_lugar(lugar):
+    "Misma normalizacion que la restriccion ex_eventos_lugar_periodo: lower(btrim(lugar))"
+    return (lugar or '').strip(' ').lower()
+
+
+# Consultas sobre el indice GiST de la restriccion de exclusion (lugar, periodo)
+# y sobre ix_eventos_periodo; las condiciones repiten el WHERE de los indices parciales.
+
+_CONFLICTOS_LUGAR = text("""
+    SELECT fecha_evento, fecha_fin, id FROM eventos
+    WHERE lower(btrim(lugar)) = :lugar
+      AND periodo && tsrange(:inicio, :fin, '[)')
+      AND estado <> 'cancelado' AND lugar IS NOT NULL AND btrim(lugar) <> ''
+      AND id <> :excluir
+    ORDER BY fecha_evento
+""")
+
+_CONFLICTOS_SERVICIO = text("""
+    SELECT e.fecha_evento, e.fecha_fin, e.id FROM eventos e
+    JOIN evento_servicio es ON es.evento_id = e.id
+    WHERE es.servicio_id = :servicio_id
+      AND e.periodo && tsrange(:inicio, :fin, '[)')
+      AND e.estado <> 'cancelado'
+      AND e.id <> :excluir
+    ORDER BY e.fecha_evento
+""")
+
+
+def _traslapan(inicio, fin, excluir):
+    "Las mismas condiciones sin la columna periodo, para bases de datos que no son PostgreSQL"
+    return (Evento.fecha_evento < fin, Evento.fecha_fin > inicio,
+            Evento.estado != 'cancelado', Evento.id != (excluir or 0))
+
+
+def _es_postgres():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def conflictos_lugar(lugar, inicio, fin, excluir=None):
+    "Eventos activos en el mismo lugar que se traslapan con [inicio, fin)"
+    lugar = normalizar_lugar(lugar)
+    if not lugar:
+        return []
+    if _es_postgres():
+        filas = db.session.execute(_CONFLICTOS_LUGAR, {
+            'lugar': lugar, 'inicio': inicio, 'fin': fin, 'excluir': excluir or 0,
+        })
+    else:
+        filas = db.session.execute(
+            select(Evento.fecha_evento, Evento.fecha_fin, Evento.id)
+            .where(func.lower(func.trim(Evento.lugar)) == lugar, *_traslapan(inicio, fin, excluir))
+            .order_by(Evento.fecha_evento)
+        )
+    return [Ocupado(*fila) for fila in filas]
+
+
+def conflictos_servicio(servicio_id, inicio, fin, excluir=None):
+    "Eventos activos que ya contrataron el servicio y se traslapan con [inicio, fin)"
+    if _es_postgres():
+        filas = db.session.execute(_CONFLICTOS_SERVICIO, {
+            'servicio_id': servicio_id, 'inicio': inicio, 'fin': fin, 'excluir': excluir or 0,
+        })
+    else:
+        filas = db.session.execute(
+            select(Evento.fecha_evento, Evento.fecha_fin, Evento.id)
+            .join(EventoServicio, EventoServicio.evento_id == Evento.id)
+            .where(EventoServicio.servicio_id == servicio_id, *_traslapan(inicio, fin, excluir))
+            .order_by(Evento.fecha_evento)
+        )
+    return [Ocupado(*fila) for fila in filas]
+
+
+def huecos(ocupados, desde, hasta, duracion_minima=timedelta(0)):
+    "Intervalos libres [inicio, fin) de la ventana que no cubre ningun ocupado"
+    libres = []
+    cursor = desde
+    for o in sorted(ocupados):
+        if o.inicio > cursor and o.inicio - cursor >= duracion_minima:
+            libres.append((cursor, min(o.inicio, hasta)))
+        cursor = max(cursor, o.fin)
+        if cursor >= hasta:
+            break
+    if cursor < hasta and hasta - cursor >= duracion_minima:
+        libres.append((cursor, hasta))
+    return [(i, f) for i, f in libres if f > i]
+
+
+class IndiceIntervalos:
+    """
+    Intervalos de una clave (un lugar o un servicio) ordenados por inicio.
+    Para buscar traslapes con [a, b) basta revisar los que empiezan antes de b
+    y despues de a - duracion_max, asi que la busqueda no recorre todo.
+    """
+
+    def __init__(self):
+        self.inicios = []
+        self.intervalos = []
+        self.duracion_max = timedelta(0)
+
+    def agregar(self, ocupado):
+        i = bisect_left(self.inicios, ocupado.inicio)
+        self.inicios.insert(i, ocupado.inicio)
+        self.intervalos.insert(i, ocupado)
+        self.duracion_max = max(self.duracion_max, ocupado.fin - ocupado.inicio)
+
+    def traslapes(self, inicio, fin, excluir=None):
+        desde = bisect_left(self.inicios, inicio - self.duracion_max)
+        hasta = bisect_left(self.inicios, fin)
+        return [
+            o for o in self.intervalos[desde:hasta]
+            if o.fin > inicio and o.evento_id != excluir
+        ]
+
+
+class IndiceDisponibilidad:
+    """
+    Copia en memoria de los periodos de los eventos activos por lugar y por
+    servicio contratado, para consultas hipoteticas y huecos libres sin ir a la
+    base de datos. Se recarga cuando caduca (ttl) o cuando un commit de este
+    proceso modifica eventos; la validacion al guardar siempre se hace en SQL.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._datos = None
+        self._cargado_en = 0.0
+
+    def invalidar(self):
+        self._cargado_en = 0.0
+
+    def _cargar(self):
+        lugares, servicios = {}, {}
+        # Solo eventos que no han terminado: el indice sirve para reservar a futuro
+        eventos = db.session.execute(
+            db.select(Evento.id, Evento.fecha_evento, Evento.fecha_fin, Evento.lugar)
+            .where(Evento.estado != 'cancelado', Evento.fecha_fin > datetime.now())
+        ).all()
+        periodos = {}
+        for evento_id, inicio, fin, lugar in eventos:
+            ocupado = Ocupado(inicio, fin, evento_id)
+            periodos[evento_id] = ocupado
+            clave = normalizar_lugar(lugar)
+            if clave:
+                lugares.setdefault(clave, IndiceIntervalos()).agregar(ocupado)
+
+        if periodos:
+            contratados = db.session.execute(
+                db.select(EventoServicio.evento_id, EventoServicio.servicio_id)
+                .join(Evento, Evento.id == EventoServicio.evento_id)
+                .where(Evento.estado != 'cancelado', Evento.fecha_fin > datetime.now())
+            ).all()
+            for evento_id, servicio_id in contratados:
+                servicios.setdefault(servicio_id, IndiceIntervalos()).agregar(periodos[evento_id])
+        return {'lugares': lugares, 'servicios': servicios, 'eventos': len(periodos)}
+
+    def datos(self):
+        if time.monotonic() - self._cargado_en > self.ttl:
+            with self._lock:
+                if time.monotonic() - self._cargado_en > self.ttl:
+                    self._datos = self._cargar()
+                    self._cargado_en = time.monotonic()
+        return self._datos
+
+    def _indice(self, lugar=None, servicio_id=None):
+        datos = self.datos()
+        if servicio_id is not None:
+            return datos['servicios'].get(servicio_id)
+        return datos['lugares'].get(normalizar_lugar(lugar))
+
+    def traslapes(self, inicio, fin, lugar=None, servicio_id=None, excluir=None):
+        indice = self._indice(lugar, servicio_id)
+        return indice.traslapes(inicio, fin, excluir) if indice else []
+
+    def libres(self, desde, hasta, lugar=None, servicio_id=None, duracion_minima=timedelta(0)):
+        "Huecos libres de un lugar o servicio en la ventana [desde, hasta)"
+        ocupados = self.traslapes(desde, hasta, lugar, servicio_id)
+        return ocupados, huecos(ocupados, desde, hasta, duracion_minima)
+
+    def stats(self):
+        datos = self._datos or {'lugares': {}, 'servicios': {}, 'eventos': 0}
+        return {
+            'eventos': datos['eventos'],
+            'lugares': len(datos['lugares']),
+            'servicios': len(datos['servicios']),
+            'edad': time.monotonic() - self._cargado_en if self._cargado_en else None,
+        }
+
+
+indice = IndiceDisponibilidad()
+
+
+def init_app(app):
+    global indice
+    indice = IndiceDisponibilidad(ttl=app.config.get('DISPONIBILIDAD_TTL', 30))
+
+
+# Un commit que toca eventos o servicios contratados invalida la copia en memoria
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_cambios(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Evento, EventoServicio)):
+            session.info['disponibilidad_modificada'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar(session):
+    if session.info.pop('disponibilidad_modificada', False):
+        indice.invalidar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar(session):
+    session.info.pop('disponibilidad_modificada', None)
@@ -1,8 +1,36 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, TextAreaField, DecimalField, IntegerField, SelectField, DateField
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, PasswordField, BooleanField, TextAreaField, DecimalField, IntegerField, SelectField, DateTimeLocalField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, NumberRange, Optional
+from sqlalchemy import or_, select
+from werkzeug.datastructures import MultiDict
+import catalogo
+import hashing
+from db import db
 from models import Usuario
-from datetime import datetime
+
+
+ESTADOS_EVENTO = [
+    ('pendiente', 'Pendiente'),
+    ('confirmado', 'Confirmado'),
+    ('cancelado', 'Cancelado'),
+    ('completado', 'Completado')
+]
+
+CATEGORIAS_SERVICIO = [
+    ('fotografia', 'Fotografía'),
+    ('catering', 'Catering'),
+    ('decoracion', 'Decoración'),
+    ('musica', 'Música'),
+    ('transporte', 'Transporte'),
+    ('otros', 'Otros')
+]
+
+
+def limite_bcrypt(form, field):
+    "La contraseña no puede pasar de los bytes que acepta bcrypt (los acentos cuentan doble)"
+    if field.data and len(field.data.encode('utf-8')) > hashing.MAX_BYTES:
+        raise ValidationError(f'La contraseña no puede tener mas de {hashing.MAX_BYTES} bytes')
 
 
 class LoginForm(FlaskForm):
@@ -20,6 +48,7 @@ class LoginForm(FlaskForm):
     password = PasswordField('Contraseña',
         validators = [
             DataRequired(message="La contraseña es obligatoria"),
+            limite_bcrypt
         ], 
         render_kw={"placeholder": "Ingrese su contraseña"}
         )
@@ -67,7 +96,8 @@ class RegistroForm(FlaskForm):
             validators = [
                 DataRequired(message="La contraseña es obligatoria"),
                 Length(min = 6, message = 'La contraseña debe tener al menos 6 caracteres'),
-                EqualTo('confirm_password', message='Las contraseñas deben coincidir')
+                limite_bcrypt,
+                EqualTo('confirmar_password', message='Las contraseñas deben coincidir')
             ],
             render_kw={"placeholder": "Ingrese su contraseña"}
             )
@@ -79,15 +109,27 @@ class RegistroForm(FlaskForm):
             render_kw={"placeholder": "Confirme su contraseña"}
             )
 
+    def _ocupados(self):
+            """
+            Usuarios y correos ya registrados entre los del formulario: una sola
+            consulta para las dos validaciones de unicidad, hecha la primera vez que se necesita
+            """
+            if getattr(self, '_ocupados_cache', None) is None:
+                filas = db.session.execute(
+                    select(Usuario.username, Usuario.email)
+                    .where(or_(Usuario.username == self.username.data, Usuario.email == self.email.data))
+                    .limit(2)
+                ).all()
+                self._ocupados_cache = ({u for u, _ in filas}, {e for _, e in filas})
+            return self._ocupados_cache
+
     def validate_username(self, username):
             "Validacion personalizada para nombre de usuario único"
-            usuario = Usuario.query.filter_by(username=username.data).first()
-            if usuario:
+            if username.data in self._ocupados()[0]:
                 raise ValidationError('El nombre de usuario ya está en uso. Por favor elija otro.')
 
     def validate_email(self, email):
-            usuario = Usuario.query.filter_by(email=email.data).first()
-            if usuario:
+            if email.data in self._ocupados()[1]:
                 raise ValidationError('El correo electrónico ya está registrado. Por favor utilice otro.')
             
 
@@ -112,17 +154,26 @@ class EventoForm(FlaskForm):
             }
         )
 
-    fecha_evento = DateField('Fecha del Evento',
+    fecha_evento = DateTimeLocalField('Fecha del Evento',
+        format='%Y-%m-%dT%H:%M',
         validators = [
             DataRequired(message="La fecha es obligatoria")
         ],
         render_kw= {
-        "type": "datetime-local",
         "Placeholder": "dd/mm/aaaa hh:mm"
         }
         )
 
-    Lugar = StringField('Lugar',
+    duracion_horas = IntegerField('Duración (horas)',
+        default=8,
+        validators = [
+             Optional(),
+             NumberRange(min=1, max=72, message='La duración debe estar entre 1 y 72 horas')
+        ],
+        render_kw={"placeholder": "8"}
+        )
+
+    lugar = StringField('Lugar',
         validators = [
             Optional(),
             Length(max=150, message='La ubicación no puede exceder los 150 caracteres')
@@ -150,12 +201,8 @@ class EventoForm(FlaskForm):
         )
     
     estado = SelectField('Estado', 
-        choices =[
-            ('pendiente', 'Pendiente'),
-            ('confirmado', 'Confirmado'),
-            ('cancelado', 'Cancelado'),
-            ('completado', 'Completado')
-        ],
+        choices=ESTADOS_EVENTO,
+        default='pendiente',
         validators=[DataRequired()]
     )
     
@@ -193,14 +240,7 @@ class ServicioForm(FlaskForm):
      )
 
      categoria = SelectField('Categoría',
-        choices=[
-            ('fotografia', 'Fotografía'),
-            ('catering', 'Catering'),
-            ('decoracion', 'Decoración'),
-            ('musica', 'Música'),
-            ('transporte', 'Transporte'),
-            ('otros', 'Otros')
-        ],
+        choices=CATEGORIAS_SERVICIO,
         validators=[DataRequired(message='selecciona una categoría')]
      )
 
@@ -286,6 +326,7 @@ class AgregarServicioEventoForm(FlaskForm):
     "Formulario para agregar servicios a un evento"
     servicio_id = SelectField('Servicio', 
         coerce=int,
+        choices=catalogo.choices_servicios,
         validators=[DataRequired(message='Debes seleccionar un servicio')]
     )
     
@@ -306,4 +347,93 @@ class AgregarServicioEventoForm(FlaskForm):
             "placeholder": "Detalles específicos de este servicio para el evento",
             "rows": 2
         }
-    )
\ No newline at end of file
+    )
+
+class ClienteForm(FlaskForm):
+    "Formulario de clientes (usado tambien para validar la importacion masiva)"
+
+    nombre = StringField('Nombre',
+        validators=[
+            DataRequired(message='El nombre es obligatorio'),
+            Length(max=100, message='El nombre no puede exceder 100 caracteres')
+        ]
+    )
+
+    correo = StringField('Correo Electrónico',
+        validators=[
+            DataRequired(message='El correo electrónico es obligatorio'),
+            Email(message='Ingresa un correo electrónico válido'),
+            Length(max=100, message='El correo no puede exceder 100 caracteres')
+        ]
+    )
+
+    telefono = StringField('Teléfono',
+        validators=[
+            Optional(),
+            Length(max=15, message='El teléfono no puede exceder 15 caracteres')
+        ]
+    )
+
+    direccion = StringField('Dirección',
+        validators=[
+            Optional(),
+            Length(max=200, message='La dirección no puede exceder 200 caracteres')
+        ]
+    )
+
+
+class ImportarForm(FlaskForm):
+    "Formulario para cargar un archivo a un catálogo"
+
+    catalogo = SelectField('Catálogo',
+        choices=[('servicios', 'Servicios'), ('proveedores', 'Proveedores'), ('clientes', 'Clientes')],
+        validators=[DataRequired(message='Selecciona un catálogo')]
+    )
+
+    formato = SelectField('Formato',
+        choices=[('csv', 'CSV'), ('jsonl', 'JSONL')],
+        validators=[DataRequired(message='Selecciona un formato')]
+    )
+
+    archivo = FileField('Archivo',
+        validators=[FileRequired(message='Selecciona un archivo')]
+    )
+
+
+"Formularios que se pueden validar campo por campo desde /api/validar: nombre -> (clase, permiso)"
+VALIDABLES = {
+    'registro': (RegistroForm, 'publico'),
+    'evento': (EventoForm, 'usuario'),
+    'servicio': (ServicioForm, 'admin'),
+    'proveedor': (ProveedorForm, 'admin'),
+}
+
+
+def validar_campos(clase, datos, campos=None):
+    """
+    Corre los validadores (incluidos los validate_<campo>) solo de los campos
+    pedidos, o de todos los que vienen en `datos`, sin CSRF ni template.
+    Regresa {campo: [errores]} con una entrada por cada campo revisado.
+    """
+    form = clase(formdata=MultiDict(datos), meta={'csrf': False})
+    campos = [c for c in (campos or list(datos)) if c in form._fields]
+    errores = {}
+    for nombre in campos:
+        campo = form._fields[nombre]
+        inline = getattr(clase, f'validate_{nombre}', None)
+        campo.validate(form, [inline] if inline is not None else [])
+        errores[nombre] = list(campo.errors)
+    return errores
+
+
+def init_app(app):
+    """
+    WTForms arma la lista ordenada de campos y la clase Meta de cada formulario
+    la primera vez que se instancia; se hace aqui para que no le toque a una peticion
+    """
+    # AgregarServicioEventoForm queda fuera: instanciarlo lee el catalogo de servicios,
+    # y al arrancar (p. ej. flask migrar) la tabla puede no existir todavia
+    with app.app_context():
+        for clase in (LoginForm, RegistroForm, EventoForm, ServicioForm, ProveedorForm,
+                      ClienteForm, ImportarForm):
+            clase(formdata=None, meta={'csrf': False})
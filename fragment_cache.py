@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Servicio, Proveedor, Evento
+
+
+"Tablas cuyas escrituras invalidan los fragmentos que dependen de ellas"
+TABLAS_VERSIONADAS = {
+    Servicio: Servicio.__tablename__,
+    Proveedor: Proveedor.__tablename__,
+    Evento: Evento.__tablename__,
+}
+
+
+class BackendMemoria:
+    """
+    LRU en memoria limitado por tamaño total (bytes del HTML guardado).
+    Los contadores de version tambien viven aqui, por lo que solo son
+    validos dentro del proceso; el TTL acota cuanto puede durar un fragmento
+    si otro proceso escribe.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._datos = OrderedDict()
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira, html = entrada
+            if expira <= time.monotonic():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+            return html
+
+    def set(self, clave, html):
+        tamano = len(html.encode('utf-8'))
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (time.monotonic() + self.ttl, html)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                self._quitar(next(iter(self._datos)))
+
+    def _quitar(self, clave):
+        _, html = self._datos.pop(clave)
+        self.bytes -= len(html.encode('utf-8'))
+
+    def version(self, tabla):
+        return self._versiones.get(tabla, 0)
+
+    def incrementar(self, tabla):
+        with self._lock:
+            self._versiones[tabla] = self._versiones.get(tabla, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+
+class BackendSqlite:
+    """
+    Fragmentos y versiones en un archivo sqlite local: lo comparten todos los
+    workers del mismo servidor, asi que una escritura en uno invalida a los demas.
+    """
+
+    def __init__(self, ruta, ttl=300):
+        self.ruta = ruta
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.execute('CREATE TABLE IF NOT EXISTS fragmentos '
+                             '(clave TEXT PRIMARY KEY, html TEXT, expira REAL)')
+            conexion.execute('CREATE TABLE IF NOT EXISTS versiones '
+                             '(tabla TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            'SELECT html FROM fragmentos WHERE clave = ? AND expira > ?', (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave, html):
+        conexion = self._conexion()
+        conexion.execute('INSERT OR REPLACE INTO fragmentos VALUES (?, ?, ?)',
+                         (clave, html, time.time() + self.ttl))
+        conexion.execute('DELETE FROM fragmentos WHERE expira <= ?', (time.time(),))
+
+    def version(self, tabla):
+        fila = self._conexion().execute(
+            'SELECT version FROM versiones WHERE tabla = ?', (tabla,)
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def incrementar(self, tabla):
+        self._conexion().execute(
+            'INSERT INTO versiones VALUES (?, 1) '
+            'ON CONFLICT(tabla) DO UPDATE SET version = version + 1', (tabla,)
+        )
+
+    def limpiar(self):
+        self._conexion().execute('DELETE FROM fragmentos')
+
+
+_estado = {'backend': BackendMemoria(), 'activo': True, 'hits': 0, 'misses': 0}
+
+
+def backend():
+    return _estado['backend']
+
+
+def version_tabla(tabla):
+    "Sello de version de una tabla; cambia con cada commit que la modifica"
+    return backend().version(tabla)
+
+
+def invalidar_tabla(tabla):
+    "Para escrituras que no pasan por el ORM (p. ej. cargas masivas con Core)"
+    backend().incrementar(tabla)
+
+
+def stats():
+    return {'hits': _estado['hits'], 'misses': _estado['misses']}
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache 'nombre', parte1, parte2 %} ... {% endcache %}
+
+    Guarda el HTML del bloque con una clave formada por el nombre y las partes
+    (p. ej. version_tabla('servicios') o los filtros de la URL). Si la clave
+    ya existe el bloque no se evalua, ni siquiera las consultas perezosas que contenga.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        partes = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            partes.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_cache', [nodes.List(partes)]), [], [], cuerpo
+        ).set_lineno(lineno)
+
+    def _cache(self, partes, caller):
+        if not _estado['activo']:
+            return caller()
+
+        clave = hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+        html = backend().get(clave)
+        if html is not None:
+            _estado['hits'] += 1
+            return Markup(html)
+
+        _estado['misses'] += 1
+        html = caller()
+        backend().set(clave, str(html))
+        return html
+
+
+def init_app(app):
+    tipo = app.config.get('FRAGMENTOS_BACKEND', 'memoria')
+    ttl = app.config.get('FRAGMENTOS_TTL', 300)
+    if tipo == 'sqlite':
+        ruta = app.config.get('FRAGMENTOS_SQLITE_RUTA') or os.path.join(app.instance_path, 'fragmentos.db')
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        _estado['backend'] = BackendSqlite(ruta, ttl=ttl)
+    else:
+        _estado['backend'] = BackendMemoria(
+            max_bytes=app.config.get('FRAGMENTOS_MAX_BYTES', 16 * 1024 * 1024), ttl=ttl)
+    _estado['activo'] = app.config.get('FRAGMENTOS_ACTIVO', True)
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['version_tabla'] = version_tabla
+
+
+# Las escrituras del ORM suben la version de su tabla al confirmar la transaccion
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_tablas_modificadas(session, flush_context):
+    tablas = session.info.setdefault('tablas_modificadas', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tabla = TABLAS_VERSIONADAS.get(type(obj))
+        if tabla:
+            tablas.add(tabla)
+
+
+@event.listens_for(Session, 'after_commit')
+def _subir_versiones(session):
+    for tabla in session.info.pop('tablas_modificadas', ()):
+        invalidar_tabla(tabla)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tablas_modificadas(session):
+    session.info.pop('tablas_modificadas', None)
@@ -0,0 +1,174 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+import instrumentacion
+
+
+"bcrypt solo usa los primeros 72 bytes de la contraseña y desde la version 5 rechaza las mas largas"
+MAX_BYTES = 72
+
+
+class HashingSaturado(Exception):
+    "El pool de hashing no tiene lugar para otra peticion; el cliente debe reintentar"
+
+    def __init__(self, retry_after=1):
+        super().__init__('Demasiadas peticiones de autenticacion en curso')
+        self.retry_after = retry_after
+
+
+# Funciones de nivel de modulo para que el pool de procesos pueda serializarlas
+
+def _generar(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verificar(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+_COSTO = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+def costo_de(password_hash):
+    "Factor de costo (log rounds) de un hash bcrypt, o None si no se reconoce"
+    m = _COSTO.match(password_hash or '')
+    return int(m.group(1)) if m else None
+
+
+class PoolHashing:
+    """
+    Ejecuta bcrypt en un pool de procesos dedicado para que el hashing no
+    ocupe los workers de las peticiones. El numero de tareas en curso esta
+    acotado (workers + max_cola); cuando se llena se rechaza de inmediato
+    con HashingSaturado en lugar de encolar sin limite.
+    Con workers=0 el hashing se hace en el mismo proceso (desarrollo).
+    """
+
+    def __init__(self, workers=None, max_cola=32, timeout=10, rounds=12):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self.rounds = rounds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._cupo = threading.BoundedSemaphore(max(1, self.workers) + max_cola)
+
+        # Metricas
+        self.en_curso = 0
+        self.rechazados = 0
+        self.agotados = 0
+        self.completados = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+
+    def _pool(self):
+        # Se crea en el primer uso para no heredar procesos en el fork de gunicorn
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _ejecutar(self, fn, *args):
+        if not self._cupo.acquire(blocking=False):
+            with self._lock:
+                self.rechazados += 1
+            raise HashingSaturado(retry_after=1)
+
+        inicio = time.perf_counter()
+        with self._lock:
+            self.en_curso += 1
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._registrar(inicio)
+                self._liberar()
+
+        try:
+            futuro = self._pool().submit(fn, *args)
+        except BaseException:
+            self._liberar()
+            raise
+        # cancel() no detiene una tarea que ya corre: el cupo se libera hasta
+        # que el proceso termina de verdad, no cuando la peticion deja de esperar
+        futuro.add_done_callback(lambda _: self._liberar())
+        try:
+            resultado = futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            futuro.cancel()
+            instrumentacion.sumar_bcrypt(time.perf_counter() - inicio)
+            with self._lock:
+                self.agotados += 1
+            raise HashingSaturado(retry_after=self.timeout)
+        except BaseException:
+            self._registrar(inicio)
+            raise
+        self._registrar(inicio)
+        return resultado
+
+    def _registrar(self, inicio):
+        "Metricas de una tarea que termino (con resultado o con error) antes del timeout"
+        duracion = time.perf_counter() - inicio
+        instrumentacion.sumar_bcrypt(duracion)
+        with self._lock:
+            self.completados += 1
+            self.latencia_total += duracion
+            self.latencia_max = max(self.latencia_max, duracion)
+
+    def _liberar(self):
+        with self._lock:
+            self.en_curso -= 1
+        self._cupo.release()
+
+    def generar_hash(self, password):
+        "Hash bcrypt con el costo configurado"
+        return self._ejecutar(_generar, password.encode('utf-8'), self.rounds)
+
+    def verificar(self, password_hash, password):
+        "Compara una contraseña con su hash"
+        password = password.encode('utf-8')
+        if not password_hash or len(password) > MAX_BYTES:
+            return False
+        return self._ejecutar(_verificar, password, password_hash.encode('utf-8'))
+
+    def necesita_rehash(self, password_hash):
+        "True si el hash se genero con un costo distinto al configurado"
+        return costo_de(password_hash) != self.rounds
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_cola': self.max_cola,
+            'en_curso': self.en_curso,
+            'rechazados': self.rechazados,
+            'agotados': self.agotados,
+            'completados': self.completados,
+            'latencia_promedio': self.latencia_total / self.completados if self.completados else 0.0,
+            'latencia_max': self.latencia_max,
+            'rounds': self.rounds,
+        }
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = PoolHashing()
+
+
+def init_app(app):
+    global pool
+    pool.cerrar()
+    pool = PoolHashing(
+        workers=app.config.get('HASH_POOL_WORKERS'),
+        max_cola=app.config.get('HASH_POOL_MAX_COLA', 32),
+        timeout=app.config.get('HASH_POOL_TIMEOUT', 10),
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+    )
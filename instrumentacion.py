@@ -0,0 +1,295 @@
+"""
+Instrumentacion opcional por peticion (INSTRUMENTACION=1): tiempo total,
+consultas SQL (cuantas, cuanto tardaron y las mas lentas), render de
+templates y bcrypt. Se reporta en el header Server-Timing, como metricas de
+Prometheus en /metrics y, para una fraccion de las peticiones, con un perfil
+de cProfile (o pyinstrument). Las metricas son por proceso.
+"""
+
+import cProfile
+import heapq
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - pyinstrument es opcional
+    Profiler = None
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"Consultas mas lentas que se guardan de cada peticion"
+MAX_CONSULTAS_LENTAS = 5
+MAX_SQL = 300
+
+
+class Medicion:
+    "Lo que se mide durante una peticion"
+
+    __slots__ = ('inicio', 'consultas', 'sql', 'lentas', 'plantillas', 'inicio_plantillas', 'bcrypt', 'perfil')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql = 0.0
+        self.lentas = []
+        self.plantillas = 0.0
+        self.inicio_plantillas = []
+        self.bcrypt = 0.0
+        self.perfil = None
+
+    def consulta(self, sentencia, segundos):
+        self.consultas += 1
+        self.sql += segundos
+        # Min-heap acotado: solo se reemplaza la mas rapida de las guardadas
+        if len(self.lentas) < MAX_CONSULTAS_LENTAS:
+            heapq.heappush(self.lentas, (segundos, sentencia[:MAX_SQL]))
+        elif segundos > self.lentas[0][0]:
+            heapq.heapreplace(self.lentas, (segundos, sentencia[:MAX_SQL]))
+
+
+def actual():
+    "Medicion de la peticion en curso, o None (instrumentacion apagada, CLI, worker)"
+    if not has_app_context():
+        return None
+    return g.get('_medicion')
+
+
+def sumar_bcrypt(segundos):
+    "Lo llama hashing.PoolHashing con la duracion de cada hash o verificacion"
+    medicion = actual()
+    if medicion is not None:
+        medicion.bcrypt += segundos
+
+
+class Histograma:
+    def __init__(self):
+        self.cuentas = [0] * len(BUCKETS)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.cuentas[i] += 1
+                break
+
+
+class Metricas:
+    "Acumulados por endpoint desde que arranca el proceso"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = {}
+        self.duracion = {}
+        self.sql_consultas = {}
+        self.sql_segundos = {}
+        self.plantillas_segundos = {}
+        self.bcrypt_segundos = {}
+
+    def registrar(self, endpoint, metodo, status, segundos, medicion):
+        with self._lock:
+            clave = (endpoint, metodo, str(status))
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            self.duracion.setdefault(endpoint, Histograma()).observar(segundos)
+            for tabla, valor in ((self.sql_consultas, medicion.consultas), (self.sql_segundos, medicion.sql),
+                                 (self.plantillas_segundos, medicion.plantillas),
+                                 (self.bcrypt_segundos, medicion.bcrypt)):
+                tabla[endpoint] = tabla.get(endpoint, 0) + valor
+
+
+def _etiquetas(**valores):
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+class Instrumentacion:
+    def __init__(self, app, muestreo=0.0, perfilador='cprofile', lenta=0.5, max_perfiles=20):
+        self.app = app
+        self.muestreo = muestreo
+        self.perfilador = perfilador if perfilador != 'pyinstrument' or Profiler is not None else 'cprofile'
+        self.lenta = lenta
+        self.metricas = Metricas()
+        self.perfiles = deque(maxlen=max_perfiles)
+        self.peticiones_lentas = deque(maxlen=50)
+        # Solo un perfilador activo a la vez por proceso (sys.monitoring es global)
+        self._perfilando = threading.Lock()
+
+    # SQL
+
+    def antes_de_consulta(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        if contexto is not None and actual() is not None:
+            contexto._inicio_instrumentacion = time.perf_counter()
+
+    def despues_de_consulta(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        inicio = getattr(contexto, '_inicio_instrumentacion', None)
+        medicion = actual()
+        if inicio is not None and medicion is not None:
+            medicion.consulta(sentencia, time.perf_counter() - inicio)
+
+    # Templates
+
+    def antes_de_template(self, app, template, context, **extra):
+        medicion = actual()
+        if medicion is not None:
+            medicion.inicio_plantillas.append(time.perf_counter())
+
+    def template_renderizado(self, app, template, context, **extra):
+        medicion = actual()
+        if medicion is not None and medicion.inicio_plantillas:
+            medicion.plantillas += time.perf_counter() - medicion.inicio_plantillas.pop()
+
+    # Peticion
+
+    def _iniciar_perfil(self):
+        if not self._perfilando.acquire(blocking=False):
+            return None
+        if self.perfilador == 'pyinstrument':
+            perfil = Profiler()
+            perfil.start()
+        else:
+            perfil = cProfile.Profile()
+            perfil.enable()
+        return perfil
+
+    def _terminar_perfil(self, perfil, endpoint, segundos):
+        try:
+            if self.perfilador == 'pyinstrument':
+                perfil.stop()
+                texto = perfil.output_text(unicode=True)
+            else:
+                perfil.disable()
+                salida = io.StringIO()
+                pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(30)
+                texto = salida.getvalue()
+        finally:
+            self._perfilando.release()
+        self.perfiles.append({'endpoint': endpoint, 'ms': round(segundos * 1000, 2),
+                              'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'perfil': texto})
+
+    def antes_de_peticion(self):
+        medicion = g._medicion = Medicion()
+        if self.muestreo and random.random() < self.muestreo:
+            medicion.perfil = self._iniciar_perfil()
+
+    def despues_de_peticion(self, respuesta):
+        medicion = g.pop('_medicion', None)
+        if medicion is None:
+            return respuesta
+        segundos = time.perf_counter() - medicion.inicio
+        endpoint = request.endpoint or 'sin_endpoint'
+        if medicion.perfil is not None:
+            self._terminar_perfil(medicion.perfil, endpoint, segundos)
+
+        self.metricas.registrar(endpoint, request.method, respuesta.status_code, segundos, medicion)
+        respuesta.headers.add('Server-Timing', ', '.join([
+            f'app;dur={segundos * 1000:.1f}',
+            f'db;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+            f'tpl;dur={medicion.plantillas * 1000:.1f}',
+            f'bcrypt;dur={medicion.bcrypt * 1000:.1f}',
+        ]))
+
+        if segundos >= self.lenta:
+            lentas = [{'ms': round(s * 1000, 2), 'sql': sql} for s, sql in sorted(medicion.lentas, reverse=True)]
+            self.peticiones_lentas.append({
+                'endpoint': endpoint, 'ruta': request.path, 'ms': round(segundos * 1000, 2),
+                'consultas': medicion.consultas, 'sql_ms': round(medicion.sql * 1000, 2), 'lentas': lentas,
+            })
+            self.app.logger.warning('Peticion lenta %s %s: %.0f ms, %s consultas (%.0f ms de SQL)',
+                                    request.method, request.path, segundos * 1000,
+                                    medicion.consultas, medicion.sql * 1000)
+        return respuesta
+
+    def descartar(self, excepcion=None):
+        "Si la peticion termino sin respuesta (excepcion), se apaga el perfilador"
+        medicion = g.pop('_medicion', None)
+        if medicion is not None and medicion.perfil is not None:
+            self._terminar_perfil(medicion.perfil, request.endpoint or 'sin_endpoint',
+                                  time.perf_counter() - medicion.inicio)
+
+    # Prometheus
+
+    def prometheus(self, extras=()):
+        "Metricas en el formato de texto de Prometheus; `extras` son (nombre, tipo, ayuda, valor) del proceso"
+        lineas = []
+
+        def serie(nombre, tipo, ayuda, valores):
+            lineas.append(f'# HELP weddingplan_{nombre} {ayuda}')
+            lineas.append(f'# TYPE weddingplan_{nombre} {tipo}')
+            for etiquetas, valor in valores:
+                lineas.append(f'weddingplan_{nombre}{etiquetas} {valor}')
+
+        m = self.metricas
+        with m._lock:
+            serie('peticiones_total', 'counter', 'Peticiones atendidas',
+                  [(_etiquetas(endpoint=e, metodo=mt, status=s), n) for (e, mt, s), n in sorted(m.peticiones.items())])
+
+            lineas.append('# HELP weddingplan_peticion_segundos Duracion de las peticiones')
+            lineas.append('# TYPE weddingplan_peticion_segundos histogram')
+            for endpoint, h in sorted(m.duracion.items()):
+                acumulado = 0
+                for limite, cuenta in zip(BUCKETS, h.cuentas):
+                    acumulado += cuenta
+                    lineas.append(f'weddingplan_peticion_segundos_bucket{_etiquetas(endpoint=endpoint, le=limite)} {acumulado}')
+                lineas.append(f'weddingplan_peticion_segundos_bucket{_etiquetas(endpoint=endpoint, le="+Inf")} {h.total}')
+                lineas.append(f'weddingplan_peticion_segundos_sum{_etiquetas(endpoint=endpoint)} {h.suma}')
+                lineas.append(f'weddingplan_peticion_segundos_count{_etiquetas(endpoint=endpoint)} {h.total}')
+
+            for nombre, ayuda, tabla in (
+                ('sql_consultas_total', 'Consultas SQL ejecutadas', m.sql_consultas),
+                ('sql_segundos_total', 'Tiempo en consultas SQL', m.sql_segundos),
+                ('plantillas_segundos_total', 'Tiempo renderizando templates', m.plantillas_segundos),
+                ('bcrypt_segundos_total', 'Tiempo en hashing de contrasenas', m.bcrypt_segundos),
+            ):
+                serie(nombre, 'counter', ayuda, [(_etiquetas(endpoint=e), v) for e, v in sorted(tabla.items())])
+
+        for nombre, tipo, ayuda, valor in extras:
+            serie(nombre, tipo, ayuda, [('', valor)])
+        return '\n'.join(lineas) + '\n'
+
+    def stats(self):
+        return {
+            'muestreo': self.muestreo,
+            'perfilador': self.perfilador,
+            'peticiones_lentas': list(self.peticiones_lentas),
+            'perfiles': list(self.perfiles),
+        }
+
+
+activa = None
+
+
+def init_app(app, *engines):
+    "Conecta la instrumentacion si INSTRUMENTACION esta activa; regresa la instancia o None"
+    global activa
+    if not app.config.get('INSTRUMENTACION'):
+        return None
+    if not app.config.get('INSTRUMENTACION_TOKEN'):
+        app.logger.warning('INSTRUMENTACION_TOKEN no esta definido: /metrics respondera 403')
+    activa = instrumentacion = Instrumentacion(
+        app,
+        muestreo=app.config.get('INSTRUMENTACION_MUESTREO', 0.0),
+        perfilador=app.config.get('INSTRUMENTACION_PERFILADOR', 'cprofile'),
+        lenta=app.config.get('INSTRUMENTACION_LENTA_MS', 500) / 1000,
+    )
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', instrumentacion.antes_de_consulta)
+        event.listen(engine, 'after_cursor_execute', instrumentacion.despues_de_consulta)
+    before_render_template.connect(instrumentacion.antes_de_template, app)
+    template_rendered.connect(instrumentacion.template_renderizado, app)
+    app.before_request(instrumentacion.antes_de_peticion)
+    app.after_request(instrumentacion.despues_de_peticion)
+    app.teardown_request(instrumentacion.descartar)
+    return instrumentacion
@@ -0,0 +1,103 @@
+import os
+import re
+
+from sqlalchemy import text
+
+from db import db
+
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MARCA_SIN_TRANSACCION = '-- sin-transaccion'
+_NOMBRE = re.compile(r'^(\d{4})_[\w-]+\.sql$')
+
+
+def migraciones_disponibles():
+    "Lista ordenada de (version, ruta) de los archivos en migrations/"
+    archivos = []
+    for nombre in sorted(os.listdir(DIRECTORIO)):
+        m = _NOMBRE.match(nombre)
+        if m:
+            archivos.append((m.group(1), os.path.join(DIRECTORIO, nombre)))
+    return archivos
+
+
+def _sentencias(sql):
+    """
+    Divide un script en sentencias por ';', respetando los bloques $$ ... $$
+    de funciones y triggers. Las lineas de comentario se descartan.
+    """
+    sin_comentarios = '\n'.join(
+        linea for linea in sql.splitlines() if not linea.strip().startswith('--')
+    )
+    sentencias = []
+    actual = []
+    for i, parte in enumerate(sin_comentarios.split('$$')):
+        if i % 2:
+            # Dentro de un bloque $$: se conserva completo
+            actual.append('$$' + parte + '$$')
+            continue
+        trozos = parte.split(';')
+        actual.append(trozos[0])
+        for trozo in trozos[1:]:
+            sentencias.append(''.join(actual))
+            actual = [trozo]
+    sentencias.append(''.join(actual))
+    return [s.strip() for s in sentencias if s.strip()]
+
+
+def _asegurar_tabla_versiones(conexion):
+    conexion.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migraciones ('
+        ' version VARCHAR(4) PRIMARY KEY,'
+        ' archivo VARCHAR(200) NOT NULL,'
+        ' aplicada_en TIMESTAMP NOT NULL DEFAULT now())'
+    ))
+
+
+def versiones_aplicadas(engine):
+    with engine.begin() as conexion:
+        _asegurar_tabla_versiones(conexion)
+        return {fila[0] for fila in conexion.execute(text('SELECT version FROM schema_migraciones'))}
+
+
+def _registrar(conexion, version, ruta):
+    conexion.execute(
+        text('INSERT INTO schema_migraciones (version, archivo) VALUES (:v, :a)'),
+        {'v': version, 'a': os.path.basename(ruta)},
+    )
+
+
+def aplicar(ruta, version, engine):
+    """
+    Aplica un archivo de migracion. Por defecto todo el archivo corre en una
+    transaccion; los que empiezan con '-- sin-transaccion' (p. ej. CREATE INDEX
+    CONCURRENTLY) se ejecutan en autocommit sentencia por sentencia.
+    """
+    with open(ruta, encoding='utf-8') as f:
+        sql = f.read()
+
+    if sql.lstrip().startswith(MARCA_SIN_TRANSACCION):
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexion:
+            for sentencia in _sentencias(sql):
+                conexion.execute(text(sentencia))
+            _registrar(conexion, version, ruta)
+    else:
+        with engine.begin() as conexion:
+            for sentencia in _sentencias(sql):
+                conexion.execute(text(sentencia))
+            _registrar(conexion, version, ruta)
+
+
+def migrar(engine=None, hasta=None):
+    "Aplica en orden las migraciones pendientes; regresa la lista de versiones aplicadas"
+    engine = engine or db.engine
+    aplicadas = versiones_aplicadas(engine)
+    nuevas = []
+    for version, ruta in migraciones_disponibles():
+        if hasta and version > hasta:
+            break
+        if version in aplicadas:
+            continue
+        aplicar(ruta, version, engine)
+        nuevas.append(version)
+    return nuevas
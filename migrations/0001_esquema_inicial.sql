@@ -0,0 +1,68 @@
+-- Esquema base de los modelos de models.py
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    correo VARCHAR(100) NOT NULL UNIQUE,
+    telefono VARCHAR(15),
+    direccion VARCHAR(200)
+);
+
+CREATE TABLE IF NOT EXISTS proveedores (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    tipo_servicio VARCHAR(100) NOT NULL,
+    contacto VARCHAR(100),
+    telefono VARCHAR(15),
+    email VARCHAR(100),
+    calificacion NUMERIC(3, 2),
+    notas TEXT,
+    activo BOOLEAN
+);
+
+CREATE TABLE IF NOT EXISTS servicios (
+    id_servicio SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion VARCHAR(255),
+    precio_base FLOAT NOT NULL,
+    categoria VARCHAR(50),
+    disponible BOOLEAN,
+    imagen_url VARCHAR(255),
+    fecha_creacion TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(80) NOT NULL,
+    email VARCHAR(90) NOT NULL,
+    password VARCHAR(200) NOT NULL,
+    rol VARCHAR(20) NOT NULL,
+    nombre_completo VARCHAR(100),
+    telefono VARCHAR(15),
+    fecha_registro TIMESTAMP WITHOUT TIME ZONE,
+    activo BOOLEAN
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_usuarios_email ON usuarios (email);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_usuarios_username ON usuarios (username);
+
+CREATE TABLE IF NOT EXISTS eventos (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios (id),
+    titulo VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    fecha_evento TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    lugar VARCHAR(200),
+    num_invitados INTEGER,
+    presupuesto_estimado NUMERIC(10, 2),
+    estado VARCHAR(20),
+    fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+    fecha_actualizacion TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS evento_servicio (
+    id SERIAL PRIMARY KEY,
+    evento_id INTEGER NOT NULL REFERENCES eventos (id),
+    servicio_id INTEGER NOT NULL REFERENCES servicios (id_servicio),
+    precio_acordado NUMERIC(10, 2) NOT NULL,
+    notas TEXT,
+    fecha_agregado TIMESTAMP WITHOUT TIME ZONE
+);
@@ -0,0 +1,12 @@
+-- Total desnormalizado de los servicios de cada evento (Evento.total_servicios)
+ALTER TABLE eventos ADD COLUMN IF NOT EXISTS total_servicios NUMERIC(10, 2) NOT NULL DEFAULT 0;
+
+UPDATE eventos e
+SET total_servicios = s.total
+FROM (
+    SELECT evento_id, SUM(precio_acordado) AS total
+    FROM evento_servicio
+    GROUP BY evento_id
+) s
+WHERE s.evento_id = e.id
+  AND e.total_servicios IS DISTINCT FROM s.total;
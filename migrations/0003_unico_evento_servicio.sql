@@ -0,0 +1,21 @@
+-- Un servicio solo puede contratarse una vez por evento.
+-- Se conservan los registros mas antiguos de cada par duplicado y se recalculan los totales afectados.
+CREATE TEMP TABLE _duplicados ON COMMIT DROP AS
+SELECT id, evento_id
+FROM (
+    SELECT id, evento_id,
+           ROW_NUMBER() OVER (PARTITION BY evento_id, servicio_id ORDER BY id) AS n
+    FROM evento_servicio
+) t
+WHERE n > 1;
+
+DELETE FROM evento_servicio WHERE id IN (SELECT id FROM _duplicados);
+
+UPDATE eventos e
+SET total_servicios = COALESCE((
+    SELECT SUM(es.precio_acordado) FROM evento_servicio es WHERE es.evento_id = e.id
+), 0)
+WHERE e.id IN (SELECT evento_id FROM _duplicados);
+
+ALTER TABLE evento_servicio
+    ADD CONSTRAINT uq_evento_servicio UNIQUE (evento_id, servicio_id);
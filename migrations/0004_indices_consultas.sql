@@ -0,0 +1,22 @@
+-- sin-transaccion
+-- Indices para las consultas frecuentes; CONCURRENTLY para no bloquear escrituras en produccion.
+
+-- cliente_dashboard: eventos del usuario ordenados por fecha
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_usuario_fecha ON eventos (usuario_id, fecha_evento);
+
+-- admin_eventos: paginacion por (fecha_evento, id) con y sin filtro de estado
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_fecha_evento_id ON eventos (fecha_evento, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_estado_fecha ON eventos (estado, fecha_evento, id);
+
+-- eventos pendientes (panel de administracion)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_pendientes ON eventos (fecha_evento) WHERE estado = 'pendiente';
+
+-- eventos recientes del panel
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_fecha_creacion ON eventos (fecha_creacion);
+
+-- catalogo de servicios disponibles y filtro por categoria
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_servicios_disponibles ON servicios (id_servicio) WHERE disponible;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_servicios_categoria ON servicios (categoria, id_servicio);
+
+-- uso de un servicio en eventos (admin_eliminar_servicio)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_evento_servicio_servicio ON evento_servicio (servicio_id);
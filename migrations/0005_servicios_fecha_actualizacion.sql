@@ -0,0 +1,6 @@
+-- Marca de ultima modificacion de los servicios: junto con el conteo forma la version del catalogo (ETag)
+ALTER TABLE servicios ADD COLUMN IF NOT EXISTS fecha_actualizacion TIMESTAMP;
+
+UPDATE servicios
+SET fecha_actualizacion = COALESCE(fecha_creacion, now())
+WHERE fecha_actualizacion IS NULL;
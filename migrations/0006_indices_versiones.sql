@@ -0,0 +1,5 @@
+-- sin-transaccion
+-- max(fecha_actualizacion) para las versiones de las respuestas condicionales sin recorrer la tabla
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_eventos_fecha_actualizacion ON eventos (fecha_actualizacion);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_servicios_fecha_actualizacion ON servicios (fecha_actualizacion);
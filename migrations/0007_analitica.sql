@@ -0,0 +1,88 @@
+-- Tablas de reportes para /admin/analitica: vistas materializadas sobre las tablas
+-- transaccionales y un registro de cambios que indica cuales hay que refrescar.
+
+-- Registro de cambios: una fila por tabla modificada y transaccion (lo llenan los triggers)
+CREATE TABLE IF NOT EXISTS analitica_cambios (
+    id BIGSERIAL PRIMARY KEY,
+    tabla VARCHAR(63) NOT NULL,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    registrado_en TIMESTAMP NOT NULL DEFAULT now(),
+    CONSTRAINT uq_analitica_cambio UNIQUE (tabla, xid)
+);
+
+CREATE OR REPLACE FUNCTION registrar_cambio_analitica() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO analitica_cambios (tabla) VALUES (TG_TABLE_NAME)
+    ON CONFLICT ON CONSTRAINT uq_analitica_cambio DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_analitica_eventos ON eventos;
+CREATE TRIGGER tr_analitica_eventos AFTER INSERT OR UPDATE OR DELETE ON eventos
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambio_analitica();
+
+DROP TRIGGER IF EXISTS tr_analitica_evento_servicio ON evento_servicio;
+CREATE TRIGGER tr_analitica_evento_servicio AFTER INSERT OR UPDATE OR DELETE ON evento_servicio
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambio_analitica();
+
+DROP TRIGGER IF EXISTS tr_analitica_servicios ON servicios;
+CREATE TRIGGER tr_analitica_servicios AFTER INSERT OR UPDATE OR DELETE ON servicios
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambio_analitica();
+
+DROP TRIGGER IF EXISTS tr_analitica_proveedores ON proveedores;
+CREATE TRIGGER tr_analitica_proveedores AFTER INSERT OR UPDATE OR DELETE ON proveedores
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_cambio_analitica();
+
+-- Ultimo refresco de cada vista
+CREATE TABLE IF NOT EXISTS analitica_refrescos (
+    vista VARCHAR(63) PRIMARY KEY,
+    refrescada_en TIMESTAMP NOT NULL DEFAULT now(),
+    duracion_ms INTEGER
+);
+
+-- Reservas por mes y estado, con presupuesto estimado contra total contratado
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_reservas_mensuales AS
+SELECT date_trunc('month', fecha_evento)::date AS mes,
+       estado,
+       count(*) AS eventos,
+       coalesce(sum(num_invitados), 0) AS invitados,
+       avg(presupuesto_estimado) AS presupuesto_promedio,
+       avg(total_servicios) AS total_promedio,
+       sum(total_servicios) AS total_contratado
+FROM eventos
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_reservas_mensuales ON mv_reservas_mensuales (mes, estado);
+
+-- Servicios por numero de contrataciones (sin eventos cancelados)
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_servicios_contratados AS
+SELECT s.id_servicio,
+       s.nombre,
+       s.categoria,
+       count(es.id) AS contrataciones,
+       coalesce(sum(es.precio_acordado), 0) AS ingresos
+FROM servicios s
+JOIN evento_servicio es ON es.servicio_id = s.id_servicio
+JOIN eventos e ON e.id = es.evento_id
+WHERE e.estado <> 'cancelado'
+GROUP BY s.id_servicio, s.nombre, s.categoria;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_servicios_contratados ON mv_servicios_contratados (id_servicio);
+CREATE INDEX IF NOT EXISTS ix_mv_servicios_contratados_top ON mv_servicios_contratados (contrataciones DESC);
+
+-- Calificacion de proveedores por tipo de servicio
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_proveedores_tipo AS
+SELECT tipo_servicio,
+       count(*) AS proveedores,
+       count(*) FILTER (WHERE activo) AS activos,
+       avg(calificacion) AS calificacion_promedio,
+       max(calificacion) AS calificacion_max
+FROM proveedores
+GROUP BY tipo_servicio;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_proveedores_tipo ON mv_proveedores_tipo (tipo_servicio);
+
+INSERT INTO analitica_refrescos (vista)
+VALUES ('mv_reservas_mensuales'), ('mv_servicios_contratados'), ('mv_proveedores_tipo')
+ON CONFLICT (vista) DO NOTHING;
@@ -0,0 +1,25 @@
+-- Periodo de cada evento (tsrange) y restriccion de exclusion: un lugar no puede
+-- tener dos eventos activos que se traslapen. Si la restriccion falla al aplicarse
+-- es que ya hay reservaciones dobles; hay que resolverlas a mano y volver a migrar.
+
+-- Fin del evento: los existentes duran 8 horas (el default de la aplicacion)
+ALTER TABLE eventos ADD COLUMN IF NOT EXISTS fecha_fin TIMESTAMP;
+
+UPDATE eventos SET fecha_fin = fecha_evento + interval '8 hours' WHERE fecha_fin IS NULL;
+
+ALTER TABLE eventos ALTER COLUMN fecha_fin SET NOT NULL;
+
+ALTER TABLE eventos ADD COLUMN IF NOT EXISTS periodo TSRANGE
+    GENERATED ALWAYS AS (tsrange(fecha_evento, fecha_fin, '[)')) STORED;
+
+-- Igualdad de texto dentro de un indice GiST (lugar WITH =)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE eventos DROP CONSTRAINT IF EXISTS ex_eventos_lugar_periodo;
+ALTER TABLE eventos ADD CONSTRAINT ex_eventos_lugar_periodo
+    EXCLUDE USING gist (lower(btrim(lugar)) WITH =, periodo WITH &&)
+    WHERE (estado <> 'cancelado' AND lugar IS NOT NULL AND btrim(lugar) <> '');
+
+-- Eventos activos por periodo: conflictos de servicios contratados y huecos libres
+CREATE INDEX IF NOT EXISTS ix_eventos_periodo ON eventos USING gist (periodo)
+    WHERE estado <> 'cancelado';
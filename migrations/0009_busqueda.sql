@@ -0,0 +1,41 @@
+-- Busqueda de texto completo (tsvector en español) y tolerante a errores (pg_trgm).
+-- Las columnas busqueda son generadas: PostgreSQL las recalcula en cada INSERT/UPDATE
+-- de la fila, sin triggers ni reindexados completos.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE eventos ADD COLUMN IF NOT EXISTS busqueda TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') ||
+    setweight(to_tsvector('spanish', coalesce(lugar, '')), 'B') ||
+    setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'C')
+) STORED;
+
+ALTER TABLE servicios ADD COLUMN IF NOT EXISTS busqueda TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('spanish', coalesce(nombre, '')), 'A') ||
+    setweight(to_tsvector('spanish', coalesce(categoria, '')), 'B') ||
+    setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'C')
+) STORED;
+
+ALTER TABLE proveedores ADD COLUMN IF NOT EXISTS busqueda TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('spanish', coalesce(nombre, '')), 'A') ||
+    setweight(to_tsvector('spanish', coalesce(tipo_servicio, '')), 'B') ||
+    setweight(to_tsvector('spanish', coalesce(notas, '')), 'C')
+) STORED;
+
+-- Nombres de usuario y correos no se derivan: configuracion 'simple'
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS busqueda TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(nombre_completo, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(email, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_eventos_busqueda ON eventos USING gin (busqueda);
+CREATE INDEX IF NOT EXISTS ix_servicios_busqueda ON servicios USING gin (busqueda);
+CREATE INDEX IF NOT EXISTS ix_proveedores_busqueda ON proveedores USING gin (busqueda);
+CREATE INDEX IF NOT EXISTS ix_usuarios_busqueda ON usuarios USING gin (busqueda);
+
+-- Trigramas sobre el texto principal de cada tabla, para encontrar palabras mal escritas
+CREATE INDEX IF NOT EXISTS ix_eventos_titulo_trgm ON eventos USING gin (titulo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_servicios_nombre_trgm ON servicios USING gin (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_proveedores_nombre_trgm ON proveedores USING gin (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_usuarios_nombre_trgm ON usuarios USING gin (
+    (username || ' ' || coalesce(nombre_completo, '') || ' ' || email) gin_trgm_ops
+);
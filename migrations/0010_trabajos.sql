@@ -0,0 +1,28 @@
+-- Cola de trabajos en segundo plano. Las rutas insertan en la misma transaccion que
+-- sus cambios (outbox transaccional) y `flask worker` los toma con FOR UPDATE SKIP LOCKED.
+-- Las fechas van en UTC, como los datetime.utcnow() de los modelos.
+CREATE TABLE IF NOT EXISTS trabajos (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    argumentos JSONB NOT NULL DEFAULT '{}',
+    -- pendiente, en_proceso, terminado, fallido
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    max_intentos INTEGER NOT NULL DEFAULT 5,
+    ejecutar_en TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    llave_idempotencia VARCHAR(200),
+    ultimo_error TEXT,
+    bloqueado_por VARCHAR(100),
+    bloqueado_en TIMESTAMP,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    CONSTRAINT uq_trabajos_llave_idempotencia UNIQUE (llave_idempotencia)
+);
+
+-- Lo que busca el worker: pendientes cuyo turno ya llego, en orden
+CREATE INDEX IF NOT EXISTS ix_trabajos_pendientes ON trabajos (ejecutar_en, id)
+    WHERE estado = 'pendiente';
+
+-- Trabajos tomados por un worker que murio sin terminarlos
+CREATE INDEX IF NOT EXISTS ix_trabajos_en_proceso ON trabajos (bloqueado_en)
+    WHERE estado = 'en_proceso';
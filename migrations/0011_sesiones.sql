@@ -0,0 +1,11 @@
+-- Sesiones del lado del servidor (sesiones.AlmacenPostgres). UNLOGGED: no pasa por el WAL,
+-- asi que escribir es barato; tras una caida del servidor la tabla queda vacia y los
+-- usuarios vuelven a iniciar sesion. Las fechas van en UTC.
+CREATE UNLOGGED TABLE IF NOT EXISTS sesiones (
+    sid VARCHAR(64) PRIMARY KEY,
+    datos BYTEA NOT NULL,
+    expira TIMESTAMP NOT NULL
+);
+
+-- Para la limpieza periodica de sesiones expiradas
+CREATE INDEX IF NOT EXISTS ix_sesiones_expira ON sesiones (expira);
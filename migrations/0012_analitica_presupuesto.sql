@@ -0,0 +1,20 @@
+-- mv_reservas_mensuales guardaba avg(presupuesto_estimado) por grupo y el panel lo
+-- ponderaba por el numero de eventos, contando tambien los que no tienen presupuesto.
+-- Ahora guarda la suma y cuantos eventos lo tienen, para promediar solo sobre esos.
+DROP MATERIALIZED VIEW IF EXISTS mv_reservas_mensuales;
+
+CREATE MATERIALIZED VIEW mv_reservas_mensuales AS
+SELECT date_trunc('month', fecha_evento)::date AS mes,
+       estado,
+       count(*) AS eventos,
+       coalesce(sum(num_invitados), 0) AS invitados,
+       sum(presupuesto_estimado) AS presupuesto_total,
+       count(presupuesto_estimado) AS con_presupuesto,
+       avg(total_servicios) AS total_promedio,
+       sum(total_servicios) AS total_contratado
+FROM eventos
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_reservas_mensuales ON mv_reservas_mensuales (mes, estado);
+
+UPDATE analitica_refrescos SET refrescada_en = now() WHERE vista = 'mv_reservas_mensuales';
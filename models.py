@@ -1,6 +1,7 @@
 from db import db
+from sqlalchemy.dialects.postgresql import JSONB
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class Cliente(db.Model):
     __tablename__ = 'clientes'  
@@ -21,7 +22,7 @@ class Usuario(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(90), unique=True, nullable=False, index=True)
-    password = db.Column(db.String(200), nullable=False)
+    password_hash = db.Column('password', db.String(200), nullable=False)
 
     "Role de administrador o cliente"
     rol = db.Column(db.String(20), nullable=False, default='cliente')
@@ -33,7 +34,7 @@ class Usuario(UserMixin, db.Model):
     activo = db.Column(db.Boolean, default=True)
 
     "Relaciones"
-    eventos = db.relationship('Evento', backref='usuario', lazy=True, cascade="all, delete-orphan")
+    eventos = db.relationship('Evento', back_populates='usuario', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Usuario {self.username}> - {self.rol}'
@@ -45,8 +46,14 @@ class Usuario(UserMixin, db.Model):
 class Servicio(db.Model):
         "Servicios que ofrece"
         __tablename__ = 'servicios'
+        __table_args__ = (
+            db.Index('ix_servicios_disponibles', 'id_servicio', postgresql_where=db.text('disponible')),
+            db.Index('ix_servicios_categoria', 'categoria', 'id_servicio'),
+            db.Index('ix_servicios_fecha_actualizacion', 'fecha_actualizacion'),
+        )
 
         id_servicio = db.Column(db.Integer, primary_key=True)
+        id = db.synonym('id_servicio')
         nombre = db.Column(db.String(100), nullable=False)
         descripcion = db.Column(db.String(255))
         precio_base = db.Column(db.Float, nullable=False)
@@ -54,9 +61,10 @@ class Servicio(db.Model):
         disponible = db.Column(db.Boolean, default=True)
         imagen_url = db.Column(db.String(255))
         fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+        fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
         "Relacion de muchos a muchos"
-        eventos = db.relationship('EventoServicio', backref='servicio', lazy=True)
+        eventos = db.relationship('EventoServicio', back_populates='servicio', lazy=True)
 
         def __repr__(self):
             return f'<Servicio {self.nombre}'
@@ -86,34 +94,51 @@ class Evento(db.Model):
      "Evento principal que pueden reservar"
 
      __tablename__ ='eventos'
+     __table_args__ = (
+          db.Index('ix_eventos_usuario_fecha', 'usuario_id', 'fecha_evento'),
+          db.Index('ix_eventos_fecha_evento_id', 'fecha_evento', 'id'),
+          db.Index('ix_eventos_estado_fecha', 'estado', 'fecha_evento', 'id'),
+          db.Index('ix_eventos_pendientes', 'fecha_evento', postgresql_where=db.text("estado = 'pendiente'")),
+          db.Index('ix_eventos_fecha_creacion', 'fecha_creacion'),
+          db.Index('ix_eventos_fecha_actualizacion', 'fecha_actualizacion'),
+     )
 
      id = db.Column(db.Integer, primary_key=True)
      usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
      titulo = db.Column(db.String(100), nullable=False)
      descripcion = db.Column(db.Text)
      fecha_evento = db.Column(db.DateTime, nullable=False)
+     "Fin del evento; por defecto 8 horas despues del inicio. periodo (tsrange) y la exclusion por lugar viven en la migracion 0008"
+     fecha_fin = db.Column(db.DateTime, nullable=False,
+                           default=lambda ctx: ctx.get_current_parameters()['fecha_evento'] + timedelta(hours=8))
      lugar = db.Column(db.String(200))
      num_invitados = db.Column(db.Integer)
      presupuesto_estimado = db.Column(db.Numeric(10, 2))
      "Pendente, Confirmado, Cancelado, Completado"
      estado = db.Column(db.String(20), default='pendiente')
+     "Suma de precio_acordado de los servicios contratados (se mantiene al agregar o quitar servicios)"
+     total_servicios = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
 
      fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
      fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-     servicios_contratados = db.relationship('EventoServicio', backref='evento', lazy=True, cascade="all, delete-orphan")
+     usuario = db.relationship('Usuario', back_populates='eventos', lazy=True)
+     servicios_contratados = db.relationship('EventoServicio', back_populates='evento', lazy=True, cascade="all, delete-orphan")
 
      def __repr__(self):
           return f"<Evento {self.titulo} - {self.fecha_evento}>"
      
      def calcular_total(self):
-        "Calcula el costo total del evento y los servicios"
-        total = sum([es.precio_acordado for es in self.servicios_contratados])
-        return total
+        "Costo total de los servicios del evento, leido de la columna desnormalizada"
+        return self.total_servicios or 0
      
 class EventoServicio(db.Model):
      "Relacion muchos a muchos entre Evento y Servicio"
 
      __tablename__ = 'evento_servicio'
+     __table_args__ = (
+          db.UniqueConstraint('evento_id', 'servicio_id', name='uq_evento_servicio'),
+          db.Index('ix_evento_servicio_servicio', 'servicio_id'),
+     )
 
      id = db.Column(db.Integer, primary_key=True)
      evento_id = db.Column(db.Integer, db.ForeignKey('eventos.id'), nullable=False)
@@ -122,5 +147,36 @@ class EventoServicio(db.Model):
      notas = db.Column(db.Text)
      fecha_agregado = db.Column(db.DateTime, default=datetime.utcnow)
 
+     evento = db.relationship('Evento', back_populates='servicios_contratados', lazy=True)
+     servicio = db.relationship('Servicio', back_populates='eventos', lazy=True)
+
+     def __repr__(self):
+            return f"<EventoServicio {self.evento_id} - {self.servicio_id}>"
+
+class Trabajo(db.Model):
+     "Trabajo en segundo plano (ver trabajos.py); se encola en la misma transaccion que lo origina"
+
+     __tablename__ = 'trabajos'
+     __table_args__ = (
+          db.UniqueConstraint('llave_idempotencia', name='uq_trabajos_llave_idempotencia'),
+          db.Index('ix_trabajos_pendientes', 'ejecutar_en', 'id', postgresql_where=db.text("estado = 'pendiente'")),
+          db.Index('ix_trabajos_en_proceso', 'bloqueado_en', postgresql_where=db.text("estado = 'en_proceso'")),
+     )
+
+     id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+     tipo = db.Column(db.String(50), nullable=False)
+     argumentos = db.Column(db.JSON().with_variant(JSONB, 'postgresql'), nullable=False, default=dict)
+     "pendiente, en_proceso, terminado, fallido"
+     estado = db.Column(db.String(20), nullable=False, default='pendiente')
+     intentos = db.Column(db.Integer, nullable=False, default=0)
+     max_intentos = db.Column(db.Integer, nullable=False, default=5)
+     ejecutar_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+     llave_idempotencia = db.Column(db.String(200))
+     ultimo_error = db.Column(db.Text)
+     bloqueado_por = db.Column(db.String(100))
+     bloqueado_en = db.Column(db.DateTime)
+     fecha_creacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+     fecha_actualizacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
      def __repr__(self):
-            return f"<EventoServicio {self.evento_id} - {self.servicio_id}>"
\ No newline at end of file
+          return f"<Trabajo {self.id} {self.tipo} - {self.estado}>"
@@ -0,0 +1,169 @@
+import base64
+import json
+from datetime import datetime, date
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+
+class TokenInvalido(ValueError):
+    "El token de pagina no se pudo decodificar"
+
+
+class Pagina:
+    """
+    Resultado de una consulta paginada por llave (keyset). Con `cargar` la
+    consulta se ejecuta hasta el primer acceso a los items, asi que un
+    fragmento en cache que la contiene la evita por completo.
+    """
+
+    def __init__(self, items=None, siguiente=None, actual=None, cargar=None):
+        self._items = items
+        self._siguiente = siguiente
+        self._cargar = cargar
+        self.actual = actual
+
+    def _resolver(self):
+        if self._cargar is not None:
+            self._items, self._siguiente = self._cargar()
+            self._cargar = None
+
+    @property
+    def items(self):
+        self._resolver()
+        return self._items
+
+    @property
+    def siguiente(self):
+        self._resolver()
+        return self._siguiente
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def es_primera(self):
+        return self.actual is None
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {'dec': str(valor)}
+    return valor
+
+
+def _deserializar(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+        if 'dec' in valor:
+            return Decimal(valor['dec'])
+    return valor
+
+
+def codificar_token(valores):
+    "Convierte los valores de la llave de orden en un token apto para la URL"
+    datos = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_token(token, num_columnas):
+    "Inverso de codificar_token; valida que el token tenga el numero de columnas esperado"
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (ValueError, TypeError) as e:
+        raise TokenInvalido(str(e))
+    if not isinstance(valores, list) or len(valores) != num_columnas:
+        raise TokenInvalido('Token de pagina con formato inesperado')
+    try:
+        return [_deserializar(v) for v in valores]
+    except ValueError as e:
+        raise TokenInvalido(str(e))
+
+
+def _condicion_despues_de(columnas, valores, descendente):
+    """
+    Condicion "fila posterior al cursor" expandida como
+    (a < x) OR (a = x AND b < y) ..., que el planificador resuelve con el
+    indice compuesto sobre las mismas columnas.
+    """
+    condiciones = []
+    for i, (columna, valor) in enumerate(zip(columnas, valores)):
+        iguales = [c == v for c, v in zip(columnas[:i], valores[:i])]
+        paso = columna < valor if descendente else columna > valor
+        condiciones.append(and_(*iguales, paso))
+    return or_(*condiciones)
+
+
+def _aplicar_cursor(consulta, columnas, token, descendente):
+    "Filtra las filas posteriores al token y ordena por las columnas de la llave"
+    if token:
+        valores = decodificar_token(token, len(columnas))
+        consulta = consulta.where(_condicion_despues_de(columnas, valores, descendente))
+    return consulta.order_by(*[c.desc() if descendente else c.asc() for c in columnas])
+
+
+def paginar(query, columnas, token=None, por_pagina=POR_PAGINA, descendente=False, perezosa=False):
+    """
+    Pagina una consulta por llave: ordena por `columnas` (la ultima debe ser
+    unica, normalmente el id) y regresa solo las filas posteriores al token.
+    El costo es el mismo en la primera pagina que en la numero mil.
+    Con perezosa=True el token se valida de inmediato pero el SQL corre
+    hasta que alguien lee la pagina.
+    """
+    columnas = list(columnas)
+    por_pagina = max(1, min(por_pagina or POR_PAGINA, MAX_POR_PAGINA))
+
+    query = _aplicar_cursor(query, columnas, token, descendente)
+
+    def cargar():
+        filas = query.limit(por_pagina + 1).all()
+        siguiente = None
+        if len(filas) > por_pagina:
+            filas = filas[:por_pagina]
+            ultima = filas[-1]
+            siguiente = codificar_token([getattr(ultima, c.key) for c in columnas])
+        return filas, siguiente
+
+    if perezosa:
+        return Pagina(actual=token, cargar=cargar)
+    filas, siguiente = cargar()
+    return Pagina(filas, siguiente=siguiente, actual=token)
+
+
+def paginar_filas(sesion, consulta, columnas, token=None, por_pagina=POR_PAGINA, descendente=False):
+    """
+    Igual que paginar, pero sobre un select de Core: regresa diccionarios de
+    filas sin construir objetos del ORM. Las columnas de la llave se agregan
+    a la consulta con etiquetas propias (_llave0, ...) para armar el token.
+    """
+    columnas = list(columnas)
+    por_pagina = max(1, min(por_pagina or POR_PAGINA, MAX_POR_PAGINA))
+
+    consulta = consulta.add_columns(*[c.label(f'_llave{i}') for i, c in enumerate(columnas)])
+    consulta = _aplicar_cursor(consulta, columnas, token, descendente)
+    filas = sesion.execute(consulta.limit(por_pagina + 1)).mappings().all()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_token([filas[-1][f'_llave{i}'] for i in range(len(columnas))])
+
+    return Pagina(filas, siguiente=siguiente, actual=token)
@@ -0,0 +1,106 @@
+"""
+Consultas de las rutas mas usadas con parametros de ejemplo. Cada una se
+revisa con EXPLAIN y enable_seqscan desactivado: si aun asi el planificador
+elige un Seq Scan sobre una de las tablas indicadas, no hay indice utilizable.
+"""
+
+import json
+
+from sqlalchemy import text
+
+from db import db
+
+
+CONSULTAS_FRECUENTES = {
+    'cliente_dashboard': (
+        'SELECT * FROM eventos WHERE usuario_id = :usuario_id ORDER BY fecha_evento DESC',
+        {'usuario_id': 1}, ['eventos'],
+    ),
+    'admin_eventos': (
+        'SELECT * FROM eventos ORDER BY fecha_evento DESC, id DESC LIMIT 51',
+        {}, ['eventos'],
+    ),
+    'admin_eventos_estado': (
+        'SELECT * FROM eventos WHERE estado = :estado ORDER BY fecha_evento DESC, id DESC LIMIT 51',
+        {'estado': 'confirmado'}, ['eventos'],
+    ),
+    'admin_eventos_siguiente_pagina': (
+        'SELECT * FROM eventos WHERE fecha_evento < :fecha OR (fecha_evento = :fecha AND id < :id) '
+        'ORDER BY fecha_evento DESC, id DESC LIMIT 51',
+        {'fecha': '2030-01-01', 'id': 1000}, ['eventos'],
+    ),
+    'eventos_pendientes': (
+        "SELECT count(*) FROM eventos WHERE estado = 'pendiente'",
+        {}, ['eventos'],
+    ),
+    'eventos_recientes': (
+        'SELECT * FROM eventos ORDER BY fecha_creacion DESC LIMIT 5',
+        {}, ['eventos'],
+    ),
+    'servicios_disponibles': (
+        'SELECT * FROM servicios WHERE disponible ORDER BY id_servicio',
+        {}, ['servicios'],
+    ),
+    'servicios_categoria': (
+        'SELECT * FROM servicios WHERE categoria = :categoria ORDER BY id_servicio LIMIT 51',
+        {'categoria': 'catering'}, ['servicios'],
+    ),
+    'evento_servicio_par': (
+        'SELECT * FROM evento_servicio WHERE evento_id = :evento_id AND servicio_id = :servicio_id',
+        {'evento_id': 1, 'servicio_id': 1}, ['evento_servicio'],
+    ),
+    'resumen_servicios': (
+        'SELECT evento_id, count(id), sum(precio_acordado) FROM evento_servicio '
+        'WHERE evento_id IN (1, 2, 3) GROUP BY evento_id',
+        {}, ['evento_servicio'],
+    ),
+    'version_eventos': (
+        'SELECT max(fecha_actualizacion) FROM eventos',
+        {}, ['eventos'],
+    ),
+    'version_catalogo': (
+        'SELECT max(fecha_actualizacion) FROM servicios',
+        {}, ['servicios'],
+    ),
+    'servicio_en_uso': (
+        'SELECT count(*) FROM evento_servicio WHERE servicio_id = :servicio_id',
+        {'servicio_id': 1}, ['evento_servicio'],
+    ),
+    'buscar_eventos': (
+        "SELECT id FROM eventos WHERE busqueda @@ to_tsquery('spanish', :q)",
+        {'q': 'boda:*'}, ['eventos'],
+    ),
+    'buscar_servicios': (
+        "SELECT id_servicio FROM servicios WHERE busqueda @@ to_tsquery('spanish', :q) AND disponible",
+        {'q': 'banquet:*'}, ['servicios'],
+    ),
+}
+
+
+def _seq_scans(nodo, encontrados):
+    if nodo.get('Node Type') == 'Seq Scan':
+        encontrados.append(nodo.get('Relation Name'))
+    for hijo in nodo.get('Plans', []):
+        _seq_scans(hijo, encontrados)
+    return encontrados
+
+
+def plan(sql, parametros):
+    "Plan de ejecucion (JSON de EXPLAIN) de una consulta sin seq scans permitidos"
+    with db.engine.connect() as conexion:
+        with conexion.begin():
+            conexion.execute(text('SET LOCAL enable_seqscan = off'))
+            resultado = conexion.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'), parametros).scalar()
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]['Plan']
+
+
+def verificar_planes():
+    "Regresa {nombre: [tablas con Seq Scan]} solo para las consultas que regresaron a seq scan"
+    regresiones = {}
+    for nombre, (sql, parametros, tablas) in CONSULTAS_FRECUENTES.items():
+        escaneadas = [t for t in _seq_scans(plan(sql, parametros), []) if t in tablas]
+        if escaneadas:
+            regresiones[nombre] = escaneadas
+    return regresiones
@@ -0,0 +1,87 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from db import db
+from models import Evento, EventoServicio
+
+
+"Perfiles de carga: cada nombre agrupa las opciones que necesita una vista"
+PERFILES = {
+    # Listados de eventos con el nombre del cliente (los servicios se resumen con resumen_servicios)
+    'evento_lista': lambda: (
+        joinedload(Evento.usuario),
+    ),
+    # Detalle de un evento con cada servicio contratado y su catalogo
+    'evento_detalle': lambda: (
+        joinedload(Evento.usuario),
+        selectinload(Evento.servicios_contratados).joinedload(EventoServicio.servicio),
+    ),
+}
+
+
+def opciones(perfil):
+    "Regresa las opciones de carga de un perfil"
+    try:
+        return PERFILES[perfil]()
+    except KeyError:
+        raise ValueError(f'Perfil de carga desconocido: {perfil}')
+
+
+def con_perfil(query, perfil):
+    "Aplica un perfil de carga a una consulta"
+    return query.options(*opciones(perfil))
+
+
+def resumen_servicios(evento_ids):
+    """
+    Numero de servicios y total por evento en una sola consulta agregada.
+    Regresa un dict {evento_id: (num_servicios, total)} sin cargar objetos EventoServicio.
+    """
+    evento_ids = list(evento_ids)
+    if not evento_ids:
+        return {}
+
+    filas = db.session.execute(
+        select(
+            EventoServicio.evento_id,
+            func.count(EventoServicio.id),
+            func.coalesce(func.sum(EventoServicio.precio_acordado), 0),
+        )
+        .where(EventoServicio.evento_id.in_(evento_ids))
+        .group_by(EventoServicio.evento_id)
+    )
+    return {evento_id: (num, total) for evento_id, num, total in filas}
+
+
+def reconciliar_totales():
+    """
+    Recalcula Evento.total_servicios a partir de evento_servicio y corrige
+    solo los eventos cuyo total guardado no coincide. Regresa cuantos se corrigieron.
+    """
+    suma = (
+        select(func.coalesce(func.sum(EventoServicio.precio_acordado), 0))
+        .where(EventoServicio.evento_id == Evento.id)
+        .scalar_subquery()
+    )
+    resultado = db.session.execute(
+        update(Evento)
+        .where(Evento.total_servicios != suma)
+        .values(total_servicios=suma)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def eventos_por_usuario(usuario_ids):
+    "Numero de eventos por usuario en una sola consulta: {usuario_id: num_eventos}"
+    usuario_ids = list(usuario_ids)
+    if not usuario_ids:
+        return {}
+
+    filas = db.session.execute(
+        select(Evento.usuario_id, func.count(Evento.id))
+        .where(Evento.usuario_id.in_(usuario_ids))
+        .group_by(Evento.usuario_id)
+    )
+    return dict(filas.all())
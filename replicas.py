@@ -0,0 +1,153 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+
+BIND_REPLICA = 'replica'
+# Cookie propia y no la sesion: con sesiones en servidor cada commit costaria una escritura
+# al almacen. Falsificarla solo manda las lecturas de ese navegador a la primaria
+COOKIE_PRIMARIA_HASTA = 'primaria_hasta'
+
+"Tablas internas: un commit que solo escribe en ellas no cambia nada que el usuario vaya a releer"
+TABLAS_INTERNAS = {'trabajos'}
+
+
+class _EstadoReplica:
+    "Ultimo resultado del chequeo de salud de la replica (compartido por los hilos del proceso)"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.disponible = True
+        self.revisada_en = 0.0
+        self.fallos = 0
+
+    def marcar_caida(self):
+        with self.lock:
+            self.disponible = False
+            self.revisada_en = time.monotonic()
+            self.fallos += 1
+
+
+estado = _EstadoReplica()
+
+
+def _replica_sana(engine):
+    "Hace ping a la replica a lo mas una vez por REPLICA_REVISION segundos"
+    intervalo = current_app.config.get('REPLICA_REVISION', 5)
+    ahora = time.monotonic()
+    if ahora - estado.revisada_en < intervalo:
+        return estado.disponible
+
+    with estado.lock:
+        if ahora - estado.revisada_en < intervalo:
+            return estado.disponible
+        estado.revisada_en = ahora
+        try:
+            with engine.connect() as conexion:
+                conexion.execute(text('SELECT 1'))
+            estado.disponible = True
+        except Exception:
+            current_app.logger.warning('Réplica de lectura no disponible, se usa la primaria')
+            estado.disponible = False
+            estado.fallos += 1
+        return estado.disponible
+
+
+def _debe_leer_de_replica():
+    if not has_request_context() or not g.get('solo_lectura'):
+        return False
+    # Lee-tus-escrituras: tras un commit propio el usuario se queda en la primaria un rato
+    try:
+        hasta = float(request.cookies.get(COOKIE_PRIMARIA_HASTA, 0))
+    except ValueError:
+        hasta = 0
+    return hasta <= time.time()
+
+
+class SesionEnrutada(Session):
+    """
+    Sesion que envia las lecturas de las rutas marcadas con @solo_lectura a la
+    replica configurada en SQLALCHEMY_BINDS['replica']. Todo lo demas (flush,
+    rutas sin marcar, sin replica o con la replica caida) va a la primaria.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _debe_leer_de_replica():
+            replica = self._db.engines.get(BIND_REPLICA)
+            if replica is not None and _replica_sana(replica):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Tablas escritas en la transaccion, por el ORM o con insert/update/delete de Core.
+# Las sentencias text() no se pueden clasificar: un commit sin tablas registradas fija igual
+
+@event.listens_for(SesionEnrutada, 'after_flush')
+def _registrar_flush(sesion, contexto):
+    tablas = sesion.info.setdefault('tablas_escritas', set())
+    for obj in list(sesion.new) + list(sesion.dirty) + list(sesion.deleted):
+        tablas.add(obj.__table__.name)
+
+
+@event.listens_for(SesionEnrutada, 'do_orm_execute')
+def _registrar_sentencia(estado_ejecucion):
+    if estado_ejecucion.is_insert or estado_ejecucion.is_update or estado_ejecucion.is_delete:
+        tabla = getattr(estado_ejecucion.statement, 'table', None)
+        if tabla is not None:
+            estado_ejecucion.session.info.setdefault('tablas_escritas', set()).add(tabla.name)
+
+
+@event.listens_for(SesionEnrutada, 'after_commit')
+def _marcar_escritura(sesion):
+    if sesion.in_nested_transaction():
+        # Savepoint (begin_nested): falta el commit de la transaccion de afuera
+        return
+    tablas = sesion.info.pop('tablas_escritas', None)
+    # Encolar un trabajo (p. ej. la cotizacion que se pide con GET) no fija al usuario en la primaria
+    if tablas and tablas <= TABLAS_INTERNAS:
+        return
+    if has_request_context():
+        g.hubo_escritura = True
+
+
+@event.listens_for(SesionEnrutada, 'after_rollback')
+def _descartar_tablas(sesion):
+    if not sesion.in_nested_transaction():
+        sesion.info.pop('tablas_escritas', None)
+
+
+def solo_lectura(f):
+    "Marca una vista como de solo lectura para que sus consultas puedan ir a la replica"
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.solo_lectura = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_app(app, db):
+    with app.app_context():
+        replica = db.engines.get(BIND_REPLICA)
+
+    if replica is not None:
+        # Un error de conexion en la replica la marca como caida hasta el siguiente chequeo
+        @event.listens_for(replica, 'handle_error')
+        def _error_en_replica(contexto):
+            if contexto.is_disconnect:
+                estado.marcar_caida()
+
+    @app.after_request
+    def _fijar_primaria(respuesta):
+        if g.get('hubo_escritura'):
+            ventana = app.config.get('REPLICA_VENTANA_ESCRITURA', 10)
+            respuesta.set_cookie(COOKIE_PRIMARIA_HASTA, str(int(time.time()) + ventana), max_age=ventana,
+                                 secure=app.config.get('SESSION_COOKIE_SECURE', False),
+                                 httponly=True, samesite='Lax')
+        return respuesta
+
+    return replica
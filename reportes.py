@@ -0,0 +1,122 @@
+import csv
+import io
+from collections import namedtuple
+from decimal import Decimal
+
+from sqlalchemy import distinct, func, select
+
+from db import db
+from models import Evento, EventoServicio, Servicio, Usuario
+
+
+"Titulo para la pagina de reportes y funcion que arma la consulta con los filtros"
+Reporte = namedtuple('Reporte', ['titulo', 'consulta'])
+
+"Filas que se piden al cursor del servidor en cada vuelta"
+TAMANO_LOTE = 500
+
+_NO_CANCELADO = Evento.estado != 'cancelado'
+
+
+def _filtrar_fechas(consulta, desde, hasta):
+    if desde:
+        consulta = consulta.where(Evento.fecha_evento >= desde)
+    if hasta:
+        consulta = consulta.where(Evento.fecha_evento < hasta)
+    return consulta
+
+
+def eventos_por_mes(desde=None, hasta=None):
+    "Eventos por mes y estado, con el total contratado y el presupuesto estimado"
+    mes = func.to_char(Evento.fecha_evento, 'YYYY-MM')
+    consulta = (
+        select(
+            mes.label('mes'),
+            Evento.estado.label('estado'),
+            func.count(Evento.id).label('eventos'),
+            func.coalesce(func.sum(Evento.total_servicios), 0).label('total_servicios'),
+            func.coalesce(func.sum(Evento.presupuesto_estimado), 0).label('presupuesto_estimado'),
+        )
+        .group_by(mes, Evento.estado)
+        .order_by(mes, Evento.estado)
+    )
+    return _filtrar_fechas(consulta, desde, hasta)
+
+
+def ingresos_por_categoria(desde=None, hasta=None):
+    "Ingresos de servicios contratados por categoria (sin eventos cancelados)"
+    consulta = (
+        select(
+            Servicio.categoria.label('categoria'),
+            func.count(EventoServicio.id).label('contrataciones'),
+            func.count(distinct(EventoServicio.evento_id)).label('eventos'),
+            func.sum(EventoServicio.precio_acordado).label('ingresos'),
+            func.round(func.avg(EventoServicio.precio_acordado), 2).label('precio_promedio'),
+        )
+        .join(Servicio, Servicio.id_servicio == EventoServicio.servicio_id)
+        .join(Evento, Evento.id == EventoServicio.evento_id)
+        .where(_NO_CANCELADO)
+        .group_by(Servicio.categoria)
+        .order_by(func.sum(EventoServicio.precio_acordado).desc())
+    )
+    return _filtrar_fechas(consulta, desde, hasta)
+
+
+def totales_por_cliente(desde=None, hasta=None):
+    "Eventos y monto contratado por cliente; los cancelados se cuentan aparte y no suman"
+    consulta = (
+        select(
+            Usuario.id.label('usuario_id'),
+            Usuario.username.label('usuario'),
+            Usuario.nombre_completo.label('nombre'),
+            Usuario.email.label('email'),
+            func.count(Evento.id).label('eventos'),
+            func.count(Evento.id).filter(Evento.estado == 'cancelado').label('cancelados'),
+            func.coalesce(func.sum(Evento.total_servicios).filter(_NO_CANCELADO), 0).label('total_contratado'),
+        )
+        .join(Evento, Evento.usuario_id == Usuario.id)
+        .group_by(Usuario.id)
+        .order_by(Usuario.id)
+    )
+    return _filtrar_fechas(consulta, desde, hasta)
+
+
+REPORTES = {
+    'eventos_por_mes': Reporte('Eventos por mes y estado', eventos_por_mes),
+    'ingresos_por_categoria': Reporte('Ingresos por categoría de servicio', ingresos_por_categoria),
+    'totales_por_cliente': Reporte('Totales por cliente', totales_por_cliente),
+}
+
+
+def _celda(valor):
+    # Decimal se escribe tal cual (sin notacion cientifica) para que Excel lo lea como numero
+    if isinstance(valor, Decimal):
+        return format(valor, 'f')
+    return valor
+
+
+def generar_csv(nombre, desde=None, hasta=None, tamano_lote=TAMANO_LOTE):
+    """
+    Genera el reporte como CSV por bloques. El encabezado sale antes de ejecutar
+    la consulta y las filas se leen con un cursor con nombre (stream_results),
+    asi que la memoria no depende del numero de filas.
+    El BOM al inicio hace que Excel abra el archivo como UTF-8.
+    """
+    consulta = REPORTES[nombre].consulta(desde, hasta)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    escritor.writerow([c.name for c in consulta.selected_columns])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    resultado = db.session.execute(
+        consulta, execution_options={'stream_results': True, 'yield_per': tamano_lote}
+    )
+    for filas in resultado.partitions():
+        escritor.writerows([_celda(v) for v in fila] for fila in filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
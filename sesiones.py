@@ -0,0 +1,376 @@
+"""
+Sesiones guardadas en el servidor: la cookie solo lleva un id aleatorio y
+los datos viven en un almacen (tabla UNLOGGED de PostgreSQL, sqlite local o
+memoria del proceso). La sesion se lee del almacen la primera vez que se usa
+y se escribe solo si cambio; la expiracion se extiende sin reescribir los
+datos cuando ya paso la mitad de la vida de la sesion.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from sqlalchemy import inspect, text
+
+from db import db
+
+
+"Claves que Flask-Login escribe y consume dentro de la misma peticion"
+CLAVES_DE_PETICION = {'_remember'}
+
+"Los datos se comprimen a partir de este tamaño (bytes)"
+MIN_COMPRIMIR = 512
+
+
+class Serializador:
+    """
+    JSON compacto con las etiquetas de Flask (conserva tuplas, bytes, Markup
+    y datetime como la sesion de cookie), en bytes y comprimido con zlib
+    cuando vale la pena. El primer byte indica el formato.
+    """
+
+    def __init__(self):
+        self.json = TaggedJSONSerializer()
+
+    def dumps(self, datos):
+        crudo = self.json.dumps(datos).encode('utf-8')
+        if len(crudo) >= MIN_COMPRIMIR:
+            return b'z' + zlib.compress(crudo)
+        return b'j' + crudo
+
+    def loads(self, contenido):
+        contenido = bytes(contenido)
+        if contenido[:1] == b'z':
+            return self.json.loads(zlib.decompress(contenido[1:]).decode('utf-8'))
+        return self.json.loads(contenido[1:].decode('utf-8'))
+
+
+class AlmacenSesiones(ABC):
+    """
+    Interfaz de los almacenes. Guardan bytes ya serializados con un tiempo de
+    vida en segundos; `cargar` regresa (datos, segundos_restantes) o None si
+    la sesion no existe o ya expiro.
+    """
+
+    @abstractmethod
+    def cargar(self, sid):
+        "(datos, segundos_restantes) de la sesion, o None"
+
+    @abstractmethod
+    def guardar(self, sid, datos, ttl):
+        "Crea o reemplaza la sesion con ttl segundos de vida"
+
+    @abstractmethod
+    def extender(self, sid, ttl):
+        "Reinicia el tiempo de vida sin reescribir los datos"
+
+    @abstractmethod
+    def borrar(self, sid):
+        "Elimina la sesion si existe"
+
+    @abstractmethod
+    def limpiar(self):
+        "Borra las sesiones expiradas; regresa cuantas"
+
+
+class AlmacenMemoria(AlmacenSesiones):
+    "Un solo proceso (desarrollo, o un servidor con un solo worker)"
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def cargar(self, sid):
+        entrada = self._datos.get(sid)
+        if entrada is None:
+            return None
+        restante = entrada[1] - time.time()
+        return (entrada[0], restante) if restante > 0 else None
+
+    def guardar(self, sid, datos, ttl):
+        with self._lock:
+            self._datos[sid] = (datos, time.time() + ttl)
+
+    def extender(self, sid, ttl):
+        with self._lock:
+            entrada = self._datos.get(sid)
+            if entrada is not None:
+                self._datos[sid] = (entrada[0], time.time() + ttl)
+
+    def borrar(self, sid):
+        with self._lock:
+            self._datos.pop(sid, None)
+
+    def limpiar(self):
+        ahora = time.time()
+        with self._lock:
+            expiradas = [sid for sid, (_, expira) in self._datos.items() if expira <= ahora]
+            for sid in expiradas:
+                del self._datos[sid]
+        return len(expiradas)
+
+
+class AlmacenSqlite(AlmacenSesiones):
+    "Archivo sqlite local: lo comparten los workers de un mismo servidor"
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._conexion().execute('CREATE TABLE IF NOT EXISTS sesiones '
+                                 '(sid TEXT PRIMARY KEY, datos BLOB NOT NULL, expira REAL NOT NULL)')
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def cargar(self, sid):
+        fila = self._conexion().execute(
+            'SELECT datos, expira - ? FROM sesiones WHERE sid = ? AND expira > ?', (time.time(), sid, time.time())
+        ).fetchone()
+        return (fila[0], fila[1]) if fila else None
+
+    def guardar(self, sid, datos, ttl):
+        self._conexion().execute('INSERT OR REPLACE INTO sesiones VALUES (?, ?, ?)',
+                                 (sid, datos, time.time() + ttl))
+
+    def extender(self, sid, ttl):
+        self._conexion().execute('UPDATE sesiones SET expira = ? WHERE sid = ?', (time.time() + ttl, sid))
+
+    def borrar(self, sid):
+        self._conexion().execute('DELETE FROM sesiones WHERE sid = ?', (sid,))
+
+    def limpiar(self):
+        return self._conexion().execute('DELETE FROM sesiones WHERE expira <= ?', (time.time(),)).rowcount
+
+
+class AlmacenPostgres(AlmacenSesiones):
+    """
+    Tabla UNLOGGED `sesiones` (migracion 0011): sin WAL las escrituras son
+    baratas, y si el servidor se cae los usuarios solo vuelven a iniciar
+    sesion. Usa su propia conexion del pool, fuera de la transaccion de la ruta.
+    """
+
+    def cargar(self, sid):
+        with db.engine.connect() as conexion:
+            fila = conexion.execute(text(
+                "SELECT datos, extract(epoch FROM expira - timezone('utc', now())) FROM sesiones "
+                "WHERE sid = :sid AND expira > timezone('utc', now())"
+            ), {'sid': sid}).first()
+        return (fila[0], float(fila[1])) if fila else None
+
+    def guardar(self, sid, datos, ttl):
+        with db.engine.begin() as conexion:
+            conexion.execute(text(
+                "INSERT INTO sesiones (sid, datos, expira) "
+                "VALUES (:sid, :datos, timezone('utc', now()) + make_interval(secs => :ttl)) "
+                "ON CONFLICT (sid) DO UPDATE SET datos = EXCLUDED.datos, expira = EXCLUDED.expira"
+            ), {'sid': sid, 'datos': datos, 'ttl': ttl})
+
+    def extender(self, sid, ttl):
+        with db.engine.begin() as conexion:
+            conexion.execute(text(
+                "UPDATE sesiones SET expira = timezone('utc', now()) + make_interval(secs => :ttl) WHERE sid = :sid"
+            ), {'sid': sid, 'ttl': ttl})
+
+    def borrar(self, sid):
+        with db.engine.begin() as conexion:
+            conexion.execute(text('DELETE FROM sesiones WHERE sid = :sid'), {'sid': sid})
+
+    def limpiar(self):
+        with db.engine.begin() as conexion:
+            return conexion.execute(text(
+                "DELETE FROM sesiones WHERE expira <= timezone('utc', now())"
+            )).rowcount
+
+
+class SesionServidor(SessionMixin):
+    """
+    Sesion que se carga del almacen en el primer acceso. `modified` se marca
+    con cualquier asignacion o borrado de claves (como en la sesion de cookie,
+    mutar un valor sin reasignarlo no cuenta).
+    """
+
+    def __init__(self, interfaz, sid=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.restante = None
+        self.usuario_original = None
+        self._interfaz = interfaz
+        self._datos = None if sid else {}
+
+    @property
+    def cargada(self):
+        return self._datos is not None
+
+    def _cargar(self):
+        self.accessed = True
+        if self._datos is None:
+            encontrado = self._interfaz.almacen.cargar(self.sid)
+            if encontrado is None:
+                # Id desconocido o expirado: se trata como sesion nueva y se le dara otro id
+                self.sid, self.new, self._datos = None, True, {}
+            else:
+                self._datos = self._interfaz.serializador.loads(encontrado[0])
+                self.restante = encontrado[1]
+            self.usuario_original = self._datos.get('_user_id')
+        return self._datos
+
+    def __getitem__(self, clave):
+        return self._cargar()[clave]
+
+    def __setitem__(self, clave, valor):
+        self._cargar()[clave] = valor
+        self.modified = True
+
+    def __delitem__(self, clave):
+        del self._cargar()[clave]
+        self.modified = True
+
+    def __contains__(self, clave):
+        # Flask-Login revisa '_remember' despues de cada peticion; esa clave solo
+        # existe en la peticion que la escribe, asi que no vale la pena cargar la sesion
+        if self._datos is None and clave in CLAVES_DE_PETICION:
+            return False
+        return clave in self._cargar()
+
+    def __iter__(self):
+        return iter(self._cargar())
+
+    def __len__(self):
+        return len(self._cargar())
+
+    def clear(self):
+        self._cargar().clear()
+        self.modified = True
+
+
+class SesionesServidor(SessionInterface):
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.serializador = Serializador()
+        self.escrituras = 0
+        self.extensiones = 0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        return SesionServidor(self, sid or None)
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        opciones = dict(domain=self.get_cookie_domain(app), path=self.get_cookie_path(app),
+                        secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+                        httponly=self.get_cookie_httponly(app))
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.cargada:
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        if session.modified:
+            if not session:
+                if session.sid:
+                    self.almacen.borrar(session.sid)
+                response.delete_cookie(nombre, **opciones)
+                response.vary.add('Cookie')
+                return
+            # Cambio de usuario (login, logout): id nuevo para que no sirva uno fijado antes del login
+            if session.sid and session.get('_user_id') != session.usuario_original:
+                self.almacen.borrar(session.sid)
+                session.sid = None
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(32)
+            self.almacen.guardar(session.sid, self.serializador.dumps(dict(session)), ttl)
+            self.escrituras += 1
+        elif session.sid and session.restante is not None and session.restante < ttl / 2:
+            # Expiracion deslizante: solo se escribe cuando ya paso la mitad del tiempo
+            self.almacen.extender(session.sid, ttl)
+            self.extensiones += 1
+        else:
+            return
+
+        response.set_cookie(nombre, session.sid, expires=self.get_expiration_time(app, session), **opciones)
+        response.vary.add('Cookie')
+
+    def stats(self):
+        return {'almacen': type(self.almacen).__name__, 'escrituras': self.escrituras,
+                'extensiones': self.extensiones}
+
+
+def _barrer(app, almacen, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            with app.app_context():
+                borradas = almacen.limpiar()
+            if borradas:
+                app.logger.info('Sesiones expiradas borradas: %s', borradas)
+        except Exception:
+            app.logger.exception('No se pudieron borrar las sesiones expiradas')
+
+
+def _revisar_tabla(app):
+    "Sin la migracion 0011 todas las peticiones fallarian al guardar la sesion; se avisa al arrancar"
+    try:
+        with app.app_context():
+            existe = inspect(db.engine).has_table('sesiones')
+    except Exception:
+        # Base de datos no disponible al arrancar: la primera peticion reportara el error
+        return
+    if not existe:
+        raise RuntimeError("SESIONES_ALMACEN='postgres' necesita la tabla sesiones (migracion 0011): "
+                           "ejecuta SESIONES_ALMACEN=cookie flask migrar")
+
+
+def crear_almacen(app):
+    tipo = app.config.get('SESIONES_ALMACEN', 'cookie')
+    if tipo == 'memoria':
+        return AlmacenMemoria()
+    if tipo == 'sqlite':
+        ruta = app.config.get('SESIONES_SQLITE_RUTA') or os.path.join(app.instance_path, 'sesiones.db')
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        return AlmacenSqlite(ruta)
+    if tipo == 'postgres':
+        if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+            raise ValueError("SESIONES_ALMACEN='postgres' requiere que la base de datos sea PostgreSQL")
+        return AlmacenPostgres()
+    raise ValueError(f'SESIONES_ALMACEN desconocido: {tipo}')
+
+
+def init_app(app):
+    "Cambia la sesion de cookie firmada por la del servidor si SESIONES_ALMACEN no es 'cookie'"
+    if app.config.get('SESIONES_ALMACEN', 'cookie') == 'cookie':
+        return None
+    almacen = crear_almacen(app)
+    if isinstance(almacen, AlmacenPostgres):
+        _revisar_tabla(app)
+    app.session_interface = SesionesServidor(almacen)
+
+    intervalo = app.config.get('SESIONES_LIMPIEZA', 300)
+    if intervalo:
+        lock = threading.Lock()
+        barrendero = []
+
+        # El hilo se arranca con la primera peticion, no en comandos de la CLI
+        @app.before_request
+        def _arrancar_limpieza():
+            if barrendero:
+                return
+            with lock:
+                if not barrendero:
+                    hilo = threading.Thread(target=_barrer, args=(app, almacen, intervalo),
+                                            name='sesiones-limpieza', daemon=True)
+                    hilo.start()
+                    barrendero.append(hilo)
+    return app.session_interface
@@ -0,0 +1,82 @@
+from sqlalchemy import func, literal, select, union_all
+
+from cache import TTLCache
+from db import db
+from models import Usuario, Servicio, Evento, EventoServicio
+
+
+"Cache de las estadisticas del panel de administracion (un solo valor por proceso)"
+cache = TTLCache(ttl=30, maxsize=4)
+
+NUM_RECIENTES = 5
+
+
+def init_app(app):
+    cache.ttl = app.config.get('ESTADISTICAS_TTL', cache.ttl)
+
+
+def _contadores():
+    """
+    Todos los contadores del panel en una sola sentencia:
+    totales de usuarios y servicios mas eventos agrupados por estado.
+    """
+    consulta = union_all(
+        select(literal('usuarios'), func.count()).select_from(Usuario),
+        select(literal('servicios'), func.count()).select_from(Servicio),
+        select(func.coalesce(Evento.estado, 'sin_estado'), func.count())
+            .group_by(Evento.estado),
+    )
+    por_estado = {}
+    totales = {'usuarios': 0, 'servicios': 0}
+    for clave, valor in db.session.execute(consulta):
+        if clave in totales:
+            totales[clave] = valor
+        else:
+            por_estado[clave] = por_estado.get(clave, 0) + valor
+
+    return {
+        'total_usuarios': totales['usuarios'],
+        'total_servicios': totales['servicios'],
+        'total_eventos': sum(por_estado.values()),
+        'eventos_por_estado': por_estado,
+        'eventos_pendientes': por_estado.get('pendiente', 0),
+    }
+
+
+def _eventos_recientes():
+    "Ultimos eventos creados con el cliente y el numero de servicios, como dicts simples"
+    num_servicios = (
+        select(func.count(EventoServicio.id))
+        .where(EventoServicio.evento_id == Evento.id)
+        .scalar_subquery()
+    )
+    filas = db.session.execute(
+        select(Evento.id, Evento.titulo, Evento.fecha_evento, Evento.estado,
+               Usuario.nombre_completo, num_servicios)
+        .join(Usuario, Evento.usuario_id == Usuario.id)
+        .order_by(Evento.fecha_creacion.desc())
+        .limit(NUM_RECIENTES)
+    )
+    return [
+        {
+            'id': id_, 'titulo': titulo, 'fecha_evento': fecha, 'estado': estado,
+            'cliente': cliente, 'num_servicios': servicios,
+        }
+        for id_, titulo, fecha, estado, cliente, servicios in filas
+    ]
+
+
+def _calcular():
+    datos = _contadores()
+    datos['eventos_recientes'] = _eventos_recientes()
+    return datos
+
+
+def estadisticas_dashboard():
+    "Estadisticas del panel; se recalculan a lo mas una vez por ventana de TTL"
+    return cache.obtener('dashboard', _calcular)
+
+
+def invalidar():
+    "Descarta las estadisticas guardadas; se llama desde las rutas que escriben"
+    cache.invalidar()
@@ -0,0 +1,105 @@
+"""
+Trabajos en segundo plano que encolan las rutas (ver trabajos.encolar).
+Cada funcion recibe solo ids y vuelve a leer de la base de datos: cuando
+corre, el registro puede haber cambiado o ya no existir.
+"""
+
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+import bulk
+import cotizaciones
+from db import db
+from models import Evento, EventoServicio, Proveedor, Usuario
+from trabajos import tarea
+
+
+def enviar_correo(para, asunto, cuerpo):
+    "Envia un correo por SMTP; sin CORREO_SERVIDOR configurado solo lo registra en el log"
+    config = current_app.config
+    if not para:
+        return
+    if not config.get('CORREO_SERVIDOR'):
+        current_app.logger.info('Correo a %s: %s', para, asunto)
+        return
+
+    mensaje = EmailMessage()
+    mensaje['From'] = config['CORREO_REMITENTE']
+    mensaje['To'] = para
+    mensaje['Subject'] = asunto
+    mensaje.set_content(cuerpo)
+    with smtplib.SMTP(config['CORREO_SERVIDOR'], config['CORREO_PUERTO'], timeout=30) as smtp:
+        if config.get('CORREO_TLS'):
+            smtp.starttls()
+        if config.get('CORREO_USUARIO'):
+            smtp.login(config['CORREO_USUARIO'], config['CORREO_PASSWORD'])
+        smtp.send_message(mensaje)
+
+
+@tarea('correo_bienvenida')
+def correo_bienvenida(usuario_id):
+    usuario = db.session.get(Usuario, usuario_id)
+    if usuario is None:
+        return
+    enviar_correo(usuario.email, 'Bienvenido a Wedding Plan',
+                  f'Hola {usuario.nombre_completo or usuario.username}, tu cuenta fue creada. '
+                  'Ya puedes iniciar sesión y planear tu evento.')
+
+
+@tarea('evento_creado')
+def evento_creado(evento_id):
+    "Confirmacion al cliente y aviso al equipo de nuevos eventos"
+    evento = db.session.get(Evento, evento_id)
+    if evento is None:
+        return
+    fecha = evento.fecha_evento.strftime('%d/%m/%Y %H:%M')
+    enviar_correo(evento.usuario.email, f'Evento registrado: {evento.titulo}',
+                  f'Registramos tu evento "{evento.titulo}" para el {fecha} en {evento.lugar or "lugar por definir"}. '
+                  'Te avisaremos cuando sea confirmado.')
+    enviar_correo(current_app.config.get('CORREO_NOTIFICACIONES'), f'Nuevo evento: {evento.titulo}',
+                  f'{evento.usuario.username} registró "{evento.titulo}" para el {fecha}.')
+
+
+@tarea('servicio_contratado')
+def servicio_contratado(evento_servicio_id):
+    "Avisa a los proveedores activos del tipo del servicio que se contrato"
+    contratado = db.session.get(EventoServicio, evento_servicio_id)
+    if contratado is None:
+        return
+    evento, servicio = contratado.evento, contratado.servicio
+    proveedores = Proveedor.query.filter(
+        Proveedor.activo.is_(True),
+        Proveedor.email.isnot(None),
+        db.func.lower(Proveedor.tipo_servicio) == (servicio.categoria or '').lower(),
+    ).all()
+    fecha = evento.fecha_evento.strftime('%d/%m/%Y %H:%M')
+    for proveedor in proveedores:
+        enviar_correo(proveedor.email, f'Servicio contratado: {servicio.nombre}',
+                      f'Se contrató "{servicio.nombre}" para el evento "{evento.titulo}" '
+                      f'del {fecha} en {evento.lugar or "lugar por definir"}.')
+
+
+@tarea('cuenta_actualizada')
+def cuenta_actualizada(usuario_id, activo):
+    "Avisa al usuario que un administrador activo o desactivo su cuenta (estado al momento del cambio)"
+    usuario = db.session.get(Usuario, usuario_id)
+    if usuario is None:
+        return
+    estado, verbo = ('activada', 'activó') if activo else ('desactivada', 'desactivó')
+    enviar_correo(usuario.email, f'Tu cuenta fue {estado}',
+                  f'Hola {usuario.nombre_completo or usuario.username}, un administrador {verbo} tu cuenta.')
+
+
+@tarea('generar_cotizacion', max_intentos=3)
+def generar_cotizacion(evento_id, formato):
+    "Deja en disco la cotizacion de la version actual del evento (ver cotizaciones.generar)"
+    cotizaciones.generar(evento_id, formato)
+
+
+# Un reintento volveria a insertar los lotes que ya se confirmaron
+@tarea('importar_catalogo', max_intentos=1)
+def importar_catalogo(catalogo, archivo, formato):
+    "Carga masiva subida en /admin/importar (ver bulk.importar_subida)"
+    bulk.importar_subida(catalogo, archivo, formato)
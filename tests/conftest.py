@@ -0,0 +1,163 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+
+
+"""
+Las pruebas usan una base de datos sqlite temporal. Con TEST_DATABASE_URL
+(PostgreSQL) corren contra ella con las migraciones reales y se habilitan las
+pruebas marcadas con el fixture `postgres`. DATABASE_URL nunca se usa: las
+pruebas borran todos los datos en cada caso.
+"""
+
+_CARPETA = tempfile.mkdtemp(prefix='weddingplan-pruebas-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or f'sqlite:///{_CARPETA}/pruebas.db'
+os.environ.update({
+    'SESIONES_ALMACEN': 'cookie',
+    'USUARIOS_CACHE_BACKEND': 'memoria',
+    'FRAGMENTOS_BACKEND': 'memoria',
+    'HASH_POOL_WORKERS': '0',
+    'BCRYPT_LOG_ROUNDS': '4',
+    'INSTRUMENTACION': '0',
+})
+
+import app as aplicacion  # noqa: E402  (config lee las variables de entorno al importarse)
+import catalogo  # noqa: E402
+import disponibilidad  # noqa: E402
+import fragment_cache  # noqa: E402
+import stats  # noqa: E402
+import user_cache  # noqa: E402
+from db import db  # noqa: E402
+from migrar import migrar  # noqa: E402
+from models import Usuario, Servicio, Evento, EventoServicio  # noqa: E402
+
+PASSWORD = 'Secreto123'
+
+
+def _reiniciar_caches(app):
+    "Los caches del proceso sobreviven entre pruebas; cada una empieza sin nada guardado"
+    stats.invalidar()
+    user_cache.init_app(app)
+    fragment_cache.backend().limpiar()
+    catalogo._estado['instantanea'] = None
+    disponibilidad.indice.invalidar()
+
+
+@pytest.fixture(scope='session')
+def _esquema():
+    app = aplicacion.app
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            migrar()
+    return app
+
+
+@pytest.fixture
+def app(_esquema):
+    app = _esquema
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            tablas = ', '.join(t.name for t in db.metadata.sorted_tables)
+            with db.engine.begin() as conexion:
+                conexion.execute(text(f'TRUNCATE {tablas} RESTART IDENTITY CASCADE'))
+        else:
+            db.drop_all()
+            db.create_all()
+    _reiniciar_caches(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def postgres(app):
+    "Para pruebas que dependen de PostgreSQL (planes, restricciones con nombre)"
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            pytest.skip('requiere TEST_DATABASE_URL de PostgreSQL')
+
+
+def iniciar_sesion(client, usuario_id):
+    "Sesion de Flask-Login sin pasar por el formulario de login"
+    with client.session_transaction() as sesion:
+        sesion['_user_id'] = str(usuario_id)
+        sesion['_fresh'] = True
+
+
+@pytest.fixture
+def datos(app):
+    """
+    Un admin, dos clientes y tres servicios. `datos.evento(usuario_id, servicios=n)`
+    crea un evento con los primeros n servicios contratados y regresa su id.
+    """
+    password_hash = aplicacion.hashing.pool.generar_hash(PASSWORD)
+
+    class Datos:
+        def evento(self, usuario_id, servicios=0, **valores):
+            with app.app_context():
+                evento = Evento(usuario_id=usuario_id, titulo=valores.pop('titulo', 'Boda'),
+                                fecha_evento=valores.pop('fecha_evento', datetime(2030, 6, 1, 18)),
+                                lugar=valores.pop('lugar', 'Hacienda'), estado='pendiente', **valores)
+                db.session.add(evento)
+                db.session.flush()
+                for servicio_id in self.servicios[:servicios]:
+                    db.session.add(EventoServicio(evento_id=evento.id, servicio_id=servicio_id, precio_acordado=100))
+                evento.total_servicios = 100 * min(servicios, len(self.servicios))
+                db.session.commit()
+                return evento.id
+
+        def eventos(self, usuario_id, n, servicios=0):
+            inicio = datetime(2030, 1, 1, 12)
+            return [self.evento(usuario_id, servicios, titulo=f'Evento {i}', lugar=f'Salon {i}',
+                                fecha_evento=inicio + timedelta(days=i)) for i in range(n)]
+
+    d = Datos()
+    with app.app_context():
+        usuarios = [
+            Usuario(username='admin', email='admin@example.com', rol='admin',
+                    nombre_completo='Admin', password_hash=password_hash),
+            Usuario(username='cliente1', email='cliente1@example.com', rol='cliente',
+                    nombre_completo='Cliente Uno', password_hash=password_hash),
+            Usuario(username='cliente2', email='cliente2@example.com', rol='cliente',
+                    nombre_completo='Cliente Dos', password_hash=password_hash),
+        ]
+        servicios = [Servicio(nombre=f'Servicio {i}', descripcion='Servicio de prueba', precio_base=1000 + i,
+                              categoria='catering', disponible=True) for i in range(3)]
+        db.session.add_all(usuarios + servicios)
+        db.session.commit()
+        d.admin, d.cliente, d.otro_cliente = (u.id for u in usuarios)
+        d.servicios = [s.id_servicio for s in servicios]
+    return d
+
+
+@pytest.fixture
+def contar_consultas(app):
+    """
+    with contar_consultas() as consultas: ... deja en la lista cada sentencia
+    SQL que paso por before_cursor_execute del motor principal.
+    """
+    @contextmanager
+    def contar():
+        sentencias = []
+
+        def _registrar(conn, cursor, sentencia, parametros, contexto, varias):
+            sentencias.append(sentencia)
+
+        with app.app_context():
+            motor = db.engine
+        event.listen(motor, 'before_cursor_execute', _registrar)
+        try:
+            yield sentencias
+        finally:
+            event.remove(motor, 'before_cursor_execute', _registrar)
+    return contar
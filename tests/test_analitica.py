@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+import analitica
+from db import db
+
+
+def test_presupuesto_promedio_ignora_eventos_sin_presupuesto(app, datos, postgres):
+    fecha = datetime.now().replace(day=15, hour=18, minute=0, second=0, microsecond=0)
+    for i, presupuesto in enumerate([1000, None, 3000]):
+        datos.evento(datos.cliente, titulo=f'Evento {i}', lugar=f'Salon {i}', fecha_evento=fecha,
+                     presupuesto_estimado=presupuesto)
+
+    with app.app_context():
+        analitica.refrescar(todas=True)
+        materializada = analitica.panel()['presupuesto_vs_total']
+        directa = db.session.execute(text(analitica.CONSULTAS_DIRECTAS['presupuesto_vs_total'])).mappings().all()
+
+    assert [float(f['presupuesto_promedio']) for f in materializada] == [2000.0]
+    assert [float(f['presupuesto_promedio']) for f in directa] == [2000.0]
@@ -0,0 +1,65 @@
+from tests.conftest import iniciar_sesion
+
+
+"API JSON /api/v1/<recurso>: paginacion por cursor, campos, inclusiones y permisos"
+
+
+def _paginas(client, url):
+    "Sigue el cursor `siguiente` hasta la ultima pagina; regresa las paginas recibidas"
+    paginas = []
+    while url:
+        r = client.get(url)
+        assert r.status_code == 200
+        paginas.append(r.json['datos'])
+        siguiente = r.json['siguiente']
+        url = f'/api/v1/eventos?por_pagina=2&pagina={siguiente}' if siguiente else None
+    return paginas
+
+
+def test_paginacion_por_cursor(client, datos):
+    propios = datos.eventos(datos.cliente, 5)
+    datos.evento(datos.otro_cliente, lugar='Jardin')
+    iniciar_sesion(client, datos.cliente)
+
+    paginas = _paginas(client, '/api/v1/eventos?por_pagina=2')
+    assert [len(p) for p in paginas] == [2, 2, 1]
+    # Mas recientes primero y sin los eventos de otro cliente
+    assert [f['id'] for p in paginas for f in p] == propios[::-1]
+
+    assert client.get('/api/v1/eventos?pagina=no-es-un-cursor').status_code == 400
+
+
+def test_campos_e_inclusiones(client, datos):
+    evento_id = datos.evento(datos.cliente, servicios=2)
+    iniciar_sesion(client, datos.cliente)
+
+    r = client.get('/api/v1/eventos?campos=titulo,lugar')
+    assert r.json['datos'] == [{'id': evento_id, 'titulo': 'Boda', 'lugar': 'Hacienda'}]
+
+    r = client.get(f'/api/v1/eventos/{evento_id}?campos=titulo&include=servicios')
+    servicios = r.json['datos']['servicios']
+    assert [s['servicio_id'] for s in servicios] == datos.servicios[:2]
+    assert {'nombre', 'categoria', 'precio_acordado', 'notas'} <= set(servicios[0])
+
+    assert client.get('/api/v1/eventos?campos=password').status_code == 400
+    assert client.get('/api/v1/servicios?include=servicios').status_code == 400
+
+
+def test_lote_por_ids(client, datos):
+    propio = datos.evento(datos.cliente)
+    ajeno = datos.evento(datos.otro_cliente, lugar='Jardin')
+    iniciar_sesion(client, datos.cliente)
+
+    r = client.get(f'/api/v1/eventos?ids={ajeno},{propio},999999')
+    assert [f['id'] for f in r.json['datos']] == [propio]
+    assert r.json['faltantes'] == [ajeno, 999999]
+
+
+def test_recursos_desconocidos_y_permisos(client, datos):
+    ajeno = datos.evento(datos.otro_cliente)
+    iniciar_sesion(client, datos.cliente)
+
+    assert client.get('/api/v1/facturas').status_code == 404
+    assert client.get('/api/v1/facturas/1').status_code == 404
+    assert client.get(f'/api/v1/eventos/{ajeno}').status_code == 404
+    assert client.get('/api/v1/usuarios').status_code == 403
@@ -0,0 +1,63 @@
+import re
+
+import catalogo
+from db import db
+from models import Evento, EventoServicio, Servicio
+from tests.conftest import iniciar_sesion
+
+
+def _contratados(app, evento_id):
+    with app.app_context():
+        return [es.servicio_id for es in EventoServicio.query.filter_by(evento_id=evento_id)]
+
+
+def test_agregar_servicio_disponible(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    r = client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                    data={'servicio_id': datos.servicios[0], 'precio_acordado': '1500.50'})
+    assert r.status_code == 302
+    assert _contratados(app, evento_id) == [datos.servicios[0]]
+    with app.app_context():
+        assert float(db.session.get(Evento, evento_id).total_servicios) == 1500.50
+
+
+def test_rechaza_servicio_fuera_del_catalogo(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    with app.app_context():
+        servicio = db.session.get(Servicio, datos.servicios[1])
+        servicio.disponible = False
+        db.session.commit()
+
+    for servicio_id in (datos.servicios[1], 999999):
+        r = client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                        data={'servicio_id': servicio_id, 'precio_acordado': '100'})
+        assert r.status_code == 302
+    assert _contratados(app, evento_id) == []
+
+
+def test_formulario_lleva_csrf(app, client, datos):
+    app.config['WTF_CSRF_ENABLED'] = True
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    url = f'/cliente/evento/{evento_id}/servicio/agregar'
+
+    assert client.post(url, data={'servicio_id': datos.servicios[0], 'precio_acordado': '100'}).status_code == 302
+    assert _contratados(app, evento_id) == []
+
+    pagina = client.get(f'/cliente/evento/{evento_id}').get_data(as_text=True)
+    token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', pagina).group(1)
+    client.post(url, data={'servicio_id': datos.servicios[0], 'precio_acordado': '100', 'csrf_token': token})
+    assert _contratados(app, evento_id) == [datos.servicios[0]]
+
+
+def test_instantanea_se_recarga_al_crear_servicio(app, datos):
+    with app.app_context():
+        antes = catalogo.instantanea()
+        assert catalogo.instantanea() is antes
+        db.session.add(Servicio(nombre='Nuevo', precio_base=10, categoria='musica', disponible=True))
+        db.session.commit()
+        despues = catalogo.instantanea()
+    assert despues is not antes
+    assert [o.nombre for o in despues.opciones][-1] == 'Nuevo'
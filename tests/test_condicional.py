@@ -0,0 +1,52 @@
+import pytest
+
+import sesiones
+from tests.conftest import iniciar_sesion
+
+
+class AlmacenContador(sesiones.AlmacenMemoria):
+    def __init__(self):
+        super().__init__()
+        self.lecturas = 0
+
+    def cargar(self, sid):
+        self.lecturas += 1
+        return super().cargar(sid)
+
+
+@pytest.fixture
+def almacen(app):
+    anterior = app.session_interface
+    almacen = AlmacenContador()
+    app.session_interface = sesiones.SesionesServidor(almacen)
+    yield almacen
+    app.session_interface = anterior
+
+
+def test_get_condicional_sin_sesion_no_lee_el_almacen(app, client, datos, almacen):
+    primera = client.get('/servicios')
+    assert primera.status_code == 200
+    etag = primera.headers['ETag']
+
+    segunda = client.get('/servicios', headers={'If-None-Match': etag})
+    assert segunda.status_code == 304
+    assert almacen.lecturas == 0
+
+
+def test_sesion_se_lee_una_vez_por_peticion(app, client, datos, almacen):
+    iniciar_sesion(client, datos.cliente)
+    almacen.lecturas = 0
+    etag = client.get('/cliente/dashboard').headers['ETag']
+    assert client.get('/cliente/dashboard', headers={'If-None-Match': etag}).status_code == 304
+    assert almacen.lecturas == 2
+
+
+def test_flash_pendiente_evita_el_304(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    etag = client.get('/cliente/dashboard').headers['ETag']
+    with client.session_transaction() as sesion:
+        sesion['_flashes'] = [('success', 'Evento guardado')]
+
+    respuesta = client.get('/cliente/dashboard', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert 'Evento guardado' in respuesta.get_data(as_text=True)
@@ -0,0 +1,48 @@
+from tests.conftest import iniciar_sesion
+
+
+"Numero de consultas por ruta: no debe crecer con el numero de eventos o servicios mostrados"
+
+
+def _consultas(client, contar_consultas, url):
+    # La primera peticion llena los caches del usuario y del catalogo; se mide la segunda
+    assert client.get(url).status_code == 200
+    with contar_consultas() as consultas:
+        assert client.get(url).status_code == 200
+    return len(consultas)
+
+
+def test_dashboard_cliente(client, datos, contar_consultas):
+    iniciar_sesion(client, datos.cliente)
+    datos.eventos(datos.cliente, 2, servicios=3)
+    pocos = _consultas(client, contar_consultas, '/cliente/dashboard')
+    datos.eventos(datos.cliente, 8, servicios=3)
+    muchos = _consultas(client, contar_consultas, '/cliente/dashboard')
+    assert pocos == muchos <= 4
+
+
+def test_detalle_evento_cliente(client, datos, contar_consultas):
+    iniciar_sesion(client, datos.cliente)
+    uno = datos.evento(datos.cliente, servicios=1)
+    tres = datos.evento(datos.cliente, servicios=3, lugar='Jardin')
+    pocos = _consultas(client, contar_consultas, f'/cliente/evento/{uno}')
+    muchos = _consultas(client, contar_consultas, f'/cliente/evento/{tres}')
+    assert pocos == muchos <= 4
+
+
+def test_detalle_evento_admin(client, datos, contar_consultas):
+    iniciar_sesion(client, datos.admin)
+    uno = datos.evento(datos.cliente, servicios=1)
+    tres = datos.evento(datos.cliente, servicios=3, lugar='Jardin')
+    pocos = _consultas(client, contar_consultas, f'/admin/evento/{uno}')
+    muchos = _consultas(client, contar_consultas, f'/admin/evento/{tres}')
+    assert pocos == muchos <= 4
+
+
+def test_listado_eventos_admin(client, datos, contar_consultas):
+    iniciar_sesion(client, datos.admin)
+    datos.eventos(datos.cliente, 2, servicios=2)
+    pocos = _consultas(client, contar_consultas, '/admin/eventos')
+    datos.eventos(datos.otro_cliente, 8, servicios=3)
+    muchos = _consultas(client, contar_consultas, '/admin/eventos')
+    assert pocos == muchos <= 4
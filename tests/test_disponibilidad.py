@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from db import db
+from models import Evento
+from tests.conftest import iniciar_sesion
+
+
+def _evento_form(**valores):
+    datos = {'titulo': 'Boda Civil', 'fecha_evento': '2030-06-01T20:00', 'duracion_horas': '6',
+             'lugar': 'Hacienda', 'num_invitados': '100', 'presupuesto_estimado': '50000'}
+    datos.update(valores)
+    return datos
+
+
+def _num_eventos(app):
+    with app.app_context():
+        return db.session.query(Evento).count()
+
+
+def test_formulario_de_evento(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    assert client.get('/cliente/evento/nuevo').status_code == 200
+    r = client.get(f'/cliente/evento/{evento_id}/editar')
+    assert r.status_code == 200
+    assert 'value="2030-06-01T18:00"' in r.get_data(as_text=True)
+
+    r = client.post('/cliente/evento/nuevo', data=_evento_form(fecha_evento='01/06/2030 20:00'))
+    assert r.status_code == 200
+    assert _num_eventos(app) == 1
+
+
+def test_crear_evento_rechaza_lugar_ocupado(app, client, datos):
+    iniciar_sesion(client, datos.otro_cliente)
+    # Ocupa la Hacienda de 18:00 a 02:00
+    datos.evento(datos.cliente)
+
+    r = client.post('/cliente/evento/nuevo', data=_evento_form(lugar=' hacienda '))
+    assert r.status_code == 200
+    assert 'ya está reservado' in r.get_data(as_text=True)
+    assert _num_eventos(app) == 1
+
+    r = client.post('/cliente/evento/nuevo', data=_evento_form(fecha_evento='2030-06-02T12:00'))
+    assert r.status_code == 302
+    assert _num_eventos(app) == 2
+
+
+def test_conflictos_hipoteticos(client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    url = '/api/disponibilidad/conflictos?lugar=Hacienda&inicio={}'
+
+    r = client.get(url.format('2030-06-01T20:00'))
+    assert r.status_code == 200
+    assert r.json['disponible'] is False
+
+    assert client.get(url.format('2030-06-03T20:00')).json['disponible'] is True
+    assert client.get(url.format('2030-06-01T20:00') + f'&excluir={evento_id}').json['disponible'] is True
+
+
+def test_fechas_con_zona_horaria_son_400(client, datos):
+    iniciar_sesion(client, datos.cliente)
+    datos.evento(datos.cliente)
+    for valor in ('2030-06-01T20:00%2B00:00', '2030-06-01T20:00Z', 'manana'):
+        assert client.get(f'/api/disponibilidad/conflictos?lugar=Hacienda&inicio={valor}').status_code == 400
+    assert client.get('/api/disponibilidad?lugar=Hacienda&desde=2030-06-01&hasta=2030-06-02T00:00-06:00'
+                      ).status_code == 400
+    assert client.get('/api/disponibilidad?lugar=Hacienda&desde=2030-06-01&hasta=2030-06-03').status_code == 200
+
+
+def _servicios_de(app, evento_id):
+    with app.app_context():
+        return [es.servicio_id for es in db.session.get(Evento, evento_id).servicios_contratados]
+
+
+def test_agregar_servicio_ocupado_se_rechaza(app, client, datos):
+    # El primer servicio queda contratado en la Hacienda de 18:00 a 02:00
+    datos.evento(datos.cliente, servicios=1)
+    evento_id = datos.evento(datos.otro_cliente, lugar='Jardin', fecha_evento=datetime(2030, 6, 1, 20))
+    iniciar_sesion(client, datos.otro_cliente)
+
+    r = client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                    data={'servicio_id': datos.servicios[0], 'precio_acordado': '100'}, follow_redirects=True)
+    assert 'ya está contratado en otro evento' in r.get_data(as_text=True)
+    assert _servicios_de(app, evento_id) == []
+
+    client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                data={'servicio_id': datos.servicios[1], 'precio_acordado': '100'})
+    assert _servicios_de(app, evento_id) == [datos.servicios[1]]
+
+
+def test_editar_evento_revisa_sus_servicios(app, client, datos):
+    datos.evento(datos.cliente, servicios=1)
+    evento_id = datos.evento(datos.otro_cliente, servicios=1, lugar='Jardin', fecha_evento=datetime(2030, 6, 2, 18))
+    iniciar_sesion(client, datos.otro_cliente)
+
+    r = client.post(f'/cliente/evento/{evento_id}/editar', data=_evento_form(lugar='Jardin'))
+    assert r.status_code == 200
+    assert 'ya está contratado en otro evento' in r.get_data(as_text=True)
+    with app.app_context():
+        assert db.session.get(Evento, evento_id).fecha_evento == datetime(2030, 6, 2, 18)
+
+    r = client.post(f'/cliente/evento/{evento_id}/editar',
+                    data=_evento_form(lugar='Jardin', fecha_evento='2030-06-02T20:00'))
+    assert r.status_code == 302
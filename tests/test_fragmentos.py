@@ -0,0 +1,40 @@
+import fragment_cache
+from db import db
+from models import Servicio
+from tests.conftest import iniciar_sesion
+
+
+def _listados(consultas):
+    "Sentencias que leen la pagina de servicios (no la version del catalogo)"
+    return [s for s in consultas if 'FROM servicios' in s and 'LIMIT' in s]
+
+
+def test_hit_no_consulta_la_pagina(app, client, datos, contar_consultas):
+    iniciar_sesion(client, datos.admin)
+    with contar_consultas() as consultas:
+        primera = client.get('/admin/servicios?categoria=catering')
+    assert len(_listados(consultas)) == 1
+
+    with contar_consultas() as consultas:
+        segunda = client.get('/admin/servicios?categoria=catering')
+    assert _listados(consultas) == []
+    assert segunda.get_data() == primera.get_data()
+    assert 'Servicio 2' in segunda.get_data(as_text=True)
+
+
+def test_escritura_invalida_el_listado(app, client, datos):
+    iniciar_sesion(client, datos.admin)
+    client.get('/admin/servicios')
+    with app.app_context():
+        db.session.get(Servicio, datos.servicios[0]).nombre = 'Banquete renombrado'
+        db.session.commit()
+    assert 'Banquete renombrado' in client.get('/admin/servicios').get_data(as_text=True)
+
+
+def test_versiones_compartidas_entre_workers(tmp_path):
+    ruta = str(tmp_path / 'fragmentos.db')
+    worker_a = fragment_cache.BackendSqlite(ruta)
+    worker_b = fragment_cache.BackendSqlite(ruta)
+    antes = worker_a.version('servicios')
+    worker_b.incrementar('servicios')
+    assert worker_a.version('servicios') == antes + 1
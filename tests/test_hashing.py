@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from hashing import HashingSaturado, PoolHashing
+
+
+@pytest.fixture
+def pool():
+    pool = PoolHashing(workers=1, max_cola=0, timeout=0.2)
+    yield pool
+    pool.cerrar()
+
+
+def _esperar_libre(pool, limite=5):
+    fin = time.monotonic() + limite
+    while pool.stats()['en_curso'] and time.monotonic() < fin:
+        time.sleep(0.05)
+
+
+def test_timeout_conserva_el_cupo_hasta_que_la_tarea_termina(pool):
+    with pytest.raises(HashingSaturado):
+        pool._ejecutar(time.sleep, 1)
+
+    # La tarea sigue corriendo en el proceso: no hay lugar para otra
+    assert pool.stats()['en_curso'] == 1
+    with pytest.raises(HashingSaturado):
+        pool._ejecutar(time.sleep, 0)
+
+    _esperar_libre(pool)
+    assert pool._ejecutar(time.sleep, 0) is None
+
+    stats = pool.stats()
+    assert stats['en_curso'] == 0
+    assert stats['agotados'] == 1
+    assert stats['rechazados'] == 1
+    assert stats['completados'] == 1
+
+
+def test_errores_liberan_el_cupo():
+    pool = PoolHashing(workers=0, max_cola=0, rounds=4)
+    with pytest.raises(ValueError):
+        pool.verificar('no-es-un-hash', 'x')
+    assert pool.stats()['en_curso'] == 0
+    assert pool.verificar(pool.generar_hash('Secreto123'), 'Secreto123')
+
+
+def test_contrasena_de_mas_de_72_bytes():
+    pool = PoolHashing(workers=0, max_cola=0, rounds=4)
+    assert pool.verificar(pool.generar_hash('Secreto123'), 'ñ' * 40) is False
+
+
+def test_formularios_rechazan_contrasena_larga(app, client, datos):
+    larga = 'ñ' * 40  # 40 caracteres, 80 bytes
+    r = client.post('/login', data={'username': 'cliente1', 'password': larga})
+    assert r.status_code == 200
+    assert 'no puede tener mas de 72 bytes' in r.get_data(as_text=True)
+
+    r = client.post('/registro', data={
+        'username': 'nuevo', 'nombre_completo': 'Nuevo Cliente', 'email': 'nuevo@example.com',
+        'password': larga, 'confirmar_password': larga,
+    })
+    assert r.status_code == 200
+    assert 'no puede tener mas de 72 bytes' in r.get_data(as_text=True)
@@ -0,0 +1,103 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import bulk
+import trabajos
+from db import db
+from models import Cliente, Trabajo
+from tests.conftest import iniciar_sesion
+
+
+CSV = ('nombre,correo,telefono,direccion\n'
+       'Ana Pérez,ana@example.com,5551234567,Centro\n'
+       'Luis Gómez,luis@example.com,5557654321,Norte\n'
+       'Sin Correo,,5550000000,Sur\n')
+
+
+def test_importacion_se_encola_y_la_procesa_el_worker(app, client, datos, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORTACIONES_DIR', str(tmp_path))
+    iniciar_sesion(client, datos.admin)
+
+    r = client.post('/admin/importar', data={
+        'catalogo': 'clientes', 'formato': 'csv',
+        'archivo': (io.BytesIO(CSV.encode('utf-8')), 'clientes.csv'),
+    }, content_type='multipart/form-data')
+    assert r.status_code == 302
+    with app.app_context():
+        trabajo = Trabajo.query.filter_by(tipo='importar_catalogo').one()
+        fila = (trabajo.id, trabajo.tipo, trabajo.argumentos, 1, trabajo.max_intentos)
+        # La petición solo encola: nada se importa hasta que corre el worker
+        assert Cliente.query.count() == 0
+    pendiente = client.get(r.headers['Location']).get_data(as_text=True)
+    assert 'http-equiv="refresh"' in pendiente
+
+    with app.app_context():
+        assert trabajos.ejecutar(fila)
+        assert db.session.get(Trabajo, fila[0]).estado == 'terminado'
+        assert Cliente.query.count() == 2
+
+    pagina = client.get(r.headers['Location']).get_data(as_text=True)
+    assert 'Insertadas: <strong>2</strong>' in pagina
+    assert '<td>4</td>' in pagina
+    assert [p.name for p in tmp_path.iterdir()] == [f"{fila[2]['archivo']}.json"]
+
+
+def _subir(app, client, datos):
+    iniciar_sesion(client, datos.admin)
+    client.post('/admin/importar', data={
+        'catalogo': 'clientes', 'formato': 'csv',
+        'archivo': (io.BytesIO(CSV.encode('utf-8')), 'clientes.csv'),
+    }, content_type='multipart/form-data')
+    with app.app_context():
+        trabajo = Trabajo.query.filter_by(tipo='importar_catalogo').one()
+        return (trabajo.id, trabajo.tipo, trabajo.argumentos, 1, trabajo.max_intentos)
+
+
+def _caer_tras_el_primer_lote(monkeypatch):
+    original = bulk._insertar_lote
+
+    def insertar_y_caer(*args):
+        original(*args)
+        raise SystemExit('worker caido')
+    monkeypatch.setattr(bulk, '_insertar_lote', insertar_y_caer)
+
+
+def test_reejecutar_importacion_interrumpida_no_duplica(app, client, datos, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORTACIONES_DIR', str(tmp_path))
+    fila = _subir(app, client, datos)
+
+    with app.app_context():
+        with monkeypatch.context() as m:
+            _caer_tras_el_primer_lote(m)
+            with pytest.raises(SystemExit):
+                trabajos.TAREAS['importar_catalogo'](**fila[2])
+        assert Cliente.query.count() == 2
+
+        # Otra ejecucion del mismo trabajo encuentra la marca y no inserta de nuevo
+        assert not trabajos.ejecutar(fila)
+        assert db.session.get(Trabajo, fila[0]).estado == 'fallido'
+        assert Cliente.query.count() == 2
+
+
+def test_rescate_de_importacion_interrumpida_no_duplica(app, client, datos, tmp_path, monkeypatch, postgres):
+    monkeypatch.setitem(app.config, 'IMPORTACIONES_DIR', str(tmp_path))
+    fila = _subir(app, client, datos)
+
+    with app.app_context():
+        # El worker toma el trabajo y cae despues de confirmar el primer lote
+        trabajo = db.session.get(Trabajo, fila[0])
+        trabajo.estado, trabajo.intentos = 'en_proceso', 1
+        trabajo.bloqueado_por, trabajo.bloqueado_en = 'caido:1', datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        with monkeypatch.context() as m:
+            _caer_tras_el_primer_lote(m)
+            with pytest.raises(SystemExit):
+                trabajos.TAREAS['importar_catalogo'](**fila[2])
+
+        assert trabajos.rescatar_bloqueados(timeout=60) == 1
+        db.session.expire_all()
+        assert db.session.get(Trabajo, fila[0]).estado == 'fallido'
+        assert trabajos.tomar('worker:2') is None
+        assert Cliente.query.count() == 2
@@ -0,0 +1,26 @@
+import pytest
+
+import instrumentacion
+
+
+@pytest.fixture
+def activa(app, monkeypatch):
+    monkeypatch.setattr(instrumentacion, 'activa', instrumentacion.Instrumentacion(app))
+
+
+def test_metrics_sin_instrumentacion_es_404(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_sin_token_configurado_es_403(app, client, activa, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSTRUMENTACION_TOKEN', None)
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer None'}).status_code == 403
+
+
+def test_metrics_con_token(app, client, activa, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSTRUMENTACION_TOKEN', 'secreto')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 403
+    r = client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+    assert r.status_code == 200
+    assert 'pool_checkouts_total' in r.get_data(as_text=True)
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import trabajos
+from models import EventoServicio
+from planes import verificar_planes
+from tests.conftest import iniciar_sesion
+
+
+def _agregar(client, evento_id, servicio_id):
+    return client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                       data={'servicio_id': servicio_id, 'precio_acordado': '100'}, follow_redirects=True)
+
+
+def test_servicio_duplicado(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    _agregar(client, evento_id, datos.servicios[0])
+
+    r = _agregar(client, evento_id, datos.servicios[0])
+    assert 'Este servicio ya está agregado al evento.' in r.get_data(as_text=True)
+    with app.app_context():
+        assert EventoServicio.query.filter_by(evento_id=evento_id).count() == 1
+
+
+def test_otras_violaciones_no_se_reportan_como_duplicado(app, client, datos, monkeypatch):
+    def falla(*args, **kwargs):
+        raise IntegrityError('INSERT', {}, Exception('violates foreign key constraint "fk_otra"'))
+
+    monkeypatch.setattr(trabajos, 'encolar', falla)
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    with pytest.raises(IntegrityError):
+        _agregar(client, evento_id, datos.servicios[0])
+
+
+def test_consultas_frecuentes_usan_indices(app, postgres):
+    with app.app_context():
+        assert verificar_planes() == {}
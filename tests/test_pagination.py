@@ -0,0 +1,54 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from models import Evento
+from pagination import TokenInvalido, codificar_token, decodificar_token, paginar
+
+
+def test_token_ida_y_vuelta():
+    valores = [datetime(2030, 6, 1, 18, 30), date(2030, 6, 1), Decimal('1500.50'), 'Hacienda', 7]
+    token = codificar_token(valores)
+    assert '=' not in token
+    assert decodificar_token(token, len(valores)) == valores
+
+    with pytest.raises(TokenInvalido):
+        decodificar_token(token, 2)
+    with pytest.raises(TokenInvalido):
+        decodificar_token('no-es-un-token', 2)
+    with pytest.raises(TokenInvalido):
+        decodificar_token(codificar_token([{'dt': 'manana'}]), 1)
+
+
+def test_segunda_pagina_continua_donde_termino_la_primera(app, datos):
+    # Tres eventos a la misma hora: el id desempata y ninguno se repite ni se pierde
+    mismo_dia = datetime(2030, 6, 1, 18)
+    ids = [datos.evento(datos.cliente, lugar=f'Salon {i}', fecha_evento=mismo_dia) for i in range(3)]
+    ids += datos.eventos(datos.cliente, 2)
+    columnas = (Evento.fecha_evento, Evento.id)
+
+    with app.app_context():
+        esperados = [e.id for e in Evento.query.order_by(Evento.fecha_evento.desc(), Evento.id.desc())]
+        vistos, token, paginas = [], None, 0
+        while True:
+            pagina = paginar(Evento.query, columnas, token=token, por_pagina=2, descendente=True)
+            vistos += [e.id for e in pagina]
+            paginas += 1
+            if pagina.siguiente is None:
+                break
+            assert pagina.siguiente == codificar_token([pagina.items[-1].fecha_evento, pagina.items[-1].id])
+            token = pagina.siguiente
+
+        assert vistos == esperados
+        assert sorted(vistos) == sorted(ids)
+        assert paginas == 3
+
+        # La pagina perezosa da lo mismo y valida el token antes de consultar
+        primera = paginar(Evento.query, columnas, por_pagina=2, descendente=True)
+        perezosa = paginar(Evento.query, columnas, token=primera.siguiente, por_pagina=2,
+                           descendente=True, perezosa=True)
+        assert [e.id for e in perezosa] == esperados[2:4]
+        assert not perezosa.es_primera
+        with pytest.raises(TokenInvalido):
+            paginar(Evento.query, columnas, token='xx', descendente=True, perezosa=True)
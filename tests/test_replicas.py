@@ -0,0 +1,51 @@
+import time
+
+from flask import g
+
+import replicas
+from db import db
+from models import Evento, Trabajo
+from tests.conftest import iniciar_sesion
+
+
+def _fijada(client):
+    return client.get_cookie(replicas.COOKIE_PRIMARIA_HASTA) is not None
+
+
+def test_pedir_cotizacion_no_fija_la_primaria(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente, servicios=1)
+
+    for _ in range(2):
+        assert client.get(f'/cliente/evento/{evento_id}/cotizacion.html').status_code == 202
+    with app.app_context():
+        assert Trabajo.query.filter_by(tipo='generar_cotizacion').count() == 1
+    assert not _fijada(client)
+
+
+def test_escritura_visible_fija_la_primaria(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                data={'servicio_id': datos.servicios[0], 'precio_acordado': '100'})
+    assert _fijada(client)
+    with app.app_context():
+        assert db.session.get(Evento, evento_id).total_servicios == 100
+
+
+def test_fijacion_no_escribe_la_sesion(app, client, datos):
+    iniciar_sesion(client, datos.cliente)
+    evento_id = datos.evento(datos.cliente)
+    client.post(f'/cliente/evento/{evento_id}/servicio/agregar',
+                data={'servicio_id': datos.servicios[0], 'precio_acordado': '100'})
+    with client.session_transaction() as sesion:
+        assert not any('primaria' in clave for clave in sesion)
+
+
+def test_cookie_decide_si_se_lee_de_la_replica(app):
+    futuro = str(int(time.time()) + 60)
+    for cookie, replica in ((None, True), (futuro, False), ('basura', True)):
+        headers = {'Cookie': f'{replicas.COOKIE_PRIMARIA_HASTA}={cookie}'} if cookie else {}
+        with app.test_request_context('/servicios', headers=headers):
+            g.solo_lectura = True
+            assert replicas._debe_leer_de_replica() is replica
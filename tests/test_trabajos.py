@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import trabajos
+from db import db
+from models import Trabajo
+
+
+def _en_proceso(intentos, max_intentos):
+    trabajo = Trabajo(tipo='correo_bienvenida', argumentos={'usuario_id': 1}, estado='en_proceso',
+                      intentos=intentos, max_intentos=max_intentos, bloqueado_por='caido:1',
+                      bloqueado_en=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(trabajo)
+    db.session.commit()
+    return trabajo.id
+
+
+def test_rescate_sin_intentos_restantes_falla(app, postgres):
+    with app.app_context():
+        agotado = _en_proceso(intentos=1, max_intentos=1)
+        con_intentos = _en_proceso(intentos=1, max_intentos=3)
+
+        assert trabajos.rescatar_bloqueados(timeout=60) == 2
+        db.session.expire_all()
+        assert db.session.get(Trabajo, agotado).estado == 'fallido'
+        assert db.session.get(Trabajo, con_intentos).estado == 'pendiente'
+
+
+def test_ejecutar_rechaza_trabajo_sin_intentos(app):
+    llamadas = []
+    trabajos.TAREAS['_prueba'] = lambda: llamadas.append(1)
+    try:
+        with app.app_context():
+            trabajo = Trabajo(tipo='_prueba', argumentos={}, estado='en_proceso', intentos=2, max_intentos=1)
+            db.session.add(trabajo)
+            db.session.commit()
+            assert not trabajos.ejecutar((trabajo.id, '_prueba', {}, 2, 1))
+            db.session.expire_all()
+            assert db.session.get(Trabajo, trabajo.id).estado == 'fallido'
+    finally:
+        del trabajos.TAREAS['_prueba']
+    assert llamadas == []
@@ -0,0 +1,53 @@
+import user_cache
+from db import db
+from models import Usuario
+
+from tests.conftest import iniciar_sesion
+
+
+def test_invalidacion_llega_a_otro_worker(app, datos, tmp_path):
+    "Dos backends sobre el mismo archivo hacen de dos workers de gunicorn"
+    ruta = str(tmp_path / 'usuarios.db')
+    worker_a = user_cache.BackendSqlite(ruta)
+    worker_b = user_cache.BackendSqlite(ruta)
+
+    with app.app_context():
+        user_cache.init_app(app, backend=worker_a)
+        assert user_cache.cargar_usuario(datos.cliente).activo
+        assert worker_a.get(datos.cliente) is not None
+
+        # El admin desactiva al usuario en el otro worker
+        user_cache.init_app(app, backend=worker_b)
+        db.session.get(Usuario, datos.cliente).activo = False
+        db.session.commit()
+        db.session.remove()
+
+        user_cache.init_app(app, backend=worker_a)
+        assert worker_a.get(datos.cliente) is None
+        assert user_cache.cargar_usuario(datos.cliente) is None
+
+
+def test_usuario_desactivado_pierde_la_sesion(app, client, datos, tmp_path):
+    user_cache.init_app(app, backend=user_cache.BackendSqlite(str(tmp_path / 'usuarios.db')))
+    iniciar_sesion(client, datos.cliente)
+    assert client.get('/cliente/dashboard').status_code == 200
+
+    with app.app_context():
+        db.session.get(Usuario, datos.cliente).activo = False
+        db.session.commit()
+
+    respuesta = client.get('/cliente/dashboard')
+    assert respuesta.status_code == 302
+    assert '/login' in respuesta.headers['Location']
+
+
+def test_backend_configurable(app, tmp_path):
+    app.config.update(USUARIOS_CACHE_BACKEND='sqlite', USUARIOS_CACHE_RUTA=str(tmp_path / 'u.db'))
+    try:
+        user_cache.init_app(app)
+        assert isinstance(user_cache.backend(), user_cache.BackendSqlite)
+        app.config['USUARIOS_CACHE_BACKEND'] = 'ninguno'
+        user_cache.init_app(app)
+        assert isinstance(user_cache.backend(), user_cache.SinCache)
+    finally:
+        app.config['USUARIOS_CACHE_BACKEND'] = 'memoria'
@@ -0,0 +1,36 @@
+import re
+
+import pytest
+
+import app as aplicacion
+
+
+@pytest.fixture(autouse=True)
+def _sin_conteos():
+    aplicacion._validaciones_por_ip.invalidar()
+
+
+def _token(client):
+    pagina = client.get('/registro').get_data(as_text=True)
+    return re.search(r'name="csrf_token"[^>]*value="([^"]+)"', pagina).group(1)
+
+
+def test_registro_exige_csrf(app, client, datos):
+    app.config['WTF_CSRF_ENABLED'] = True
+    r = client.post('/api/validar/registro?campos=username', json={'username': 'cliente1'})
+    assert r.status_code == 400
+
+    r = client.post('/api/validar/registro?campos=username', json={'username': 'cliente1'},
+                    headers={'X-CSRFToken': _token(client)})
+    assert r.status_code == 200
+    assert r.get_json()['valido'] is False
+
+
+def test_registro_limita_por_ip(app, client, datos):
+    app.config['VALIDAR_LIMITE'] = 3
+    try:
+        codigos = [client.post('/api/validar/registro?campos=username', json={'username': f'nuevo{i}'}).status_code
+                   for i in range(4)]
+    finally:
+        app.config['VALIDAR_LIMITE'] = 30
+    assert codigos == [200, 200, 200, 429]
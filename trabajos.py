@@ -0,0 +1,287 @@
+import os
+import random
+import select
+import signal
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert as insert_generico, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Trabajo
+
+
+"Canal de NOTIFY con el que se despierta a los workers al encolar"
+CANAL = 'trabajos'
+
+"Funciones que ejecutan cada tipo de trabajo, registradas con @tarea"
+TAREAS = {}
+
+
+class TareaDesconocida(LookupError):
+    "No hay funcion registrada para el tipo del trabajo"
+
+
+def tarea(tipo, max_intentos=5):
+    """
+    Registra una funcion como ejecutora de un tipo de trabajo. Recibe los
+    argumentos del trabajo como kwargs. Un trabajo puede ejecutarse mas de una
+    vez (si el worker muere a la mitad), asi que la funcion debe tolerarlo.
+    """
+    def decorador(funcion):
+        funcion.max_intentos = max_intentos
+        TAREAS[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(tipo, argumentos=None, llave=None, retraso=None, max_intentos=None):
+    """
+    Agrega un trabajo en la transaccion actual de db.session: se guarda (y el
+    worker se entera por NOTIFY) solo cuando la ruta hace commit, y desaparece
+    si hace rollback. Con `llave`, un segundo encolado con la misma llave no
+    hace nada. Regresa el id del trabajo, o None si la llave ya existia.
+    Fuera de PostgreSQL (desarrollo) no hay NOTIFY y el trabajo solo se guarda.
+    """
+    if tipo not in TAREAS:
+        raise TareaDesconocida(tipo)
+    valores = {
+        'tipo': tipo,
+        'argumentos': argumentos or {},
+        'llave_idempotencia': llave,
+        'max_intentos': max_intentos or TAREAS[tipo].max_intentos,
+        'ejecutar_en': datetime.utcnow() + (retraso or timedelta(0)),
+    }
+    if db.engine.dialect.name != 'postgresql':
+        # La llave repetida se detecta con un savepoint para no perder el resto de la transaccion
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(insert_generico(Trabajo).values(**valores)).inserted_primary_key[0]
+        except IntegrityError:
+            if llave is None:
+                raise
+            return None
+
+    sentencia = insert(Trabajo).values(**valores).returning(Trabajo.id)
+    if llave is not None:
+        sentencia = sentencia.on_conflict_do_nothing(constraint='uq_trabajos_llave_idempotencia')
+    trabajo_id = db.session.execute(sentencia).scalar()
+    if trabajo_id is not None:
+        db.session.execute(text('SELECT pg_notify(:canal, :tipo)'), {'canal': CANAL, 'tipo': tipo})
+    return trabajo_id
+
+
+_TOMAR = text("""
+    UPDATE trabajos
+    SET estado = 'en_proceso', intentos = intentos + 1,
+        bloqueado_por = :worker, bloqueado_en = timezone('utc', now()),
+        fecha_actualizacion = timezone('utc', now())
+    WHERE id = (
+        SELECT id FROM trabajos
+        WHERE estado = 'pendiente' AND ejecutar_en <= timezone('utc', now())
+        ORDER BY ejecutar_en, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, tipo, argumentos, intentos, max_intentos
+""")
+
+# Un trabajo rescatado que ya agoto sus intentos no se vuelve a ejecutar: puede haber
+# dejado cambios confirmados (p. ej. los lotes de una importacion) antes de que el worker cayera
+_RESCATAR = text("""
+    UPDATE trabajos
+    SET estado = CASE WHEN intentos >= max_intentos THEN 'fallido' ELSE 'pendiente' END,
+        bloqueado_por = NULL, bloqueado_en = NULL,
+        ultimo_error = 'Worker sin respuesta', fecha_actualizacion = timezone('utc', now())
+    WHERE estado = 'en_proceso' AND bloqueado_en < timezone('utc', now()) - make_interval(secs => :timeout)
+""")
+
+
+def tomar(worker):
+    """
+    Toma el siguiente trabajo pendiente y lo marca en_proceso. SKIP LOCKED
+    hace que varios workers nunca tomen el mismo trabajo ni se esperen entre si.
+    """
+    fila = db.session.execute(_TOMAR, {'worker': worker}).first()
+    db.session.commit()
+    return fila
+
+
+def retraso_reintento(intentos, base=10, maximo=3600):
+    "Backoff exponencial con jitter: base * 2^(intentos-1) segundos, entre 50% y 100%"
+    segundos = min(maximo, base * 2 ** (intentos - 1))
+    return timedelta(seconds=segundos * random.uniform(0.5, 1.0))
+
+
+def _terminar(trabajo_id, **valores):
+    valores['fecha_actualizacion'] = datetime.utcnow()
+    valores.setdefault('bloqueado_por', None)
+    valores.setdefault('bloqueado_en', None)
+    db.session.query(Trabajo).filter_by(id=trabajo_id).update(valores)
+    db.session.commit()
+
+
+def ejecutar(fila, retraso_base=10):
+    "Ejecuta un trabajo tomado y guarda el resultado; un error se reintenta con backoff"
+    trabajo_id, tipo, argumentos, intentos, max_intentos = fila
+    if intentos > max_intentos:
+        _terminar(trabajo_id, estado='fallido', ultimo_error='Sin intentos restantes')
+        return False
+    try:
+        funcion = TAREAS.get(tipo)
+        if funcion is None:
+            raise TareaDesconocida(tipo)
+        funcion(**argumentos)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        if intentos >= max_intentos or tipo not in TAREAS:
+            current_app.logger.error('Trabajo %s (%s) fallido tras %s intentos', trabajo_id, tipo, intentos)
+            _terminar(trabajo_id, estado='fallido', ultimo_error=error)
+        else:
+            espera = retraso_reintento(intentos, retraso_base)
+            current_app.logger.warning('Trabajo %s (%s) fallo; reintento en %ss', trabajo_id, tipo, int(espera.total_seconds()))
+            _terminar(trabajo_id, estado='pendiente', ultimo_error=error,
+                      ejecutar_en=datetime.utcnow() + espera)
+        return False
+    _terminar(trabajo_id, estado='terminado', ultimo_error=None)
+    return True
+
+
+def latido(worker):
+    "Renueva bloqueado_en de los trabajos en curso de un worker para que no se rescaten mientras corren"
+    actualizados = db.session.query(Trabajo).filter(
+        Trabajo.estado == 'en_proceso', Trabajo.bloqueado_por.startswith(f'{worker}:', autoescape=True)
+    ).update({'bloqueado_en': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return actualizados
+
+
+def rescatar_bloqueados(timeout):
+    """
+    Regresa a pendiente los trabajos en_proceso sin latido en `timeout` segundos
+    (o los marca fallidos si ya no les quedan intentos).
+    Un worker vivo renueva el latido de sus trabajos cada `intervalo`, asi que
+    solo se rescatan los de workers caidos o congelados; un trabajo largo no se
+    duplica mientras su worker siga respondiendo.
+    """
+    rescatados = db.session.execute(_RESCATAR, {'timeout': timeout}).rowcount
+    db.session.commit()
+    return rescatados
+
+
+def resumen():
+    "Conteo de trabajos por estado"
+    filas = db.session.query(Trabajo.estado, db.func.count()).group_by(Trabajo.estado).all()
+    return dict(filas)
+
+
+def limpiar(dias):
+    "Borra los trabajos terminados hace mas de `dias` dias"
+    limite = datetime.utcnow() - timedelta(days=dias)
+    borrados = Trabajo.query.filter(
+        Trabajo.estado == 'terminado', Trabajo.fecha_actualizacion < limite
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return borrados
+
+
+class Worker:
+    """
+    Procesa la cola con `concurrencia` hilos, cada uno con su propio contexto
+    de aplicacion (y por lo tanto su propia sesion y conexion). El hilo
+    principal escucha NOTIFY para despertarlos en cuanto se encola algo; si
+    no llega aviso, revisan la cola cada `intervalo` segundos de todos modos.
+    Requiere PostgreSQL (SKIP LOCKED y LISTEN).
+    """
+
+    def __init__(self, app, concurrencia=4, intervalo=5, timeout=300, retraso_base=10):
+        self.app = app
+        self.concurrencia = concurrencia
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.retraso_base = retraso_base
+        self.nombre = f'{socket.gethostname()}:{os.getpid()}'
+        self.detener = threading.Event()
+        # Cada aviso incrementa la generacion; un hilo duerme solo si no hubo avisos desde
+        # antes de revisar la cola, asi ninguno pierde un aviso que llego mientras revisaba
+        self._avisos = threading.Condition()
+        self._generacion = 0
+        self.procesados = 0
+        self._lock = threading.Lock()
+
+    def despertar(self):
+        with self._avisos:
+            self._generacion += 1
+            self._avisos.notify_all()
+
+    def _esperar_aviso(self, visto):
+        with self._avisos:
+            self._avisos.wait_for(lambda: self._generacion != visto or self.detener.is_set(), self.intervalo)
+
+    def _hilo(self, numero):
+        worker = f'{self.nombre}:{numero}'
+        with self.app.app_context():
+            while not self.detener.is_set():
+                try:
+                    visto = self._generacion
+                    fila = tomar(worker)
+                    if fila is None:
+                        self._esperar_aviso(visto)
+                        continue
+                    ejecutar(fila, self.retraso_base)
+                    with self._lock:
+                        self.procesados += 1
+                except Exception:
+                    # Base de datos caida u otro error fuera de la tarea: se espera y se reintenta
+                    current_app.logger.exception('Error en el worker %s', worker)
+                    db.session.rollback()
+                    self.detener.wait(self.intervalo)
+                finally:
+                    db.session.remove()
+
+    def _escuchar(self):
+        "Espera avisos de NOTIFY (o el intervalo), renueva el latido y rescata trabajos bloqueados"
+        conexion = db.engine.raw_connection()
+        try:
+            conexion.driver_connection.autocommit = True
+            cursor = conexion.cursor()
+            cursor.execute(f'LISTEN {CANAL}')
+            while not self.detener.is_set():
+                legibles, _, _ = select.select([conexion.driver_connection], [], [], self.intervalo)
+                if legibles:
+                    conexion.driver_connection.poll()
+                    conexion.driver_connection.notifies.clear()
+                    self.despertar()
+                latido(self.nombre)
+                if rescatar_bloqueados(self.timeout):
+                    self.despertar()
+        finally:
+            conexion.close()
+
+    def ejecutar(self):
+        with self.app.app_context():
+            dialecto = db.engine.dialect.name
+        if dialecto != 'postgresql':
+            raise RuntimeError('El worker requiere PostgreSQL (SKIP LOCKED y LISTEN/NOTIFY)')
+        hilos = [threading.Thread(target=self._hilo, args=(i,), daemon=True) for i in range(self.concurrencia)]
+        for hilo in hilos:
+            hilo.start()
+        signal.signal(signal.SIGTERM, lambda *_: self.detener.set())
+        try:
+            with self.app.app_context():
+                self._escuchar()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Los hilos terminan el trabajo que tienen en curso antes de salir
+            self.detener.set()
+            self.despertar()
+            for hilo in hilos:
+                hilo.join()
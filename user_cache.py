@@ -0,0 +1,200 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from cache import TTLCache
+from db import db
+from models import Usuario
+
+
+"Columnas que se guardan en cache; el hash de la contraseña nunca sale de la base de datos"
+COLUMNAS_EXCLUIDAS = {'password'}
+
+
+class BackendUsuarios(ABC):
+    """
+    Interfaz del almacen de usuarios en cache. Los valores son dicts simples
+    (columna -> valor), asi que cualquier almacen clave/valor puede implementarla.
+    Con varios procesos de gunicorn conviene un almacen compartido para que
+    la invalidacion llegue a todos los workers.
+    """
+
+    @abstractmethod
+    def get(self, usuario_id):
+        "Los datos guardados del usuario, o None si no estan o ya expiraron"
+
+    @abstractmethod
+    def set(self, usuario_id, datos, ttl):
+        "Guarda los datos del usuario por ttl segundos"
+
+    @abstractmethod
+    def delete(self, usuario_id):
+        "Invalida al usuario"
+
+    def stats(self):
+        "Contadores del almacen (hits, misses...); los almacenes sin metricas regresan {}"
+        return {}
+
+
+class BackendMemoria(BackendUsuarios):
+    "LRU con TTL dentro del proceso"
+
+    def __init__(self, ttl=60, maxsize=10000):
+        self.cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def get(self, usuario_id):
+        return self.cache.get(usuario_id)
+
+    def set(self, usuario_id, datos, ttl):
+        self.cache.set(usuario_id, datos, ttl)
+
+    def delete(self, usuario_id):
+        self.cache.invalidar(usuario_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class BackendSqlite(BackendUsuarios):
+    """
+    Archivo sqlite local que comparten todos los workers del mismo servidor:
+    la invalidacion que hace un worker la ven los demas en la siguiente peticion.
+    Con varios servidores hace falta un almacen comun (Redis) o USUARIOS_CACHE_BACKEND=ninguno.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._conexion().execute('CREATE TABLE IF NOT EXISTS usuarios '
+                                 '(id INTEGER PRIMARY KEY, datos BLOB NOT NULL, expira REAL NOT NULL)')
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def get(self, usuario_id):
+        fila = self._conexion().execute(
+            'SELECT datos FROM usuarios WHERE id = ? AND expira > ?', (usuario_id, time.time())
+        ).fetchone()
+        if fila is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(fila[0])
+
+    def set(self, usuario_id, datos, ttl):
+        self._conexion().execute('INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?)',
+                                 (usuario_id, pickle.dumps(datos), time.time() + ttl))
+
+    def delete(self, usuario_id):
+        self._conexion().execute('DELETE FROM usuarios WHERE id = ?', (usuario_id,))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class SinCache(BackendUsuarios):
+    "Cada peticion carga el usuario de la base de datos"
+
+    def get(self, usuario_id):
+        return None
+
+    def set(self, usuario_id, datos, ttl):
+        pass
+
+    def delete(self, usuario_id):
+        pass
+
+
+_config = {'backend': BackendMemoria(), 'ttl': 60}
+
+
+def init_app(app, backend=None):
+    _config['ttl'] = app.config.get('USUARIOS_CACHE_TTL', _config['ttl'])
+    if backend is None:
+        tipo = app.config.get('USUARIOS_CACHE_BACKEND', 'sqlite')
+        if tipo == 'sqlite':
+            ruta = app.config.get('USUARIOS_CACHE_RUTA') or os.path.join(app.instance_path, 'usuarios.db')
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            backend = BackendSqlite(ruta)
+        elif tipo == 'memoria':
+            backend = BackendMemoria(ttl=_config['ttl'], maxsize=app.config.get('USUARIOS_CACHE_MAX', 10000))
+        elif tipo == 'ninguno':
+            backend = SinCache()
+        else:
+            raise ValueError(f'USUARIOS_CACHE_BACKEND desconocido: {tipo}')
+    _config['backend'] = backend
+
+
+def backend():
+    return _config['backend']
+
+
+def _instantanea(usuario):
+    "Valores de columna del usuario como dict simple"
+    mapper = inspect(Usuario)
+    return {
+        attr.key: getattr(usuario, attr.key)
+        for attr in mapper.column_attrs
+        if attr.columns[0].name not in COLUMNAS_EXCLUIDAS
+    }
+
+
+def cargar_usuario(usuario_id):
+    """
+    Regresa el usuario de la sesion sin consultar la base de datos cuando esta
+    en cache. El objeto se une a la sesion actual con merge(load=False), asi
+    que sus relaciones se siguen cargando de forma normal si se usan.
+    Los usuarios desactivados no se cargan, lo que cierra su sesion de inmediato.
+    """
+    datos = backend().get(usuario_id)
+    if datos is None:
+        usuario = db.session.get(Usuario, usuario_id)
+        if usuario is None:
+            return None
+        backend().set(usuario_id, _instantanea(usuario), _config['ttl'])
+    else:
+        desconectado = Usuario(**datos)
+        make_transient_to_detached(desconectado)
+        usuario = db.session.merge(desconectado, load=False)
+
+    if not usuario.activo:
+        return None
+    return usuario
+
+
+def invalidar(usuario_id):
+    backend().delete(usuario_id)
+
+
+# Cualquier cambio de perfil, rol o estado invalida la entrada al confirmar la transaccion
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_usuarios_modificados(session, flush_context):
+    ids = session.info.setdefault('usuarios_modificados', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Usuario) and obj.id is not None:
+            ids.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_usuarios_modificados(session):
+    for usuario_id in session.info.pop('usuarios_modificados', ()):
+        invalidar(usuario_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_usuarios_modificados(session):
+    session.info.pop('usuarios_modificados', None)